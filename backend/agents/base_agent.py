@@ -1,49 +1,242 @@
+import os
+import json
+import time
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
-from openai import OpenAI
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
+from .llm_client import get_async_client, chat_completion, stream_chat_completion
+from .stage_graph import Stage, run_stage_graph
+from .prompt_builder import PromptBuilder
+from .response_cache import response_cache, is_cacheable, personalization_hash, prompt_hash
+from .streaming import JsonFieldStreamer, stream_metrics
+
+# Default stage deadlines in seconds
+REPLY_TIMEOUT = float(os.getenv("AGENT_REPLY_TIMEOUT", "30"))
+LOOKUP_TIMEOUT = float(os.getenv("AGENT_LOOKUP_TIMEOUT", "2"))
+# LLM calls give up inside the reply stage, so they settle their breaker before the stage timeout cancels them
+LLM_DEADLINE = min(float(os.getenv("AGENT_LLM_DEADLINE", str(REPLY_TIMEOUT * 0.8))), REPLY_TIMEOUT * 0.9)
 
 class BaseAgent(ABC):
     """Base class for all AI agents"""
-    
+
+    model = "gpt-3.5-turbo"
+    transfer_message = "I'm having trouble understanding. Let me connect you to a human agent."
+
+    # Classification returned with every reply: field -> (allowed values, or None for free text, default)
+    classification_fields: Dict[str, Tuple[Optional[List[str]], Any]] = {
+        "intent": (["general"], "general"),
+        "urgency": (["low", "medium", "high"], "medium"),
+    }
+
     def __init__(self, api_key: str, channel: str):
-        self.client = OpenAI(api_key=api_key)
+        self.client = get_async_client(api_key)
         self.channel = channel
-    
+        self.prompt_builder = PromptBuilder.for_channel(channel)
+
     @abstractmethod
     async def process_message(self, message: str, context: Dict[str, Any]) -> Dict[str, Any]:
         """Process a message and return response"""
         pass
-    
+
     @abstractmethod
     def get_system_prompt(self) -> str:
         """Get the system prompt for this agent"""
         pass
-    
+
+    async def chat_completion(self, **kwargs: Any):
+        """Chat completion on the shared async client, within the global concurrency limit
+
+        Retries, fallback model and hedging all stay inside the reply stage's deadline.
+        """
+        kwargs.setdefault("deadline", LLM_DEADLINE)
+        return await chat_completion(self.client, **kwargs)
+
+    async def run_stages(self, stages: List[Stage]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Run a stage graph for this agent; returns (results, timings)"""
+        results, timings = await run_stage_graph(stages)
+        timings["channel"] = self.channel
+        return results, timings
+
+    def build_user_prompt(self, message: str, context: Dict[str, Any]) -> str:
+        """Whitelisted context, trimmed history and the current message, within the channel's token budget"""
+        return self.prompt_builder.build(message, context)
+
     async def generate_response(self, message: str, context: Dict[str, Any]) -> Optional[str]:
         """Generate a response using OpenAI"""
         try:
-            system_prompt = self.get_system_prompt()
-            
-            # Build conversation history
-            conversation_history = ""
-            if "conversation_history" in context and context["conversation_history"]:
-                history = context["conversation_history"]
-                conversation_history = "\n\nConversation History:\n"
-                for msg in history:
-                    sender = "Customer" if msg["sender_type"] == "customer" else "Assistant"
-                    conversation_history += f"{sender}: {msg['content']}\n"
-            
-            # Create the full prompt with context
-            user_prompt = f"Context: {context}\n{conversation_history}\nCurrent Message: {message}"
-            
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
+            response = await self.chat_completion(
+                model=self.model,
                 messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
+                    {"role": "system", "content": self.get_system_prompt()},
+                    {"role": "user", "content": self.build_user_prompt(message, context)}
                 ]
             )
             return response.choices[0].message.content
         except Exception as e:
             print(f"Error generating response for {self.channel}: {str(e)}")
-            return None 
\ No newline at end of file
+            return None
+
+    def get_output_instructions(self) -> str:
+        """Instructions for the JSON object returned by generate_structured_response"""
+        lines = ['- "reply": your response to the customer']
+        for field, (allowed, _) in self.classification_fields.items():
+            if allowed:
+                lines.append(f'- "{field}": one of {", ".join(allowed)}')
+            else:
+                lines.append(f'- "{field}": text')
+        lines.append('- "confidence": number from 0 to 1, how sure you are of the classification')
+        return "Respond only with a JSON object with these keys:\n" + "\n".join(lines)
+
+    def parse_classification(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Validated classification fields, with defaults for missing or unknown values"""
+        classification = {}
+        for field, (allowed, default) in self.classification_fields.items():
+            value = data.get(field)
+            if isinstance(value, str):
+                value = value.strip()
+                if allowed:
+                    value = value.lower()
+            if not value or not isinstance(value, str) or (allowed and value not in allowed):
+                value = default
+            classification[field] = value
+        try:
+            classification["confidence"] = min(max(float(data.get("confidence")), 0.0), 1.0)
+        except (TypeError, ValueError):
+            classification["confidence"] = 0.5
+        return classification
+
+    async def _cache_lookup(self, message: str, context: Dict[str, Any]) -> Tuple[str, Tuple[str, str], Any, Optional[Dict[str, Any]]]:
+        """System prompt, cache namespace, message embedding and cached result (if any) for a message"""
+        system_prompt = f"{self.get_system_prompt()}\n\n{self.get_output_instructions()}"
+        namespace = (self.channel, prompt_hash(self.model, system_prompt, personalization_hash(context)))
+        vector = None
+        if response_cache.enabled and is_cacheable(message, context):
+            vector = await response_cache.embed(message)
+        else:
+            response_cache.skip()
+        if vector is not None:
+            cached = response_cache.lookup(namespace, vector, context)
+            if cached:
+                return system_prompt, namespace, vector, {
+                    "response": cached["response"], "classification": cached["classification"], "cached": True
+                }
+        return system_prompt, namespace, vector, None
+
+    def _parse_structured(self, content: str) -> Optional[Dict[str, Any]]:
+        data = json.loads(content or "{}")
+        reply = data.get("reply") if isinstance(data, dict) else None
+        if not isinstance(reply, str) or not reply.strip():
+            return None
+        return {"response": reply.strip(), "classification": self.parse_classification(data), "cached": False}
+
+    async def generate_structured_response(self, message: str, context: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Reply and classification from a single JSON-mode completion
+
+        Returns {"response": str, "classification": dict, "cached": bool}, or
+        None if the call fails or comes back without a reply. Short generic
+        messages are answered from the semantic response cache when a close
+        enough message was already answered on this channel and prompt.
+        """
+        try:
+            system_prompt, namespace, vector, cached = await self._cache_lookup(message, context)
+            if cached:
+                return cached
+
+            started = time.perf_counter()
+            response = await self.chat_completion(
+                model=self.model,
+                response_format={"type": "json_object"},
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": self.build_user_prompt(message, context)}
+                ]
+            )
+            result = self._parse_structured(response.choices[0].message.content)
+            if result and vector is not None:
+                response_cache.store(namespace, vector, context, result, (time.perf_counter() - started) * 1000)
+            return result
+        except Exception as e:
+            print(f"Error generating structured response for {self.channel}: {str(e)}")
+            return None
+
+    async def stream_structured_response(self, message: str, context: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """Streaming generate_structured_response
+
+        Yields {"type": "token", "text": str} as the reply is generated, then
+        one {"type": "result", "result": dict or None} once the completion ends.
+        """
+        try:
+            system_prompt, namespace, vector, cached = await self._cache_lookup(message, context)
+            if cached:
+                yield {"type": "token", "text": cached["response"]}
+                yield {"type": "result", "result": cached}
+                return
+
+            started = time.perf_counter()
+            streamer = JsonFieldStreamer("reply")
+            content, streamed = [], []
+            async for chunk in stream_chat_completion(
+                self.client,
+                model=self.model,
+                response_format={"type": "json_object"},
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": self.build_user_prompt(message, context)}
+                ]
+            ):
+                content.append(chunk)
+                text = streamer.feed(chunk)
+                if text:
+                    streamed.append(text)
+                    yield {"type": "token", "text": text}
+
+            try:
+                result = self._parse_structured("".join(content))
+            except ValueError:
+                result = None
+            if result is None and "".join(streamed).strip():
+                # Truncated or malformed JSON: keep what the customer already saw
+                result = {"response": "".join(streamed).strip(), "classification": self.parse_classification({}), "cached": False}
+            if result and vector is not None:
+                response_cache.store(namespace, vector, context, result, (time.perf_counter() - started) * 1000)
+            yield {"type": "result", "result": result}
+        except Exception as e:
+            print(f"Error streaming structured response for {self.channel}: {str(e)}")
+            yield {"type": "result", "result": None}
+
+    async def stream_message(self, message: str, context: Dict[str, Any]) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Streaming process_message: ("token", {"text"}) events, then ("done", result)
+
+        The result has the same shape as process_message's, with time to
+        first token and total time under "timings".
+        """
+        started = time.perf_counter()
+        ttft_ms = None
+        result = None
+        try:
+            async for event in self.stream_structured_response(message, {**context, "channel": self.channel}):
+                if event["type"] == "token":
+                    if ttft_ms is None:
+                        ttft_ms = round((time.perf_counter() - started) * 1000, 2)
+                    yield "token", {"text": event["text"]}
+                else:
+                    result = event["result"]
+        finally:
+            total_ms = round((time.perf_counter() - started) * 1000, 2)
+            stream_metrics.record(self.channel, ttft_ms, total_ms, result is not None)
+
+        timings = {"ttft_ms": ttft_ms, "total_ms": total_ms, "channel": self.channel}
+        if result:
+            yield "done", {
+                "status": "success",
+                "response": result["response"],
+                "intent": result["classification"],
+                "channel": self.channel,
+                "timings": timings
+            }
+        else:
+            yield "done", {
+                "status": "transferred",
+                "message": self.transfer_message,
+                "channel": self.channel,
+                "timings": timings
+            }
@@ -1,9 +1,15 @@
 from typing import Dict, Any
-from .base_agent import BaseAgent
+from .base_agent import BaseAgent, Stage, REPLY_TIMEOUT
 
 class EmailAgent(BaseAgent):
     """Email Support & Marketing Agent"""
     
+    classification_fields = {
+        "email_type": (["support", "marketing", "complaint", "order_issue", "return_request", "general"], "support"),
+        "urgency": (["low", "medium", "high"], "medium"),
+        "subject": (None, "Re: Your inquiry"),
+    }
+    
     def __init__(self, api_key: str):
         super().__init__(api_key, "email")
     
@@ -43,23 +49,27 @@ Always maintain brand voice and be helpful."""
     async def process_message(self, message: str, context: Dict[str, Any]) -> Dict[str, Any]:
         """Process email message"""
         try:
-            # Determine email type
-            email_type = await self._classify_email(message)
-            
-            # Generate appropriate response
-            response = await self.generate_response(message, {
-                **context,
-                "email_type": email_type,
-                "channel": "email"
-            })
+            # Classify, write the subject line and reply in one call
+            results, timings = await self.run_stages([
+                Stage("reply", lambda _: self.generate_structured_response(message, {
+                    **context,
+                    "channel": "email",
+                    "subject_max_length": 50
+                }), timeout=REPLY_TIMEOUT)
+            ])
+            result = results["reply"]
             
-            if response:
+            if result:
+                classification = result["classification"]
                 return {
                     "status": "success",
-                    "response": response,
-                    "email_type": email_type,
-                    "subject": await self._generate_subject(email_type, message),
-                    "channel": "email"
+                    "response": result["response"],
+                    "email_type": classification["email_type"],
+                    "subject": classification["subject"][:50],
+                    "urgency": classification["urgency"],
+                    "confidence": classification["confidence"],
+                    "channel": "email",
+                    "timings": timings
                 }
             else:
                 return {
@@ -74,34 +84,4 @@ Always maintain brand voice and be helpful."""
                 "status": "error",
                 "message": "Sorry, I'm having technical issues. Please try again.",
                 "channel": "email"
-            }
-    
-    async def _classify_email(self, message: str) -> str:
-        """Classify email type"""
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "Classify this email as: support, marketing, complaint, order_issue, return_request, general"},
-                    {"role": "user", "content": message}
-                ]
-            )
-            return "support"  # Default for now
-        except Exception as e:
-            print(f"Error classifying email: {str(e)}")
-            return "support"
-    
-    async def _generate_subject(self, email_type: str, message: str) -> str:
-        """Generate email subject line"""
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "Generate a professional email subject line for this message. Keep it under 50 characters."},
-                    {"role": "user", "content": f"Email type: {email_type}\nMessage: {message[:100]}..."}
-                ]
-            )
-            return "Re: Your inquiry"  # Default for now
-        except Exception as e:
-            print(f"Error generating subject: {str(e)}")
-            return "Re: Your inquiry" 
\ No newline at end of file
+            }
\ No newline at end of file
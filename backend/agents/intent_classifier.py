@@ -5,87 +5,427 @@ Classifies customer messages into different intents for proper routing
 """
 
 import os
-from typing import Dict, List, Any
-from openai import OpenAI
+import re
+import json
+import math
+import time
+import asyncio
+import threading
+from typing import Dict, List, Any, AsyncIterable, AsyncIterator, Iterable, Tuple, Union
+from .llm_client import get_async_client, chat_completion
+from .intent_model import LocalIntentModel, apply_rules, load_examples, SEED_EXAMPLES_PATH, DATA_DIR
+
+# Local predictions at or above this calibrated confidence skip the LLM
+LOCAL_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_LOCAL_THRESHOLD", "0.8"))
+# LLM labels at or above this confidence are logged as training data for the local model.
+# Off by default: the log keeps customer messages, so it must be enabled deliberately
+LABEL_LOGGING = os.getenv("INTENT_LABEL_LOGGING", "false").lower() in ("1", "true", "yes")
+LABEL_LOG_THRESHOLD = float(os.getenv("INTENT_LABEL_LOG_THRESHOLD", "0.9"))
+INTENT_MODEL_PATH = os.getenv("INTENT_MODEL_PATH", os.path.join(DATA_DIR, "intent_model.npz"))
+INTENT_LABEL_LOG = os.getenv("INTENT_LABEL_LOG", os.path.join(DATA_DIR, "intent_labels.jsonl"))
+
+# Batch classification: in-flight LLM requests, messages per packed prompt, longest message worth packing
+BATCH_CONCURRENCY = int(os.getenv("INTENT_BATCH_CONCURRENCY", "8"))
+PACK_SIZE = int(os.getenv("INTENT_PACK_SIZE", "20"))
+PACK_MAX_CHARS = int(os.getenv("INTENT_PACK_MAX_CHARS", "280"))
+BATCH_RETRIES = int(os.getenv("INTENT_BATCH_RETRIES", "2"))
+
+_RESULT_OBJECT_RE = re.compile(r"\{[^{}]*\}")
+_INTENT_VALUE_RE = re.compile(r'"intent"\s*:\s*"([^"]*)"')
+_EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+_PHONE_RE = re.compile(r"\+?\(?\d[\d\s().-]{6,}\d")
+
+# Intents for D2C businesses; the local model is trained on these labels in this order
+INTENTS = {
+    "order_tracking": "Customer wants to track their order status",
+    "product_inquiry": "Customer asking about products, features, or pricing",
+    "support_request": "Customer needs technical support or help",
+    "complaint": "Customer has a complaint or issue",
+    "return_refund": "Customer wants to return or get refund",
+    "general_inquiry": "General questions about the company or service",
+    "spam": "Spam or irrelevant messages",
+    "greeting": "Simple greetings or hello messages"
+}
+
+
+def redact(message: str) -> str:
+    """message with email addresses and phone numbers replaced by placeholders"""
+    return _PHONE_RE.sub("<phone>", _EMAIL_RE.sub("<email>", message))
+
+
+def train_local_model(labels: List[str], path: str = INTENT_MODEL_PATH) -> LocalIntentModel:
+    """Train the local model on the seed examples plus logged LLM labels and save it to path"""
+    model = LocalIntentModel(labels)
+    model.train(load_examples([SEED_EXAMPLES_PATH, INTENT_LABEL_LOG]))
+    try:
+        model.save(path)
+    except OSError as e:
+        print(f"Error saving local intent model: {e}")
+    return model
 
 class IntentClassifier:
     def __init__(self, openai_api_key: str):
         """Initialize intent classifier with OpenAI API key"""
-        self.client = OpenAI(api_key=openai_api_key)
-        
-        # Define common intents for D2C businesses
-        self.intents = {
-            "order_tracking": "Customer wants to track their order status",
-            "product_inquiry": "Customer asking about products, features, or pricing",
-            "support_request": "Customer needs technical support or help",
-            "complaint": "Customer has a complaint or issue",
-            "return_refund": "Customer wants to return or get refund",
-            "general_inquiry": "General questions about the company or service",
-            "spam": "Spam or irrelevant messages",
-            "greeting": "Simple greetings or hello messages"
-        }
-    
-    async def classify_intent(self, message: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
-        """Classify the intent of a customer message"""
+        self.client = get_async_client(openai_api_key)
+
+        self.intents = dict(INTENTS)
+
+        self.tier_counts = {"rules": 0, "local": 0, "llm": 0, "llm_errors": 0}
+        self.batch_counts = {"packed_requests": 0, "single_requests": 0, "retried_items": 0, "failed_items": 0}
+        self._local_seconds = 0.0
+        self._local_calls = 0
+        self._log_lock = threading.Lock()
+        self.local_model = self._load_local_model()
+
+    def _load_local_model(self) -> LocalIntentModel:
+        """The saved model; trained offline with `python -m backend.agents.intent_classifier`
+
+        Without a usable saved model, classification starts with an untrained
+        one (every message below the threshold goes to the LLM) while a
+        background thread trains and saves a new one.
+        """
+        if os.path.exists(INTENT_MODEL_PATH):
+            try:
+                model = LocalIntentModel.load(INTENT_MODEL_PATH)
+                if model.labels == list(self.intents):
+                    return model
+                print("Saved local intent model has different labels, retraining in the background")
+            except Exception as e:
+                print(f"Error loading local intent model, retraining in the background: {e}")
+        threading.Thread(target=self.retrain, daemon=True).start()
+        return LocalIntentModel(list(self.intents))
+
+    def retrain(self) -> LocalIntentModel:
+        """Train and save the local model, then switch to it"""
+        self.local_model = train_local_model(list(self.intents))
+        return self.local_model
+
+    def _log_label(self, message: str, intent: str, confidence: float) -> None:
+        if not LABEL_LOGGING:
+            return
         try:
-            # Create prompt for intent classification
-            prompt = f"""
+            with self._log_lock, open(INTENT_LABEL_LOG, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"message": redact(message), "intent": intent,
+                                    "confidence": round(confidence, 4)}) + "\n")
+        except OSError as e:
+            print(f"Error logging intent label: {e}")
+
+    def classify_local(self, message: str) -> Dict[str, Any]:
+        """First tier: keyword rules, then the hashed n-gram model"""
+        started = time.perf_counter()
+        rule = apply_rules(message)
+        if rule:
+            intent, confidence, tier = rule[0], rule[1], "rules"
+        else:
+            intent, confidence = self.local_model.predict(message)
+            tier = "local"
+        self._local_seconds += time.perf_counter() - started
+        self._local_calls += 1
+        return {"intent": intent, "confidence": confidence, "tier": tier}
+
+    async def _classify_llm(self, message: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
+        # Create prompt for intent classification
+        prompt = f"""
             Classify the following customer message into one of these intents:
-            
+
             {chr(10).join([f"- {intent}: {description}" for intent, description in self.intents.items()])}
-            
+
             Customer message: "{message}"
-            
+
             Context: {context or 'No additional context'}
-            
+
             Respond with only the intent name (e.g., "order_tracking", "product_inquiry", etc.)
             """
-            
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are an intent classification system for a D2C business. Classify customer messages accurately."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=50,
-                temperature=0.1
-            )
-            
-            intent = response.choices[0].message.content.strip().lower()
-            
-            # Validate intent
-            if intent not in self.intents:
-                intent = "general_inquiry"  # Default fallback
-            
+
+        response = await chat_completion(
+            self.client,
+            model="gpt-3.5-turbo",
+            messages=[
+                {"role": "system", "content": "You are an intent classification system for a D2C business. Classify customer messages accurately."},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=50,
+            temperature=0.1,
+            logprobs=True
+        )
+
+        choice = response.choices[0]
+        intent = choice.message.content.strip().strip('"').lower()
+        if intent not in self.intents:
+            # Treated like a failed request: callers fall back to the local answer or retry
+            raise ValueError(f"LLM returned an unknown intent: {intent!r}")
+
+        # The model's probability of the whole label it produced
+        tokens = choice.logprobs.content if choice.logprobs and choice.logprobs.content else []
+        confidence = math.exp(sum(token.logprob for token in tokens)) if tokens else 0.5
+        return {"intent": intent, "confidence": confidence}
+
+    async def classify_intent(self, message: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Classify the intent of a customer message
+
+        The local tier answers when its calibrated confidence reaches
+        INTENT_LOCAL_THRESHOLD; only the remaining messages go to the LLM.
+        """
+        local = self.classify_local(message)
+        if local["confidence"] >= LOCAL_CONFIDENCE_THRESHOLD:
+            self.tier_counts[local["tier"]] += 1
             return {
-                "intent": intent,
-                "confidence": 0.9,  # Placeholder confidence score
+                "intent": local["intent"],
+                "confidence": round(local["confidence"], 4),
+                "tier": local["tier"],
                 "message": message,
                 "context": context
             }
-            
+
+        try:
+            result = await self._classify_llm(message, context)
+            self.tier_counts["llm"] += 1
+            if result["confidence"] >= LABEL_LOG_THRESHOLD:
+                self._log_label(message, result["intent"], result["confidence"])
+            return {
+                "intent": result["intent"],
+                "confidence": round(result["confidence"], 4),
+                "tier": "llm",
+                "local_intent": local["intent"],
+                "local_confidence": round(local["confidence"], 4),
+                "message": message,
+                "context": context
+            }
+
         except Exception as e:
             print(f"Error classifying intent: {e}")
+            # Fall back to the low-confidence local answer rather than a blind default
+            self.tier_counts["llm_errors"] += 1
             return {
-                "intent": "general_inquiry",
-                "confidence": 0.0,
+                "intent": local["intent"],
+                "confidence": round(local["confidence"], 4),
+                "tier": local["tier"],
                 "message": message,
                 "context": context,
                 "error": str(e)
             }
-    
+
+    def get_tier_stats(self) -> Dict[str, Any]:
+        """Per-tier hit counts and the share of messages answered without the LLM"""
+        total = sum(self.tier_counts[tier] for tier in ("rules", "local", "llm"))
+        local_total = self.tier_counts["rules"] + self.tier_counts["local"]
+        return {
+            **self.tier_counts,
+            "local_rate": round(local_total / total, 4) if total else 0.0,
+            "avg_local_ms": round(self._local_seconds * 1000 / self._local_calls, 4) if self._local_calls else 0.0,
+            "local_model_examples": self.local_model.trained_on,
+            "local_model_temperature": self.local_model.temperature,
+            **self.batch_counts
+        }
+
     def get_intent_description(self, intent: str) -> str:
         """Get description for a specific intent"""
         return self.intents.get(intent, "Unknown intent")
-    
+
     def get_all_intents(self) -> Dict[str, str]:
         """Get all available intents"""
         return self.intents.copy()
-    
-    async def batch_classify(self, messages: List[str]) -> List[Dict[str, Any]]:
-        """Classify multiple messages at once"""
-        results = []
-        for message in messages:
-            result = await self.classify_intent(message)
-            results.append(result)
-        return results 
\ No newline at end of file
+
+    async def _classify_packed(self, messages: List[Tuple[int, str]]) -> Tuple[Dict[int, Dict[str, Any]], List[Tuple[int, str]]]:
+        """Classify several messages in one prompt with indexed JSON output
+
+        Returns (results by batch index, items the response did not cover).
+        Each item's confidence is the probability of the tokens of its intent
+        value in the output.
+        """
+        numbered = "\n".join(f"{i}: {json.dumps(message)}" for i, (_, message) in enumerate(messages))
+        prompt = f"""
+            Classify each of the following customer messages into one of these intents:
+
+            {chr(10).join([f"- {intent}: {description}" for intent, description in self.intents.items()])}
+
+            Messages:
+            {numbered}
+
+            Respond with a JSON object {{"results": [{{"i": <message number>, "intent": "<intent name>"}}, ...]}} with one entry per message.
+            """
+
+        response = await chat_completion(
+            self.client,
+            model="gpt-3.5-turbo",
+            messages=[
+                {"role": "system", "content": "You are an intent classification system for a D2C business. Classify customer messages accurately."},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=20 * len(messages) + 20,
+            temperature=0.1,
+            response_format={"type": "json_object"},
+            logprobs=True
+        )
+        self.batch_counts["packed_requests"] += 1
+
+        choice = response.choices[0]
+        tokens = choice.logprobs.content if choice.logprobs and choice.logprobs.content else []
+        text = "".join(token.token for token in tokens) if tokens else (choice.message.content or "")
+        offsets, position = [], 0
+        for token in tokens:
+            offsets.append((position, position + len(token.token), token.logprob))
+            position += len(token.token)
+
+        results: Dict[int, Dict[str, Any]] = {}
+        for match in _RESULT_OBJECT_RE.finditer(text):
+            try:
+                entry = json.loads(match.group())
+                i = int(entry.get("i"))
+            except (ValueError, TypeError):
+                continue
+            intent = str(entry.get("intent", "")).strip().lower()
+            if not 0 <= i < len(messages) or i in results or intent not in self.intents:
+                continue
+            confidence = 0.5
+            value = _INTENT_VALUE_RE.search(match.group())
+            if value and offsets:
+                start, end = match.start() + value.start(1), match.start() + value.end(1)
+                logprob = sum(lp for token_start, token_end, lp in offsets if token_start < end and token_end > start)
+                confidence = math.exp(logprob)
+            results[i] = {"intent": intent, "confidence": confidence}
+
+        failed = [item for i, item in enumerate(messages) if i not in results]
+        return {messages[i][0]: result for i, result in results.items()}, failed
+
+    async def _classify_group(self, items: List[Tuple[int, str]], local: Dict[int, Dict[str, Any]],
+                              semaphore: asyncio.Semaphore, emit, max_retries: int) -> None:
+        """LLM tier for one group of low-confidence messages, retrying only the items that failed"""
+        try:
+            pending, attempt = items, 0
+            while pending:
+                if attempt:
+                    self.batch_counts["retried_items"] += len(pending)
+                    await asyncio.sleep(0.5 * attempt)
+                try:
+                    if len(pending) == 1:
+                        self.batch_counts["single_requests"] += 1
+                        index, message = pending[0]
+                        results, failed = {index: await self._classify_llm(message)}, []
+                    else:
+                        results, failed = await self._classify_packed(pending)
+                except Exception as e:
+                    print(f"Error in batch classification request: {e}")
+                    results, failed = {}, pending
+
+                for index, message in pending:
+                    if index in results:
+                        self.tier_counts["llm"] += 1
+                        result = results[index]
+                        if result["confidence"] >= LABEL_LOG_THRESHOLD:
+                            self._log_label(message, result["intent"], result["confidence"])
+                        await emit(index, message, {
+                            "intent": result["intent"],
+                            "confidence": round(result["confidence"], 4),
+                            "tier": "llm",
+                            "local_intent": local[index]["intent"],
+                            "local_confidence": round(local[index]["confidence"], 4)
+                        })
+
+                attempt += 1
+                if failed and attempt > max_retries:
+                    # Out of retries: keep the low-confidence local answer
+                    for index, message in failed:
+                        self.tier_counts["llm_errors"] += 1
+                        self.batch_counts["failed_items"] += 1
+                        await emit(index, message, {
+                            "intent": local[index]["intent"],
+                            "confidence": round(local[index]["confidence"], 4),
+                            "tier": local[index]["tier"],
+                            "error": "LLM classification failed"
+                        })
+                    failed = []
+                pending = failed
+        finally:
+            semaphore.release()
+
+    async def iter_classify(self, messages: Union[Iterable[str], AsyncIterable[str]],
+                            concurrency: int = BATCH_CONCURRENCY, pack_size: int = PACK_SIZE,
+                            max_retries: int = BATCH_RETRIES) -> AsyncIterator[Dict[str, Any]]:
+        """Classify a stream of messages, yielding results as they complete
+
+        Accepts a list, any iterable or an async iterator (e.g. rows paged out
+        of a conversations table). Confident local answers are yielded
+        immediately. The rest are packed pack_size at a time into indexed JSON
+        prompts, with at most `concurrency` LLM requests in flight. Results
+        arrive out of order and carry the message's input position as "index".
+        """
+        # Bounded so a slow consumer holds back the local tier and the LLM groups instead of buffering everything
+        queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, concurrency * max(1, pack_size)))
+        semaphore = asyncio.Semaphore(concurrency)
+        done = object()
+
+        async def emit(index: int, message: str, result: Dict[str, Any]) -> None:
+            await queue.put({"index": index, **result, "message": message, "context": None})
+
+        async def produce() -> None:
+            tasks, pack, local = [], [], {}
+
+            async def dispatch(group: List[Tuple[int, str]]) -> None:
+                # Waiting for a slot here is what throttles reading from the input
+                await semaphore.acquire()
+                tasks.append(asyncio.ensure_future(self._classify_group(group, local, semaphore, emit, max_retries)))
+
+            try:
+                index = 0
+                source = messages.__aiter__() if hasattr(messages, "__aiter__") else None
+                iterator = None if source is not None else iter(messages)
+                while True:
+                    try:
+                        message = await source.__anext__() if source is not None else next(iterator)
+                    except (StopAsyncIteration, StopIteration):
+                        break
+                    result = self.classify_local(message)
+                    if result["confidence"] >= LOCAL_CONFIDENCE_THRESHOLD:
+                        self.tier_counts[result["tier"]] += 1
+                        await emit(index, message, {**result, "confidence": round(result["confidence"], 4)})
+                    else:
+                        local[index] = result
+                        if pack_size <= 1 or len(message) > PACK_MAX_CHARS:
+                            await dispatch([(index, message)])
+                        else:
+                            pack.append((index, message))
+                            if len(pack) >= pack_size:
+                                await dispatch(pack)
+                                pack = []
+                    index += 1
+                if pack:
+                    await dispatch(pack)
+                await asyncio.gather(*tasks)
+            except asyncio.CancelledError:
+                # The consumer has gone away, so nobody will read the end marker
+                raise
+            except BaseException:
+                # The input iterator (or a group) failed; the consumer re-raises it after the end marker
+                await queue.put(done)
+                raise
+            else:
+                await queue.put(done)
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+        producer = asyncio.ensure_future(produce())
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                yield item
+            await producer
+        finally:
+            if not producer.done():
+                producer.cancel()
+
+    async def batch_classify(self, messages: Union[Iterable[str], AsyncIterable[str]], **options: Any) -> List[Dict[str, Any]]:
+        """Classify multiple messages at once; results in input order"""
+        results = [result async for result in self.iter_classify(messages, **options)]
+        results.sort(key=lambda result: result["index"])
+        return results
+
+
+if __name__ == "__main__":
+    # Offline training: python -m backend.agents.intent_classifier
+    trained = train_local_model(list(INTENTS))
+    print(f"Trained local intent model on {trained.trained_on} examples "
+          f"(temperature {trained.temperature}) -> {INTENT_MODEL_PATH}")
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Local intent model for the IntentClassifier first tier
+Keyword rules plus a linear model over hashed n-grams, with temperature-calibrated confidences
+"""
+
+import os
+import re
+import json
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+N_FEATURES = 2 ** 16
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+SEED_EXAMPLES_PATH = os.path.join(DATA_DIR, "intent_examples.jsonl")
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+# (intent, pattern, confidence); first match wins
+KEYWORD_RULES = [
+    ("spam", re.compile(r"(https?://|www\.)\S+.*\b(win|winner|free|prize|crypto|bitcoin|click|lottery|earn)\b"
+                        r"|\b(win|winner|free|prize|crypto|bitcoin|click|lottery|earn)\b.*(https?://|www\.)"), 0.97),
+    ("greeting", re.compile(r"^\s*(hi+|hello+|hey+|hiya|yo|namaste|good (morning|afternoon|evening))"
+                            r"( there| team| guys)?\s*[!.,]*\s*$"), 0.98),
+    ("order_tracking", re.compile(r"\b(where is|where's|track|tracking|status of) (my |the )?(order|package|parcel|shipment)\b"
+                                  r"|\bhas my (order|package|parcel) (shipped|been shipped|dispatched)\b"), 0.95),
+    ("return_refund", re.compile(r"\b(refund|money back)\b|\b(return|exchange) (this|my|the|an?)\b"), 0.9),
+]
+
+
+def apply_rules(message: str) -> Optional[Tuple[str, float]]:
+    text = message.lower()
+    for intent, pattern, confidence in KEYWORD_RULES:
+        if pattern.search(text):
+            return intent, confidence
+    return None
+
+
+def hashed_features(message: str, n_features: int = N_FEATURES) -> Tuple[np.ndarray, np.ndarray]:
+    """Feature indices and L2-normalized counts of word 1-2 grams and char 3-grams"""
+    words = _WORD_RE.findall(message.lower())
+    grams = [f"w:{w}" for w in words]
+    grams += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f" {word} "
+        grams += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    if not grams:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    indices, counts = np.unique([zlib.crc32(g.encode("utf-8")) % n_features for g in grams], return_counts=True)
+    values = counts.astype(np.float32)
+    return indices, values / np.linalg.norm(values)
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return shifted / shifted.sum(axis=-1, keepdims=True)
+
+
+def load_examples(paths: Iterable[str]) -> List[Tuple[str, str]]:
+    """(message, intent) pairs from JSONL files with "message" and "intent" keys; missing files are skipped"""
+    examples = []
+    for path in paths:
+        if not path or not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get("message") and record.get("intent"):
+                    examples.append((record["message"], record["intent"]))
+    return examples
+
+
+class LocalIntentModel:
+    """Multinomial logistic regression over hashed n-grams
+
+    Trained with plain SGD; the softmax temperature is then fitted on
+    cross-validated predictions so predict_proba returns calibrated
+    probabilities rather than raw softmax scores.
+    """
+
+    def __init__(self, labels: Sequence[str], n_features: int = N_FEATURES):
+        self.labels = list(labels)
+        self.n_features = n_features
+        self.weights = np.zeros((n_features, len(self.labels)), dtype=np.float32)
+        self.bias = np.zeros(len(self.labels), dtype=np.float32)
+        self.temperature = 1.0
+        self.trained_on = 0
+
+    def _logits(self, message: str) -> np.ndarray:
+        indices, values = hashed_features(message, self.n_features)
+        return values @ self.weights[indices] + self.bias
+
+    def _fit(self, features: List[Tuple[np.ndarray, np.ndarray]], targets: np.ndarray,
+             epochs: int, learning_rate: float, l2: float, seed: int) -> None:
+        rng = np.random.default_rng(seed)
+        self.weights[:] = 0.0
+        self.bias[:] = 0.0
+        for epoch in range(epochs):
+            rate = learning_rate / (1 + epoch * 0.1)
+            for i in rng.permutation(len(features)):
+                indices, values = features[i]
+                probs = _softmax(values @ self.weights[indices] + self.bias)
+                probs[targets[i]] -= 1.0
+                self.weights[indices] -= rate * (np.outer(values, probs) + l2 * self.weights[indices])
+                self.bias -= rate * probs
+
+    def train(self, examples: List[Tuple[str, str]], epochs: int = 30, learning_rate: float = 0.5,
+              l2: float = 1e-4, folds: int = 3, seed: int = 0) -> "LocalIntentModel":
+        examples = [(message, intent) for message, intent in examples if intent in self.labels]
+        if not examples:
+            return self
+        features = [hashed_features(message, self.n_features) for message, _ in examples]
+        targets = np.array([self.labels.index(intent) for _, intent in examples])
+
+        # Out-of-fold logits for fitting the temperature
+        if len(examples) >= folds * 2:
+            order = np.random.default_rng(seed).permutation(len(examples))
+            held_logits, held_targets = [], []
+            for fold in range(folds):
+                held = order[fold::folds]
+                train = np.setdiff1d(order, held)
+                self._fit([features[i] for i in train], targets[train], epochs, learning_rate, l2, seed)
+                held_logits += [features[i][1] @ self.weights[features[i][0]] + self.bias for i in held]
+                held_targets += list(targets[held])
+            logits, labels = np.array(held_logits), np.array(held_targets)
+            best = None
+            for temperature in np.arange(0.25, 5.01, 0.05):
+                probs = _softmax(logits / temperature)
+                nll = -np.mean(np.log(probs[np.arange(len(labels)), labels] + 1e-12))
+                if best is None or nll < best[0]:
+                    best = (nll, float(temperature))
+            self.temperature = round(best[1], 2)
+
+        self._fit(features, targets, epochs, learning_rate, l2, seed)
+        self.trained_on = len(examples)
+        return self
+
+    def predict_proba(self, message: str) -> Dict[str, float]:
+        probs = _softmax(self._logits(message) / self.temperature)
+        return {label: float(p) for label, p in zip(self.labels, probs)}
+
+    def predict(self, message: str) -> Tuple[str, float]:
+        probs = _softmax(self._logits(message) / self.temperature)
+        best = int(np.argmax(probs))
+        return self.labels[best], float(probs[best])
+
+    def save(self, path: str) -> None:
+        # Only non-zero rows are stored; most hash buckets are never touched
+        rows = np.flatnonzero(np.any(self.weights != 0, axis=1))
+        with open(path, "wb") as f:
+            np.savez_compressed(f, rows=rows, weights=self.weights[rows], bias=self.bias,
+                                labels=np.array(self.labels), temperature=self.temperature,
+                                n_features=self.n_features, trained_on=self.trained_on)
+
+    @classmethod
+    def load(cls, path: str) -> "LocalIntentModel":
+        data = np.load(path)
+        model = cls([str(label) for label in data["labels"]], int(data["n_features"]))
+        model.weights[data["rows"]] = data["weights"]
+        model.bias[:] = data["bias"]
+        model.temperature = float(data["temperature"])
+        model.trained_on = int(data["trained_on"])
+        return model
@@ -0,0 +1,260 @@
+import os
+import time
+import asyncio
+import weakref
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from openai import AsyncOpenAI
+
+from ..resilience import FakeProvider, get_caller
+
+# Connection pool and concurrency settings shared by every agent in the process
+MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "30"))
+REQUEST_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))
+CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "32"))
+
+# Deadlines, retries, circuit breaking and fallback routing for every completion
+FALLBACK_MODEL = os.getenv("OPENAI_FALLBACK_MODEL", "gpt-4o-mini")
+CALL_DEADLINE = float(os.getenv("OPENAI_CALL_DEADLINE", "30"))
+ATTEMPT_TIMEOUT = float(os.getenv("OPENAI_ATTEMPT_TIMEOUT", "15"))
+# "fake" serves completions from the local FakeProvider, for tests and offline runs
+PROVIDER = os.getenv("LLM_PROVIDER", "openai")
+
+caller = get_caller(
+    "openai",
+    max_attempts=int(os.getenv("OPENAI_MAX_ATTEMPTS", "3")),
+    base_delay=float(os.getenv("OPENAI_BACKOFF_BASE", "0.25")),
+    max_delay=float(os.getenv("OPENAI_BACKOFF_MAX", "4")),
+    deadline=CALL_DEADLINE,
+    attempt_timeout=ATTEMPT_TIMEOUT,
+    hedge=os.getenv("OPENAI_HEDGE", "true").lower() == "true",
+    hedge_quantile=float(os.getenv("OPENAI_HEDGE_QUANTILE", "0.95")),
+    failure_threshold=int(os.getenv("OPENAI_BREAKER_THRESHOLD", "5")),
+    recovery_timeout=float(os.getenv("OPENAI_BREAKER_RECOVERY", "30")),
+)
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body wrapper that reports when the request's connection is given back"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release: Optional[Callable[[], None]] = release
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._release is not None:
+                self._release()
+                self._release = None
+
+
+class _MeteredTransport(httpx.AsyncBaseTransport):
+    """The pooled HTTP transport, counting in-flight requests and newly opened connections"""
+
+    def __init__(self, **kwargs: Any):
+        self._transport = httpx.AsyncHTTPTransport(**kwargs)
+        self._seen: "weakref.WeakSet[Any]" = weakref.WeakSet()
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.connections_opened = 0
+
+    def _connections(self) -> List[Any]:
+        pool = getattr(self._transport, "_pool", None)
+        return list(getattr(pool, "connections", []))
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            self._release()
+            raise
+        for connection in self._connections():
+            if connection not in self._seen:
+                # Every new connection is a new TCP + TLS handshake
+                self._seen.add(connection)
+                self.connections_opened += 1
+        response.stream = _ReleasingStream(response.stream, self._release)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        connections = [c for c in self._connections() if not c.is_closed()]
+        idle = sum(1 for c in connections if c.is_idle())
+        return {
+            "open_connections": len(connections),
+            "active_connections": len(connections) - idle,
+            "idle_connections": idle,
+            "connections_opened": self.connections_opened,
+            "utilization": round((len(connections) - idle) / MAX_CONNECTIONS, 3),
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+        }
+
+
+class _Limiter:
+    """asyncio.Semaphore that records how long requests wait for a slot"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._semaphore = asyncio.Semaphore(limit)
+        self.in_use = 0
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.acquired = 0
+        self.wait_seconds = 0.0
+
+    async def __aenter__(self) -> "_Limiter":
+        if self._semaphore.locked():
+            started = time.perf_counter()
+            self.waiting += 1
+            self.peak_waiting = max(self.peak_waiting, self.waiting)
+            try:
+                await self._semaphore.acquire()
+            finally:
+                self.waiting -= 1
+            self.wait_seconds += time.perf_counter() - started
+        else:
+            await self._semaphore.acquire()
+        self.acquired += 1
+        self.in_use += 1
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self.in_use -= 1
+        self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.limit,
+            "in_use": self.in_use,
+            "waiting": self.waiting,
+            "peak_waiting": self.peak_waiting,
+            "avg_wait_ms": round(self.wait_seconds / self.acquired * 1000, 2) if self.acquired else 0.0,
+        }
+
+
+_transport: Optional[_MeteredTransport] = None
+_http_client: Optional[httpx.AsyncClient] = None
+_clients: Dict[Tuple[str, str], Any] = {}
+_limiter: Optional[_Limiter] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """The process-wide pooled HTTP client all provider clients share."""
+    global _http_client, _transport
+    if _http_client is None or _http_client.is_closed:
+        _transport = _MeteredTransport(
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS,
+                                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                                keepalive_expiry=KEEPALIVE_EXPIRY),
+        )
+        _http_client = httpx.AsyncClient(
+            transport=_transport,
+            timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT),
+        )
+    return _http_client
+
+
+def get_client(provider: str = PROVIDER, api_key: Optional[str] = None) -> Any:
+    """The registry: one client per provider and API key for the whole process.
+
+    Agents, the intent classifier and MessageHandler all resolve their client
+    here, so they share one connection pool instead of opening their own.
+    """
+    api_key = api_key or os.getenv("OPENAI_API_KEY", "")
+    key = (provider, api_key)
+    client = _clients.get(key)
+    if client is None:
+        if provider == "fake":
+            client = FakeProvider()
+        elif provider == "openai":
+            # Retries happen in the resilience layer, not inside the SDK
+            client = AsyncOpenAI(api_key=api_key, http_client=get_http_client(), max_retries=0)
+        else:
+            raise ValueError(f"Unknown LLM provider: {provider}")
+        _clients[key] = client
+    return client
+
+
+def get_async_client(api_key: str) -> Any:
+    """The registry client for the configured provider (LLM_PROVIDER) and this API key."""
+    return get_client(PROVIDER, api_key)
+
+
+def get_limiter() -> _Limiter:
+    """Caps in-flight LLM requests across all agents at OPENAI_MAX_CONCURRENCY."""
+    global _limiter
+    if _limiter is None:
+        _limiter = _Limiter(MAX_CONCURRENCY)
+    return _limiter
+
+
+def pool_stats() -> Dict[str, Any]:
+    """Connection pool and concurrency-slot usage of this worker process, for sizing workers"""
+    return {
+        "pid": os.getpid(),
+        "clients": sorted(provider for provider, _ in _clients),
+        "max_connections": MAX_CONNECTIONS,
+        "max_keepalive_connections": MAX_KEEPALIVE_CONNECTIONS,
+        "pool": _transport.stats() if _transport is not None else None,
+        "limiter": get_limiter().stats(),
+    }
+
+
+async def chat_completion(client: AsyncOpenAI, model: str, deadline: Optional[float] = None, **kwargs: Any):
+    """A completion under the shared deadline, retry, breaker and fallback-model policy
+
+    Each attempt (and each hedged duplicate) takes its own concurrency slot.
+    """
+    async def attempt(model_name: str):
+        async with get_limiter():
+            return await client.chat.completions.create(model=model_name, **kwargs)
+
+    return await caller.call(attempt, model, FALLBACK_MODEL, deadline=deadline)
+
+
+async def stream_chat_completion(client: AsyncOpenAI, model: str, **kwargs: Any) -> AsyncIterator[str]:
+    """Content deltas of a streamed completion; the concurrency slot is held until the stream ends
+
+    Retries and fallback apply to opening the stream only; once tokens have
+    been forwarded a failure is raised to the caller.
+    """
+    async with get_limiter():
+        stream = await caller.call(
+            lambda model_name: client.chat.completions.create(model=model_name, stream=True, **kwargs),
+            model, FALLBACK_MODEL, hedge=False,
+        )
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.close()
+
+
+async def aclose() -> None:
+    global _http_client, _transport
+    if _http_client is not None:
+        await _http_client.aclose()
+    _http_client = None
+    _transport = None
+    _clients.clear()
@@ -0,0 +1,172 @@
+import os
+import re
+import json
+from typing import Any, Dict, List, Sequence
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # fall back to the regex estimate below
+    _encoding = None
+
+# Token budget for the user prompt (context + history + message) per channel
+CHANNEL_BUDGETS = {
+    "sms": int(os.getenv("PROMPT_BUDGET_SMS", "300")),
+    "whatsapp": int(os.getenv("PROMPT_BUDGET_WHATSAPP", "800")),
+    "web_chat": int(os.getenv("PROMPT_BUDGET_WEB_CHAT", "1500")),
+    "recommendation": int(os.getenv("PROMPT_BUDGET_RECOMMENDATION", "1500")),
+    "styling": int(os.getenv("PROMPT_BUDGET_STYLING", "1500")),
+    "email": int(os.getenv("PROMPT_BUDGET_EMAIL", "3000")),
+}
+DEFAULT_BUDGET = int(os.getenv("PROMPT_BUDGET_DEFAULT", "1500"))
+
+# Context fields the model may see, in priority order; everything else (ids, email, phone, raw request fields) is dropped
+CONTEXT_FIELDS = (
+    "name", "user_name", "max_length", "subject_max_length", "order_id", "preferences",
+    "recommendations", "outfits", "products", "recommended_products", "keywords_extracted",
+)
+# Keys kept from product dicts
+PRODUCT_KEYS = ("name", "category", "price", "fabric", "stock")
+
+MAX_LIST_ITEMS = 5
+# Share of the budget that context fields and the history summary may use at most
+CONTEXT_SHARE = 0.35
+SUMMARY_SHARE = 0.15
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+def count_tokens(text: str) -> int:
+    """Tokens in text: exact with tiktoken, otherwise estimated from words and punctuation"""
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    # Long words split into several BPE tokens; ~4 characters per token
+    return sum(max(1, (len(piece) + 3) // 4) for piece in _TOKEN_RE.findall(text))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    if _encoding is not None:
+        return _encoding.decode(_encoding.encode(text)[:max_tokens]) + "…"
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(text[:mid]) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low].rstrip() + "…"
+
+
+def _compact(value: Any) -> Any:
+    """Drop empty values, trim lists and reduce product dicts to their useful keys"""
+    if isinstance(value, str):
+        try:
+            # Preferences and product lists are sometimes stored as JSON strings
+            if value[:1] in "[{":
+                return _compact(json.loads(value))
+        except ValueError:
+            pass
+        return value.strip()
+    if isinstance(value, dict):
+        if "name" in value and any(key in value for key in ("price", "category")):
+            value = {key: value[key] for key in PRODUCT_KEYS if key in value}
+        return {key: _compact(item) for key, item in value.items() if item not in (None, "", [], {})}
+    if isinstance(value, (list, tuple)):
+        return [_compact(item) for item in list(value)[:MAX_LIST_ITEMS]]
+    return value
+
+
+def serialize_value(value: Any) -> str:
+    value = _compact(value)
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+class PromptBuilder:
+    """Builds the user prompt for an agent within a token budget
+
+    Only whitelisted context fields are serialized, one compact line each.
+    The current message always goes in; the conversation history fills what
+    is left, newest turns first, and older turns that do not fit are reduced
+    to a short summary line. The system prompt is not built here, so it stays
+    byte-identical across requests and provider prompt caching can reuse it.
+    """
+
+    def __init__(self, budget: int, fields: Sequence[str] = CONTEXT_FIELDS):
+        self.budget = budget
+        self.fields = fields
+
+    @classmethod
+    def for_channel(cls, channel: str) -> "PromptBuilder":
+        return cls(CHANNEL_BUDGETS.get(channel, DEFAULT_BUDGET))
+
+    def _context_lines(self, context: Dict[str, Any], budget: int) -> List[str]:
+        lines = []
+        for field in self.fields:
+            value = context.get(field)
+            if value in (None, "", [], {}):
+                continue
+            line = f"{field}: {serialize_value(value)}"
+            cost = count_tokens(line)
+            if cost > budget:
+                line = truncate_tokens(line, budget)
+                cost = count_tokens(line)
+            if cost <= 0 or budget <= 0:
+                break
+            lines.append(line)
+            budget -= cost
+        return lines
+
+    def _history_lines(self, history: List[Dict[str, Any]], budget: int) -> List[str]:
+        kept: List[str] = []
+        summary_budget = int(self.budget * SUMMARY_SHARE)
+        remaining = budget - summary_budget if len(history) > 1 else budget
+        cut = len(history)
+        for i in range(len(history) - 1, -1, -1):
+            msg = history[i]
+            sender = "Customer" if msg.get("sender_type") == "customer" else "Assistant"
+            line = f"{sender}: {msg.get('content', '')}"
+            cost = count_tokens(line)
+            if cost > remaining:
+                break
+            kept.append(line)
+            remaining -= cost
+            cut = i
+        kept.reverse()
+        if cut == 0:
+            return kept
+
+        # Older turns: the opening words of each customer message
+        earlier = [" ".join(str(msg.get("content", "")).split()[:12]) for msg in history[:cut]
+                   if msg.get("sender_type") == "customer"]
+        summary = f"[{cut} earlier messages] Customer earlier said: " + " | ".join(earlier) if earlier \
+            else f"[{cut} earlier messages omitted]"
+        return [truncate_tokens(summary, summary_budget + max(remaining, 0))] + kept
+
+    def build(self, message: str, context: Dict[str, Any]) -> str:
+        message = truncate_tokens(message, self.budget // 2)
+        # Section headers and separators
+        remaining = self.budget - count_tokens(message) - 16
+
+        context_lines = self._context_lines(context, min(int(self.budget * CONTEXT_SHARE), remaining))
+        remaining -= sum(count_tokens(line) for line in context_lines)
+
+        parts = []
+        if context_lines:
+            parts.append("Context:\n" + "\n".join(context_lines))
+        history = context.get("conversation_history") or []
+        if history and remaining > 0:
+            history_lines = self._history_lines(history, remaining)
+            if history_lines:
+                parts.append("Conversation History:\n" + "\n".join(history_lines))
+        parts.append(f"Current Message: {message}")
+        return "\n\n".join(parts)
+
+    def measure(self, message: str, context: Dict[str, Any]) -> Dict[str, int]:
+        prompt = self.build(message, context)
+        return {"budget": self.budget, "tokens": count_tokens(prompt)}
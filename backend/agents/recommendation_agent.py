@@ -1,11 +1,19 @@
 from typing import Dict, Any
+import asyncio
 import csv
 import os
-from .base_agent import BaseAgent
+from .base_agent import BaseAgent, Stage, REPLY_TIMEOUT, LOOKUP_TIMEOUT
+
+DEFAULT_RECOMMENDATIONS = ["Casual Shirt", "Slim Fit Jeans", "Sneakers"]
 
 class RecommendationAgent(BaseAgent):
     """Recommendation Agent for personalized fashion suggestions"""
     
+    classification_fields = {
+        "intent": (["style", "product", "trend", "general"], "general"),
+        "urgency": (["low", "medium", "high"], "low"),
+    }
+    
     def __init__(self, api_key: str, csv_path: str = None):
         super().__init__(api_key, "recommendation")
         self.csv_path = csv_path
@@ -30,26 +38,25 @@ Always be helpful, trendy, and align with brand voice."""
 
     async def process_message(self, message: str, context: Dict[str, Any]) -> Dict[str, Any]:
         try:
-            # Analyze intent
-            intent = await self._analyze_intent(message)
-            
-            # Load CSV data if available
-            recommendations = await self._load_recommendations(message, context)
+            # Load CSV data if available, then classify and reply in one call
+            results, timings = await self.run_stages([
+                Stage("recommendations", lambda _: self._load_recommendations(message, context),
+                      timeout=LOOKUP_TIMEOUT, fallback=DEFAULT_RECOMMENDATIONS),
+                Stage("reply", lambda done: self.generate_structured_response(message, {
+                    **context,
+                    "channel": "recommendation",
+                    "recommendations": done["recommendations"]
+                }), depends_on=["recommendations"], timeout=REPLY_TIMEOUT)
+            ])
+            result = results["reply"]
             
-            # Generate response
-            response = await self.generate_response(message, {
-                **context,
-                "intent": intent,
-                "channel": "recommendation",
-                "recommendations": recommendations
-            })
-            
-            if response:
+            if result:
                 return {
                     "status": "success",
-                    "response": response,
-                    "intent": intent,
-                    "channel": "recommendation"
+                    "response": result["response"],
+                    "intent": result["classification"],
+                    "channel": "recommendation",
+                    "timings": timings
                 }
             return {
                 "status": "transferred",
@@ -65,31 +72,13 @@ Always be helpful, trendy, and align with brand voice."""
                 "channel": "recommendation"
             }
     
-    async def _analyze_intent(self, message: str) -> Dict[str, Any]:
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "Analyze this message for fashion recommendation intent. Return JSON with: intent (style, product, trend, general), confidence (0-1), urgency (low, medium, high)"},
-                    {"role": "user", "content": message}
-                ]
-            )
-            return {
-                "intent": "general",
-                "confidence": 0.8,
-                "urgency": "low"
-            }
-        except Exception as e:
-            print(f"Error analyzing recommendation intent: {str(e)}")
-            return {
-                "intent": "general",
-                "confidence": 0.5,
-                "urgency": "low"
-            }
-    
     async def _load_recommendations(self, message: str, context: Dict[str, Any]) -> list:
+        # File reads happen off the event loop
+        return await asyncio.to_thread(self._read_recommendations, message)
+    
+    def _read_recommendations(self, message: str) -> list:
         if not self.csv_path or not os.path.exists(self.csv_path):
-            return ["Casual Shirt", "Slim Fit Jeans", "Sneakers"]
+            return list(DEFAULT_RECOMMENDATIONS)
         
         try:
             recommendations = []
@@ -100,7 +89,7 @@ Always be helpful, trendy, and align with brand voice."""
                         recommendations.append(row['product'])
                     if len(recommendations) >= 3:
                         break
-            return recommendations if recommendations else ["Casual Shirt", "Slim Fit Jeans", "Sneakers"]
+            return recommendations if recommendations else list(DEFAULT_RECOMMENDATIONS)
         except Exception as e:
             print(f"Error loading CSV recommendations: {str(e)}")
-            return ["Casual Shirt", "Slim Fit Jeans", "Sneakers"]
\ No newline at end of file
+            return list(DEFAULT_RECOMMENDATIONS)
\ No newline at end of file
@@ -0,0 +1,248 @@
+import os
+import re
+import time
+import asyncio
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE", "true").lower() in ("1", "true", "yes")
+RESPONSE_CACHE_MODEL = os.getenv("RESPONSE_CACHE_MODEL", "all-MiniLM-L6-v2")
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.92"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "5000"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+# Messages longer than this are too specific to be worth caching
+RESPONSE_CACHE_MAX_MESSAGE_CHARS = int(os.getenv("RESPONSE_CACHE_MAX_MESSAGE_CHARS", "200"))
+
+# Context fields whose values are swapped for placeholders in cached replies
+PERSONAL_FIELDS = ("name", "user_name", "email", "phone_number")
+# Context fields the prompt builder puts in front of the model; replies are only shared
+# between requests whose values for these match, so one customer's personalized reply
+# is never served to another
+PERSONALIZATION_FIELDS = ("preferences", "products", "recommended_products", "keywords_extracted",
+                          "recommendations", "outfits", "order_id")
+
+_PUNCT_RE = re.compile(r"[^\w\s]")
+
+
+def normalize_message(message: str) -> str:
+    return " ".join(_PUNCT_RE.sub(" ", message.lower()).split())
+
+
+def prompt_hash(*parts: str) -> str:
+    return hashlib.sha1("\x00".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def personalization_hash(context: Dict[str, Any]) -> str:
+    """Hash of the non-empty personalization fields of a context ("" when there are none)"""
+    fields = {field: context[field] for field in PERSONALIZATION_FIELDS if context.get(field)}
+    if not fields:
+        return ""
+    return prompt_hash(json.dumps(fields, sort_keys=True, default=str))
+
+
+def is_cacheable(message: str, context: Dict[str, Any]) -> bool:
+    """Only short, context-free messages get shared replies.
+
+    Anything with digits (order numbers, amounts, dates) or a conversation
+    history behind it depends on more than the wording of the message.
+    """
+    if context.get("conversation_history"):
+        return False
+    normalized = normalize_message(message)
+    return bool(normalized) and len(normalized) <= RESPONSE_CACHE_MAX_MESSAGE_CHARS \
+        and not any(char.isdigit() for char in normalized)
+
+
+def _personal_values(context: Dict[str, Any]) -> List[Tuple[str, str]]:
+    values = []
+    for field in PERSONAL_FIELDS:
+        value = context.get(field)
+        if isinstance(value, str) and len(value.strip()) >= 2:
+            values.append((field, value.strip()))
+    # Longest first so "Ann Lee" is replaced before "Ann"
+    return sorted(values, key=lambda item: len(item[1]), reverse=True)
+
+
+def template_reply(reply: str, context: Dict[str, Any]) -> str:
+    """Replace the customer's personal details in a reply with {{field}} placeholders
+
+    Only whole-word occurrences are replaced, so a name like "Al" leaves
+    "Always" alone.
+    """
+    for field, value in _personal_values(context):
+        placeholder = "{{" + field + "}}"
+        reply = re.sub(r"(?<!\w)" + re.escape(value) + r"(?!\w)", lambda _: placeholder, reply)
+    return reply
+
+
+def fill_reply(template: str, context: Dict[str, Any]) -> Optional[str]:
+    """Fill placeholders from the current context; None if a needed field is missing"""
+    reply = template
+    for field in PERSONAL_FIELDS:
+        placeholder = "{{" + field + "}}"
+        if placeholder in reply:
+            value = context.get(field)
+            if not isinstance(value, str) or not value.strip():
+                return None
+            reply = reply.replace(placeholder, value.strip())
+    return reply
+
+
+class _VectorTable:
+    """Normalized message embeddings for one (channel, prompt) namespace, with free-slot reuse"""
+
+    def __init__(self, dim: int, capacity: int = 64):
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.entries: List[Optional[Dict[str, Any]]] = [None] * capacity
+        self.free = list(range(capacity - 1, -1, -1))
+
+    def add(self, vector: np.ndarray, entry: Dict[str, Any]) -> int:
+        if not self.free:
+            capacity = len(self.entries)
+            self.vectors = np.vstack([self.vectors, np.zeros_like(self.vectors)])
+            self.entries.extend([None] * capacity)
+            self.free = list(range(2 * capacity - 1, capacity - 1, -1))
+        slot = self.free.pop()
+        self.vectors[slot] = vector
+        self.entries[slot] = entry
+        return slot
+
+    def remove(self, slot: int) -> None:
+        self.vectors[slot] = 0.0
+        self.entries[slot] = None
+        self.free.append(slot)
+
+    def nearest(self, vector: np.ndarray) -> Tuple[Optional[int], float]:
+        if len(self.free) == len(self.entries):
+            return None, 0.0
+        scores = self.vectors @ vector
+        slot = int(np.argmax(scores))
+        if self.entries[slot] is None:
+            return None, 0.0
+        return slot, float(scores[slot])
+
+
+class SemanticResponseCache:
+    """Agent replies cached by channel, prompt and personalization hash and message embedding.
+
+    A lookup embeds the normalized message with a local sentence-transformers
+    model and returns the stored reply of the most similar earlier message in
+    the same namespace when the cosine similarity reaches the threshold.
+    Entries expire after ttl_seconds and the least recently used are evicted
+    beyond max_entries. Personal details from the context are stored as
+    placeholders and filled back in from the requesting customer's context.
+    """
+
+    def __init__(self, encoder_factory: Callable[[], Any], threshold: float = RESPONSE_CACHE_THRESHOLD,
+                 max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, ttl_seconds: float = RESPONSE_CACHE_TTL,
+                 enabled: bool = RESPONSE_CACHE_ENABLED):
+        self._encoder_factory = encoder_factory
+        self._encoder = None
+        self._encoder_lock = threading.Lock()
+        self.enabled = enabled
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._tables: Dict[Tuple[str, str], _VectorTable] = {}
+        self._lru: "OrderedDict[Tuple[Tuple[str, str], int], None]" = OrderedDict()
+        self.stats_counters = {"hits": 0, "misses": 0, "skipped": 0, "stores": 0, "evictions": 0, "errors": 0}
+        self._saved_ms = 0.0
+        self._lookup_ms = 0.0
+
+    def _encode(self, text: str) -> np.ndarray:
+        with self._encoder_lock:
+            if self._encoder is None:
+                self._encoder = self._encoder_factory()
+        vector = np.asarray(self._encoder.encode([text], normalize_embeddings=True, show_progress_bar=False),
+                            dtype=np.float32)[0]
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    async def embed(self, message: str) -> Optional[np.ndarray]:
+        if not self.enabled:
+            return None
+        try:
+            return await asyncio.to_thread(self._encode, normalize_message(message))
+        except Exception as e:
+            # Without a local embedding model the cache switches itself off
+            print(f"Response cache disabled: {str(e)}")
+            self.enabled = False
+            self.stats_counters["errors"] += 1
+            return None
+
+    def _evict(self, key: Tuple[Tuple[str, str], int]) -> None:
+        namespace, slot = key
+        self._lru.pop(key, None)
+        self._tables[namespace].remove(slot)
+
+    def lookup(self, namespace: Tuple[str, str], vector: np.ndarray, context: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        started = time.perf_counter()
+        try:
+            table = self._tables.get(namespace)
+            slot, score = table.nearest(vector) if table is not None else (None, 0.0)
+            if slot is None or score < self.threshold:
+                self.stats_counters["misses"] += 1
+                return None
+            entry = table.entries[slot]
+            if time.time() - entry["created_at"] >= self.ttl:
+                self._evict((namespace, slot))
+                self.stats_counters["misses"] += 1
+                return None
+            reply = fill_reply(entry["template"], context)
+            if reply is None:
+                self.stats_counters["misses"] += 1
+                return None
+            self._lru.move_to_end((namespace, slot))
+            self.stats_counters["hits"] += 1
+            self._saved_ms += entry["latency_ms"]
+            return {"response": reply, "classification": dict(entry["classification"]),
+                    "similarity": round(score, 4)}
+        finally:
+            self._lookup_ms += (time.perf_counter() - started) * 1000
+
+    def store(self, namespace: Tuple[str, str], vector: np.ndarray, context: Dict[str, Any],
+              result: Dict[str, Any], latency_ms: float) -> None:
+        table = self._tables.get(namespace)
+        if table is None:
+            table = self._tables[namespace] = _VectorTable(vector.shape[0])
+        slot, score = table.nearest(vector)
+        if slot is not None and score >= self.threshold:
+            # A near-duplicate is already cached; refresh it instead of adding another row
+            self._evict((namespace, slot))
+        slot = table.add(vector, {
+            "template": template_reply(result["response"], context),
+            "classification": dict(result["classification"]),
+            "created_at": time.time(),
+            "latency_ms": latency_ms,
+        })
+        self._lru[(namespace, slot)] = None
+        self.stats_counters["stores"] += 1
+        while len(self._lru) > self.max_entries:
+            self._evict(next(iter(self._lru)))
+            self.stats_counters["evictions"] += 1
+
+    def skip(self) -> None:
+        self.stats_counters["skipped"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.stats_counters["hits"] + self.stats_counters["misses"]
+        return {
+            **self.stats_counters,
+            "enabled": self.enabled,
+            "entries": len(self._lru),
+            "hit_rate": round(self.stats_counters["hits"] / lookups, 4) if lookups else 0.0,
+            "saved_latency_ms": round(self._saved_ms, 2),
+            "avg_lookup_ms": round(self._lookup_ms / lookups, 3) if lookups else 0.0,
+        }
+
+
+def _load_encoder():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(RESPONSE_CACHE_MODEL)
+
+
+response_cache = SemanticResponseCache(_load_encoder)
@@ -1,9 +1,14 @@
 from typing import Dict, Any
-from .base_agent import BaseAgent
+from .base_agent import BaseAgent, Stage, REPLY_TIMEOUT
 
 class SMSAgent(BaseAgent):
     """SMS Notification & Support Agent"""
     
+    classification_fields = {
+        "sms_type": (["order_update", "support", "marketing", "delivery", "complaint"], "support"),
+        "urgency": (["low", "medium", "high"], "medium"),
+    }
+    
     def __init__(self, api_key: str):
         super().__init__(api_key, "sms")
     
@@ -36,23 +41,26 @@ Always be concise, helpful, and include clear next steps."""
     async def process_message(self, message: str, context: Dict[str, Any]) -> Dict[str, Any]:
         """Process SMS message"""
         try:
-            # Analyze SMS type
-            sms_type = await self._classify_sms(message)
-            
-            # Generate short response
-            response = await self.generate_response(message, {
-                **context,
-                "sms_type": sms_type,
-                "channel": "sms",
-                "max_length": 160
-            })
+            # Classify and generate a short response in one call
+            results, timings = await self.run_stages([
+                Stage("reply", lambda _: self.generate_structured_response(message, {
+                    **context,
+                    "channel": "sms",
+                    "max_length": 160
+                }), timeout=REPLY_TIMEOUT)
+            ])
+            result = results["reply"]
             
-            if response and len(response) <= 160:
+            if result and len(result["response"]) <= 160:
+                classification = result["classification"]
                 return {
                     "status": "success",
-                    "response": response,
-                    "sms_type": sms_type,
-                    "channel": "sms"
+                    "response": result["response"],
+                    "sms_type": classification["sms_type"],
+                    "urgency": classification["urgency"],
+                    "confidence": classification["confidence"],
+                    "channel": "sms",
+                    "timings": timings
                 }
             else:
                 return {
@@ -67,19 +75,4 @@ Always be concise, helpful, and include clear next steps."""
                 "status": "error",
                 "message": "Call 1-800-XXX-XXXX for help",
                 "channel": "sms"
-            }
-    
-    async def _classify_sms(self, message: str) -> str:
-        """Classify SMS type"""
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "Classify this SMS as: order_update, support, marketing, delivery, complaint"},
-                    {"role": "user", "content": message}
-                ]
-            )
-            return "support"  # Default for now
-        except Exception as e:
-            print(f"Error classifying SMS: {str(e)}")
-            return "support" 
\ No newline at end of file
+            }
\ No newline at end of file
@@ -0,0 +1,105 @@
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger("StageGraph")
+
+class Stage:
+    """One step of an agent pipeline
+
+    run receives the results of the stages listed in depends_on (by name) and
+    returns the stage's result. If it raises or exceeds timeout seconds, the
+    stage resolves to fallback instead and downstream stages still run.
+    """
+
+    def __init__(self, name: str, run: Callable[[Dict[str, Any]], Awaitable[Any]],
+                 depends_on: Iterable[str] = (), timeout: Optional[float] = None, fallback: Any = None):
+        self.name = name
+        self.run = run
+        self.depends_on = tuple(depends_on)
+        self.timeout = timeout
+        self.fallback = fallback
+
+def _check_graph(stages: List[Stage]) -> None:
+    names = [stage.name for stage in stages]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate stage names: {names}")
+    by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        for dep in stage.depends_on:
+            if dep not in by_name:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{dep}'")
+
+    # Depth-first search for a dependency cycle
+    state: Dict[str, int] = {}
+    def visit(name: str) -> None:
+        if state.get(name) == 1:
+            raise ValueError(f"Stage graph has a cycle through '{name}'")
+        if state.get(name) == 2:
+            return
+        state[name] = 1
+        for dep in by_name[name].depends_on:
+            visit(dep)
+        state[name] = 2
+    for name in names:
+        visit(name)
+
+def critical_path(stages: List[Stage], timings: Dict[str, Dict[str, Any]]) -> List[str]:
+    """Chain of stages that determined the total latency, first to last"""
+    if not timings:
+        return []
+    by_name = {stage.name: stage for stage in stages}
+    end = lambda name: timings[name]["start_ms"] + timings[name]["duration_ms"]
+    path = [max(timings, key=end)]
+    while by_name[path[-1]].depends_on:
+        path.append(max(by_name[path[-1]].depends_on, key=end))
+    return path[::-1]
+
+async def run_stage_graph(stages: List[Stage]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Run stages as soon as their dependencies finish, independent ones concurrently
+
+    Returns (results by stage name, timings). Timings hold each stage's start
+    offset and duration in ms, its status (ok, timeout, error), the total and
+    the critical path.
+    """
+    _check_graph(stages)
+    started = time.perf_counter()
+    tasks: Dict[str, asyncio.Task] = {}
+    timings: Dict[str, Dict[str, Any]] = {}
+
+    async def execute(stage: Stage) -> Any:
+        inputs = {}
+        for dep in stage.depends_on:
+            inputs[dep] = await tasks[dep]
+        stage_started = time.perf_counter()
+        status = "ok"
+        try:
+            result = await asyncio.wait_for(stage.run(inputs), stage.timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Stage '{stage.name}' timed out after {stage.timeout}s")
+            status, result = "timeout", stage.fallback
+        except Exception as e:
+            logger.warning(f"Stage '{stage.name}' failed: {e!r}")
+            status, result = "error", stage.fallback
+        timings[stage.name] = {
+            "start_ms": round((stage_started - started) * 1000, 2),
+            "duration_ms": round((time.perf_counter() - stage_started) * 1000, 2),
+            "status": status
+        }
+        return result
+
+    for stage in stages:
+        tasks[stage.name] = asyncio.ensure_future(execute(stage))
+    try:
+        values = await asyncio.gather(*tasks.values())
+    except BaseException:
+        for task in tasks.values():
+            task.cancel()
+        raise
+
+    return dict(zip(tasks, values)), {
+        "stages": timings,
+        "total_ms": round((time.perf_counter() - started) * 1000, 2),
+        "critical_path": critical_path(stages, timings)
+    }
@@ -0,0 +1,145 @@
+import json
+from typing import Any, Dict, Optional, Tuple
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+def sse_event(event: str, data: Any) -> str:
+    """One Server-Sent Events frame with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+class JsonFieldStreamer:
+    """Decodes one string field of a JSON object while the object is still streaming in
+
+    feed() takes raw completion chunks and returns the newly decoded part of
+    the field's value, so the reply inside a JSON-mode completion can be
+    forwarded token by token before the object is complete.
+    """
+
+    def __init__(self, field: str = "reply"):
+        self._key = f'"{field}"'
+        self._buffer = ""
+        self._pos: Optional[int] = None
+        self.done = False
+
+    def _find_start(self) -> None:
+        search_from = 0
+        while True:
+            key = self._buffer.find(self._key, search_from)
+            if key == -1:
+                return
+            i = key + len(self._key)
+            while i < len(self._buffer) and self._buffer[i].isspace():
+                i += 1
+            if i < len(self._buffer) and self._buffer[i] == ":":
+                i += 1
+                while i < len(self._buffer) and self._buffer[i].isspace():
+                    i += 1
+                if i < len(self._buffer) and self._buffer[i] == '"':
+                    self._pos = i + 1
+                return
+            if i >= len(self._buffer):
+                return
+            search_from = key + 1
+
+    @staticmethod
+    def _decode_unicode(buffer: str, i: int) -> Optional[Tuple[str, int]]:
+        """(text, next position) for the \\uXXXX escape at i, or None until enough input has arrived
+
+        A high surrogate is combined with the \\uXXXX low surrogate that
+        follows it, waiting for that escape if it is cut off; unpaired
+        surrogates decode to U+FFFD.
+        """
+        if i + 6 > len(buffer):
+            return None
+        try:
+            code = int(buffer[i + 2:i + 6], 16)
+        except ValueError:
+            return "", i + 6
+        if 0xDC00 <= code <= 0xDFFF:
+            return "\ufffd", i + 6
+        if not 0xD800 <= code <= 0xDBFF:
+            return chr(code), i + 6
+        following = buffer[i + 6:i + 12]
+        if len(following) < 6 and "\\u".startswith(following[:2]):
+            return None
+        if not following.startswith("\\u"):
+            return "\ufffd", i + 6
+        try:
+            low = int(following[2:], 16)
+        except ValueError:
+            return "\ufffd", i + 6
+        if not 0xDC00 <= low <= 0xDFFF:
+            return "\ufffd", i + 6
+        return chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)), i + 12
+
+    def feed(self, chunk: str) -> str:
+        if self.done:
+            return ""
+        self._buffer += chunk
+        if self._pos is None:
+            self._find_start()
+            if self._pos is None:
+                return ""
+
+        out = []
+        buffer, i = self._buffer, self._pos
+        while i < len(buffer):
+            char = buffer[i]
+            if char == '"':
+                self.done = True
+                i += 1
+                break
+            if char != "\\":
+                out.append(char)
+                i += 1
+                continue
+            # Escape sequence; wait for more input if it is cut off
+            if i + 1 >= len(buffer):
+                break
+            code = buffer[i + 1]
+            if code == "u":
+                decoded = self._decode_unicode(buffer, i)
+                if decoded is None:
+                    break
+                text, i = decoded
+                out.append(text)
+            else:
+                out.append(_ESCAPES.get(code, code))
+                i += 2
+        self._pos = i
+        return "".join(out)
+
+
+class StreamMetrics:
+    """Time-to-first-token and total stream time per channel"""
+
+    def __init__(self):
+        self._channels: Dict[str, Dict[str, float]] = {}
+
+    def record(self, channel: str, ttft_ms: Optional[float], total_ms: float, completed: bool) -> None:
+        stats = self._channels.setdefault(channel, {"streams": 0, "completed": 0, "ttft_ms_sum": 0.0,
+                                                     "ttft_count": 0, "total_ms_sum": 0.0, "max_ttft_ms": 0.0})
+        stats["streams"] += 1
+        stats["completed"] += int(completed)
+        stats["total_ms_sum"] += total_ms
+        if ttft_ms is not None:
+            stats["ttft_ms_sum"] += ttft_ms
+            stats["ttft_count"] += 1
+            stats["max_ttft_ms"] = max(stats["max_ttft_ms"], ttft_ms)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            channel: {
+                "streams": stats["streams"],
+                "completed": stats["completed"],
+                "avg_ttft_ms": round(stats["ttft_ms_sum"] / stats["ttft_count"], 2) if stats["ttft_count"] else 0.0,
+                "max_ttft_ms": round(stats["max_ttft_ms"], 2),
+                "avg_total_ms": round(stats["total_ms_sum"] / stats["streams"], 2) if stats["streams"] else 0.0,
+            }
+            for channel, stats in self._channels.items()
+        }
+
+
+stream_metrics = StreamMetrics()
@@ -1,11 +1,21 @@
 from typing import Dict, Any
+import asyncio
 import csv
 import os
-from .base_agent import BaseAgent
+from .base_agent import BaseAgent, Stage, REPLY_TIMEOUT, LOOKUP_TIMEOUT
+
+DEFAULT_OUTFITS = ["Casual Shirt + Jeans + Sneakers", "Blazer + Chinos + Loafers"]
 
 class StylingAgent(BaseAgent):
     """Styling Agent for fashion outfit combinations"""
     
+    model = "gpt-4o-mini"
+    
+    classification_fields = {
+        "intent": (["occasion", "trend", "outfit", "general"], "general"),
+        "urgency": (["low", "medium", "high"], "low"),
+    }
+    
     def __init__(self, api_key: str, csv_path: str = None):
         super().__init__(api_key, "styling")
         self.csv_path = csv_path
@@ -30,26 +40,25 @@ Always be helpful, stylish, and align with brand voice."""
 
     async def process_message(self, message: str, context: Dict[str, Any]) -> Dict[str, Any]:
         try:
-            # Analyze intent
-            intent = await self._analyze_intent(message)
-            
-            # Load CSV data if available
-            outfits = await self._load_outfits(message, context)
+            # Load CSV data if available, then classify and reply in one call
+            results, timings = await self.run_stages([
+                Stage("outfits", lambda _: self._load_outfits(message, context),
+                      timeout=LOOKUP_TIMEOUT, fallback=DEFAULT_OUTFITS),
+                Stage("reply", lambda done: self.generate_structured_response(message, {
+                    **context,
+                    "channel": "styling",
+                    "outfits": done["outfits"]
+                }), depends_on=["outfits"], timeout=REPLY_TIMEOUT)
+            ])
+            result = results["reply"]
             
-            # Generate response
-            response = await self.generate_response(message, {
-                **context,
-                "intent": intent,
-                "channel": "styling",
-                "outfits": outfits
-            })
-            
-            if response:
+            if result:
                 return {
                     "status": "success",
-                    "response": response,
-                    "intent": intent,
-                    "channel": "styling"
+                    "response": result["response"],
+                    "intent": result["classification"],
+                    "channel": "styling",
+                    "timings": timings
                 }
             return {
                 "status": "transferred",
@@ -65,31 +74,13 @@ Always be helpful, stylish, and align with brand voice."""
                 "channel": "styling"
             }
     
-    async def _analyze_intent(self, message: str) -> Dict[str, Any]:
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4.0-mini",
-                messages=[
-                    {"role": "system", "content": "Analyze this message for styling intent. Return JSON with: intent (occasion, trend, outfit, general), confidence (0-1), urgency (low, medium, high)"},
-                    {"role": "user", "content": message}
-                ]
-            )
-            return {
-                "intent": "general",
-                "confidence": 0.8,
-                "urgency": "low"
-            }
-        except Exception as e:
-            print(f"Error analyzing styling intent: {str(e)}")
-            return {
-                "intent": "general",
-                "confidence": 0.5,
-                "urgency": "low"
-            }
-    
     async def _load_outfits(self, message: str, context: Dict[str, Any]) -> list:
+        # File reads happen off the event loop
+        return await asyncio.to_thread(self._read_outfits, message)
+    
+    def _read_outfits(self, message: str) -> list:
         if not self.csv_path or not os.path.exists(self.csv_path):
-            return ["Casual Shirt + Jeans + Sneakers", "Blazer + Chinos + Loafers"]
+            return list(DEFAULT_OUTFITS)
         
         try:
             outfits = []
@@ -100,7 +91,7 @@ Always be helpful, stylish, and align with brand voice."""
                         outfits.append(row['outfit'])
                     if len(outfits) >= 2:
                         break
-            return outfits if outfits else ["Casual Shirt + Jeans + Sneakers", "Blazer + Chinos + Loafers"]
+            return outfits if outfits else list(DEFAULT_OUTFITS)
         except Exception as e:
             print(f"Error loading CSV outfits: {str(e)}")
-            return ["Casual Shirt + Jeans + Sneakers", "Blazer + Chinos + Loafers"]
\ No newline at end of file
+            return list(DEFAULT_OUTFITS)
\ No newline at end of file
@@ -1,9 +1,14 @@
 from typing import Dict, Any
-from .base_agent import BaseAgent
+from .base_agent import BaseAgent, Stage, REPLY_TIMEOUT
 
 class WebChatAgent(BaseAgent):
     """Web Chat Support Agent"""
     
+    classification_fields = {
+        "intent": (["product_question", "order_help", "navigation", "technical_issue", "general"], "general"),
+        "urgency": (["low", "medium", "high"], "medium"),
+    }
+    
     def __init__(self, api_key: str):
         super().__init__(api_key, "web_chat")
     
@@ -40,22 +45,22 @@ Always be helpful, patient, and ready to transfer to human if needed."""
     async def process_message(self, message: str, context: Dict[str, Any]) -> Dict[str, Any]:
         """Process web chat message"""
         try:
-            # Analyze intent
-            intent = await self._analyze_intent(message)
-            
-            # Generate response
-            response = await self.generate_response(message, {
-                **context,
-                "intent": intent,
-                "channel": "web_chat"
-            })
+            # Classify and reply in one call
+            results, timings = await self.run_stages([
+                Stage("reply", lambda _: self.generate_structured_response(message, {
+                    **context,
+                    "channel": "web_chat"
+                }), timeout=REPLY_TIMEOUT)
+            ])
+            result = results["reply"]
             
-            if response:
+            if result:
                 return {
                     "status": "success",
-                    "response": response,
-                    "intent": intent,
-                    "channel": "web_chat"
+                    "response": result["response"],
+                    "intent": result["classification"],
+                    "channel": "web_chat",
+                    "timings": timings
                 }
             else:
                 return {
@@ -70,27 +75,4 @@ Always be helpful, patient, and ready to transfer to human if needed."""
                 "status": "error",
                 "message": "Sorry, I'm having technical issues. Please try again.",
                 "channel": "web_chat"
-            }
-    
-    async def _analyze_intent(self, message: str) -> Dict[str, Any]:
-        """Analyze web chat intent"""
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "Analyze this web chat message intent. Return JSON with: intent (product_question, order_help, navigation, technical_issue, general), confidence (0-1), urgency (low, medium, high)"},
-                    {"role": "user", "content": message}
-                ]
-            )
-            return {
-                "intent": "general",
-                "confidence": 0.8,
-                "urgency": "medium"
-            }
-        except Exception as e:
-            print(f"Error analyzing web chat intent: {str(e)}")
-            return {
-                "intent": "general",
-                "confidence": 0.5,
-                "urgency": "medium"
-            } 
\ No newline at end of file
+            }
\ No newline at end of file
@@ -1,9 +1,14 @@
 from typing import Dict, Any
-from .base_agent import BaseAgent
+from .base_agent import BaseAgent, Stage, REPLY_TIMEOUT
 
 class WhatsAppAgent(BaseAgent):
     """WhatsApp Business API Agent"""
     
+    classification_fields = {
+        "intent": (["order_tracking", "return", "complaint", "product_question", "general"], "general"),
+        "urgency": (["low", "medium", "high"], "medium"),
+    }
+    
     def __init__(self, api_key: str):
         super().__init__(api_key, "whatsapp")
     
@@ -29,22 +34,22 @@ Always be helpful, professional, and ready to escalate if needed."""
     async def process_message(self, message: str, context: Dict[str, Any]) -> Dict[str, Any]:
         """Process WhatsApp message"""
         try:
-            # Analyze intent
-            intent = await self._analyze_intent(message)
-            
-            # Generate response
-            response = await self.generate_response(message, {
-                **context,
-                "intent": intent,
-                "channel": "whatsapp"
-            })
+            # Classify and reply in one call
+            results, timings = await self.run_stages([
+                Stage("reply", lambda _: self.generate_structured_response(message, {
+                    **context,
+                    "channel": "whatsapp"
+                }), timeout=REPLY_TIMEOUT)
+            ])
+            result = results["reply"]
             
-            if response:
+            if result:
                 return {
                     "status": "success",
-                    "response": response,
-                    "intent": intent,
-                    "channel": "whatsapp"
+                    "response": result["response"],
+                    "intent": result["classification"],
+                    "channel": "whatsapp",
+                    "timings": timings
                 }
             else:
                 return {
@@ -59,28 +64,4 @@ Always be helpful, professional, and ready to escalate if needed."""
                 "status": "error",
                 "message": "Sorry, I'm having technical issues. Please try again.",
                 "channel": "whatsapp"
-            }
-    
-    async def _analyze_intent(self, message: str) -> Dict[str, Any]:
-        """Analyze WhatsApp message intent"""
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "Analyze this WhatsApp message intent. Return JSON with: intent (order_tracking, return, complaint, product_question, general), confidence (0-1), urgency (low, medium, high)"},
-                    {"role": "user", "content": message}
-                ]
-            )
-            # Parse response (simplified for now)
-            return {
-                "intent": "general",
-                "confidence": 0.8,
-                "urgency": "medium"
-            }
-        except Exception as e:
-            print(f"Error analyzing WhatsApp intent: {str(e)}")
-            return {
-                "intent": "general",
-                "confidence": 0.5,
-                "urgency": "medium"
-            } 
\ No newline at end of file
+            }
\ No newline at end of file
@@ -0,0 +1,92 @@
+"""
+Local stand-in for Supabase's PostgREST API, for benchmarks
+Answers every request after a fixed delay standing in for the PostgREST + Postgres round trip
+"""
+
+import json
+import time
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, unquote, urlsplit
+
+
+def _eq_value(expression: str) -> Optional[str]:
+    """The literal an eq. filter compares against, None for other operators"""
+    operator, _, value = expression.partition(".")
+    return value if operator == "eq" else None
+
+
+class PostgRESTStandIn:
+    """Minimal PostgREST over plain asyncio on its own thread and event loop
+
+    GET /rest/v1/users?email=eq.<email> returns the matching row
+    from users; other GETs return [] and POSTs are accepted and discarded.
+    Every response waits `latency` seconds first.
+    """
+
+    def __init__(self, latency: float = 0.03, users: Optional[List[Dict[str, Any]]] = None,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.users = users if users is not None else []
+        self.host = host
+        self.port = port
+        self.requests = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def _rows(self, method: str, target: str) -> List[Dict[str, Any]]:
+        parts = urlsplit(target)
+        if method != "GET" or not parts.path.rstrip("/").endswith("/users"):
+            return []
+        email = parse_qs(parts.query).get("email")
+        wanted = _eq_value(unquote(email[0])) if email else None
+        if wanted is None:
+            return self.users[:1]
+        return [user for user in self.users if user.get("email") == wanted][:1]
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        while True:
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            lines = head.decode("latin-1").split("\r\n")
+            method, target = lines[0].split()[:2]
+            length = [int(line.split(":", 1)[1]) for line in lines if line.lower().startswith("content-length")]
+            if length:
+                await reader.readexactly(length[0])
+            self.requests += 1
+            await asyncio.sleep(self.latency)
+            body = json.dumps(self._rows(method, target)).encode("utf-8")
+            status = b"201 Created" if method == "POST" else b"200 OK"
+            writer.write(b"HTTP/1.1 " + status + b"\r\nContent-Type: application/json\r\n"
+                         b"Content-Length: %d\r\n\r\n" % len(body) + body)
+            await writer.drain()
+        writer.close()
+
+    def start(self) -> "PostgRESTStandIn":
+        """Serve in a daemon thread; returns once the port is bound"""
+        ready = threading.Event()
+
+        def serve() -> None:
+            loop = asyncio.new_event_loop()
+            server = loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port))
+            self.port = server.sockets[0].getsockname()[1]
+            ready.set()
+            loop.run_forever()
+
+        threading.Thread(target=serve, daemon=True).start()
+        if not ready.wait(5):
+            raise RuntimeError("PostgREST stand-in did not start")
+        return self
+
+
+if __name__ == "__main__":
+    standin = PostgRESTStandIn(users=[{"id": "u1", "email": "asha@example.com", "name": "Asha",
+                                        "phone_number": None, "preferences": {}}], port=8766).start()
+    print(f"PostgREST stand-in listening on {standin.url}")
+    while True:
+        time.sleep(3600)
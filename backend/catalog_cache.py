@@ -0,0 +1,107 @@
+import os
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+from .catalog_index import CatalogIndex
+
+logger = logging.getLogger("SemanticRAG")
+
+# Sentinel key for the catalog that comes from the CATALOG env var / built-in default
+ENV_CATALOG_KEY = "<env>"
+
+
+class CatalogSnapshot:
+    """Immutable view of a catalog as it was at load time.
+
+    Queries hold a reference to the snapshot they started with, so a reload
+    swapping in a newer snapshot never changes the rows an in-flight query sees.
+    """
+
+    def __init__(self, items: Sequence[Mapping], source: str, version: Tuple, load_seconds: float):
+        self.items = items
+        self.source = source
+        self.version = version
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+        self._index: Optional[CatalogIndex] = None
+        self._index_lock = threading.Lock()
+
+    @property
+    def row_count(self) -> int:
+        return len(self.items)
+
+    @property
+    def index(self) -> CatalogIndex:
+        # Built on first search rather than on load, once per snapshot
+        if self._index is None:
+            with self._index_lock:
+                if self._index is None:
+                    start = time.perf_counter()
+                    self._index = CatalogIndex(self.items)
+                    logger.info(f"Catalog index built for {self.source} in {time.perf_counter() - start:.3f}s")
+        return self._index
+
+    def stats(self) -> Dict:
+        return {
+            "source": self.source,
+            "row_count": self.row_count,
+            "load_seconds": round(self.load_seconds, 4),
+            "loaded_at": self.loaded_at,
+            **getattr(self.items, "load_stats", {}),
+        }
+
+
+class CatalogCache:
+    """Process-wide cache of catalog snapshots keyed by CSV path.
+
+    A snapshot is reused until the file's (mtime, size) changes; the env
+    catalog is reused until the CATALOG variable changes. Reloads happen under a
+    per-key lock so concurrent queries trigger a single load, and the new
+    snapshot replaces the old one with a single dict assignment.
+    """
+
+    def __init__(self, loader: Callable[[Optional[str]], Sequence[Mapping]]):
+        self._loader = loader
+        self._snapshots: Dict[str, CatalogSnapshot] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def _version(self, csv_path: Optional[str]) -> Tuple[str, Tuple]:
+        if csv_path and os.path.exists(csv_path):
+            try:
+                st = os.stat(csv_path)
+                return os.path.abspath(csv_path), (st.st_mtime_ns, st.st_size)
+            except OSError:
+                pass
+        return ENV_CATALOG_KEY, (os.getenv("CATALOG"),)
+
+    def _lock_for(self, key: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get(self, csv_path: Optional[str] = None) -> CatalogSnapshot:
+        key, version = self._version(csv_path)
+        snapshot = self._snapshots.get(key)
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+
+        with self._lock_for(key):
+            # Another caller may have reloaded while we waited for the lock
+            snapshot = self._snapshots.get(key)
+            if snapshot is not None and snapshot.version == version:
+                return snapshot
+
+            start = time.perf_counter()
+            items = self._loader(csv_path if key != ENV_CATALOG_KEY else None)
+            snapshot = CatalogSnapshot(items, key, version, time.perf_counter() - start)
+            self._snapshots[key] = snapshot
+            logger.info(f"Catalog snapshot loaded: {snapshot.row_count} rows from {key} in {snapshot.load_seconds:.3f}s")
+            return snapshot
+
+    def invalidate(self, csv_path: Optional[str] = None) -> None:
+        key, _ = self._version(csv_path)
+        self._snapshots.pop(key, None)
+
+    def stats(self) -> List[Dict]:
+        return [snapshot.stats() for snapshot in list(self._snapshots.values())]
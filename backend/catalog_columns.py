@@ -0,0 +1,196 @@
+import csv
+import sys
+import time
+import resource
+import tracemalloc
+from array import array
+from itertools import islice
+from collections.abc import Mapping
+from typing import Callable, Dict, Iterator, List
+
+CATALOG_FIELDS = ("name", "category", "price", "fabric", "description", "link")
+
+
+class CatalogRow(Mapping):
+    """Read-only dict view of one row of a ColumnarCatalog."""
+
+    __slots__ = ("_catalog", "_pos")
+
+    def __init__(self, catalog: "ColumnarCatalog", pos: int):
+        self._catalog = catalog
+        self._pos = pos
+
+    def __getitem__(self, key: str):
+        catalog, pos = self._catalog, self._pos
+        if key == "name":
+            return catalog.names[pos]
+        if key == "category":
+            return catalog.category_values[catalog.category_codes[pos]]
+        if key == "price":
+            return catalog.prices[pos]
+        if key == "fabric":
+            return catalog.fabric_values[catalog.fabric_codes[pos]]
+        if key == "description":
+            return catalog.descriptions[pos]
+        if key == "link":
+            return catalog.links[pos]
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(CATALOG_FIELDS)
+
+    def __len__(self) -> int:
+        return len(CATALOG_FIELDS)
+
+    def copy(self) -> Dict:
+        return dict(self)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+class ColumnarCatalog:
+    """Catalog stored as columns instead of one dict per row.
+
+    Category and fabric are interned to integer codes, price is a packed float
+    array, and the free-text columns are plain lists. Indexing returns a
+    CatalogRow, which behaves like the dicts load_catalog used to return.
+    """
+
+    def __init__(self):
+        self.names: List[str] = []
+        self.descriptions: List[str] = []
+        self.links: List[str] = []
+        self.prices = array("d")
+        self.category_codes = array("I")
+        self.fabric_codes = array("I")
+        self.category_values: List[str] = []
+        self.fabric_values: List[str] = []
+        self._category_lookup: Dict[str, int] = {}
+        self._fabric_lookup: Dict[str, int] = {}
+        self.load_stats: Dict = {}
+
+    def _code(self, value: str, lookup: Dict[str, int], values: List[str]) -> int:
+        code = lookup.get(value)
+        if code is None:
+            code = lookup[value] = len(values)
+            values.append(value)
+        return code
+
+    def append(self, name: str, category: str, price: float, fabric: str, description: str, link: str) -> None:
+        self.names.append(name)
+        self.category_codes.append(self._code(category, self._category_lookup, self.category_values))
+        self.prices.append(price)
+        self.fabric_codes.append(self._code(fabric, self._fabric_lookup, self.fabric_values))
+        self.descriptions.append(description)
+        self.links.append(link)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, pos):
+        if isinstance(pos, slice):
+            return [dict(CatalogRow(self, i)) for i in range(*pos.indices(len(self)))]
+        if pos < 0:
+            pos += len(self)
+        if not 0 <= pos < len(self):
+            raise IndexError(pos)
+        return CatalogRow(self, pos)
+
+    def __iter__(self) -> Iterator[CatalogRow]:
+        for pos in range(len(self)):
+            yield CatalogRow(self, pos)
+
+    def to_dicts(self) -> List[Dict]:
+        return [dict(row) for row in self]
+
+
+def _max_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def load_catalog_columns(csv_path: str, chunk_rows: int = 50000) -> ColumnarCatalog:
+    """Stream a catalog CSV into a ColumnarCatalog, chunk_rows rows at a time.
+
+    Row handling matches csv.DictReader: blank lines are skipped, short rows
+    read missing fields as None, and a later duplicate header wins.
+    """
+    started, rss_before = time.perf_counter(), _max_rss_mb()
+    catalog = ColumnarCatalog()
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        columns = {name: i for i, name in enumerate(header)}
+
+        def field(row: List[str], name: str, default):
+            if name not in columns:
+                return default
+            i = columns[name]
+            return row[i] if i < len(row) else None
+
+        while True:
+            chunk = list(islice(reader, chunk_rows))
+            if not chunk:
+                break
+            for row in chunk:
+                if not row or not field(row, "name", None):
+                    continue
+                catalog.append(
+                    field(row, "name", "").strip(),
+                    field(row, "category", "").strip(),
+                    float(field(row, "price", 0.0)),
+                    field(row, "fabric", "").strip(),
+                    field(row, "description", "").strip(),
+                    field(row, "link", "").strip()
+                )
+
+    catalog.load_stats = {
+        "parse_seconds": round(time.perf_counter() - started, 4),
+        "max_rss_growth_mb": round(_max_rss_mb() - rss_before, 2),
+        "categories": len(catalog.category_values),
+        "fabrics": len(catalog.fabric_values),
+    }
+    return catalog
+
+
+def load_catalog_dicts(csv_path: str) -> List[Dict]:
+    """The original row-of-dicts loader, kept for comparison."""
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        return [
+            {
+                "name": row.get("name", "").strip(),
+                "category": row.get("category", "").strip(),
+                "price": float(row.get("price", 0.0)),
+                "fabric": row.get("fabric", "").strip(),
+                "description": row.get("description", "").strip(),
+                "link": row.get("link", "").strip()
+            } for row in reader if row.get("name")
+        ]
+
+
+def measure_loader(loader: Callable[[str], object], csv_path: str) -> Dict:
+    """Load time and traced peak / retained memory for one loader run."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        catalog = loader(csv_path)
+        elapsed = time.perf_counter() - started
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "rows": len(catalog),
+        "load_seconds": round(elapsed, 4),
+        "peak_mb": round(peak / (1024 * 1024), 2),
+        "retained_mb": round(retained / (1024 * 1024), 2),
+    }
+
+
+def compare_loaders(csv_path: str) -> Dict[str, Dict]:
+    return {
+        "dict_rows": measure_loader(load_catalog_dicts, csv_path),
+        "columnar": measure_loader(load_catalog_columns, csv_path),
+    }
@@ -0,0 +1,203 @@
+import heapq
+from bisect import bisect_right
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from fuzzywuzzy import utils
+from .fuzzy_matcher import fuzzy_match
+
+# search_catalog thresholds
+TEXT_THRESHOLD = 85
+MATERIAL_THRESHOLD = 80
+
+# token_sort_ratio is bounded by 2*min(a, b)/(a + b) on the processed lengths, so a
+# field can only reach TEXT_THRESHOLD (after rounding) inside this length window.
+_MIN_RATIO = (TEXT_THRESHOLD - 0.5) / 100
+_LEN_LOW = _MIN_RATIO / (2 - _MIN_RATIO)
+_LEN_HIGH = (2 - _MIN_RATIO) / _MIN_RATIO
+
+# Two strings whose ratio reaches TEXT_THRESHOLD share a common run of 3+ characters unless
+# their combined length is at most this; the matching characters would otherwise be split
+# into runs of <= 2 separated by at least one unmatched character each.
+_SHORT_PAIR_LEN = 16
+
+
+def _sorted_text(text: str) -> str:
+    """The string token_sort_ratio actually compares for `text`."""
+    processed = utils.full_process(utils.full_process(text), force_ascii=True)
+    return " ".join(sorted(processed.split()))
+
+
+def _trigrams(sorted_text: str) -> Set[str]:
+    return {sorted_text[i:i + 3] for i in range(len(sorted_text) - 2)}
+
+
+def _parse_price(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class CatalogIndex:
+    """Prebuilt lookup structures over a catalog for search_catalog.
+
+    - character-trigram postings over the token-sorted name/description, so
+      misspelled queries ("hodie") still reach the items they fuzzy-match
+    - hash facets for category and fabric (fuzzy-matched once per distinct value)
+    - price array sorted by price for max_price lookups
+
+    Scoring only visits items that can score above the price-only baseline; the
+    rest are pulled from the price array in catalog order when needed.
+    """
+
+    def __init__(self, items: Sequence[Dict]):
+        self.items = items
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        self._name_lower: List[str] = []
+        self._desc_lower: List[str] = []
+        self._text_len: List[Tuple[int, int]] = []
+        self._categories: Dict[str, List[int]] = defaultdict(list)
+        self._fabrics: Dict[str, List[int]] = defaultdict(list)
+        self._prices: List[Optional[float]] = []
+
+        for pos, item in enumerate(items):
+            name = item.get("name", "").lower()
+            description = item.get("description", "").lower()
+            self._name_lower.append(name)
+            self._desc_lower.append(description)
+            sorted_name, sorted_description = _sorted_text(name), _sorted_text(description)
+            self._text_len.append((len(sorted_name), len(sorted_description)))
+            for trigram in _trigrams(sorted_name) | _trigrams(sorted_description):
+                self._postings[trigram].append(pos)
+            self._categories[item.get("category", "").lower()].append(pos)
+            self._fabrics[item.get("fabric", "").lower()].append(pos)
+            self._prices.append(_parse_price(item.get("price")))
+
+        # Items with a field too short to be sure of sharing a trigram with a close query
+        short = sorted((min(lengths), pos) for pos, lengths in enumerate(self._text_len)
+                       if min(lengths) < _SHORT_PAIR_LEN)
+        self._short_lengths = [length for length, _ in short]
+        self._short_positions = [pos for _, pos in short]
+
+        priced = sorted((price, pos) for pos, price in enumerate(self._prices) if price is not None)
+        self._sorted_prices = [price for price, _ in priced]
+        self._sorted_price_positions = [pos for _, pos in priced]
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    # ==== Candidate Generation ====
+    def _text_matches(self, query_lower: str) -> Set[int]:
+        matches: Set[int] = set()
+
+        # Category values are few, so score each distinct one directly
+        for category, positions in self._categories.items():
+            if category and fuzzy_match(query_lower, [category], threshold=TEXT_THRESHOLD):
+                matches.update(positions)
+
+        sorted_query = _sorted_text(query_lower)
+        query_len = len(sorted_query)
+        if query_len == 0:
+            return matches
+        low, high = query_len * _LEN_LOW, query_len * _LEN_HIGH
+
+        # Any field that can reach TEXT_THRESHOLD shares a trigram with the query, or is short
+        candidates: Set[int] = set()
+        for trigram in _trigrams(sorted_query):
+            candidates.update(self._postings.get(trigram, ()))
+        if query_len < _SHORT_PAIR_LEN:
+            count = bisect_right(self._short_lengths, _SHORT_PAIR_LEN - query_len)
+            candidates.update(self._short_positions[:count])
+        for pos in candidates - matches:
+            name_len, desc_len = self._text_len[pos]
+            fields = []
+            if low <= name_len <= high:
+                fields.append(self._name_lower[pos])
+            if low <= desc_len <= high:
+                fields.append(self._desc_lower[pos])
+            if fields and fuzzy_match(query_lower, fields, threshold=TEXT_THRESHOLD):
+                matches.add(pos)
+        return matches
+
+    def _material_matches(self, material: str) -> Set[int]:
+        matches: Set[int] = set()
+        for fabric, positions in self._fabrics.items():
+            if fuzzy_match(material, [fabric], threshold=MATERIAL_THRESHOLD):
+                matches.update(positions)
+        return matches
+
+    def _within_price(self, max_price: float, exclude: Set[int], limit: int) -> List[int]:
+        """First `limit` positions (catalog order) priced at or under max_price."""
+        count = bisect_right(self._sorted_prices, max_price)
+        if count == 0:
+            return []
+        if count <= 4 * (limit + len(exclude)):
+            eligible = (pos for pos in self._sorted_price_positions[:count] if pos not in exclude)
+            return heapq.nsmallest(limit, eligible)
+
+        # Most of the catalog qualifies, so walking in order finds `limit` quickly
+        found = []
+        for pos, price in enumerate(self._prices):
+            if price is not None and price <= max_price and pos not in exclude:
+                found.append(pos)
+                if len(found) >= limit:
+                    break
+        return found
+
+    def satisfies(self, pos: int, filters: Dict) -> bool:
+        """Whether the item at pos meets the hard category / max_price filters."""
+        if filters.get('category') and self.items[pos].get("category", "").lower() != filters['category'].lower():
+            return False
+        if filters.get('max_price'):
+            price = self._prices[pos]
+            return price is not None and price <= filters['max_price']
+        return True
+
+    # ==== Scoring ====
+    def ranked_positions(self, query: str, filters: Dict, limit: int = 10) -> List[Tuple[float, int]]:
+        """Top (score, position) pairs, best first, ties in catalog order."""
+        query_lower = query.lower()
+        text_hits = self._text_matches(query_lower)
+        category_hits: Iterable[int] = ()
+        material_hits: Set[int] = set()
+        if filters.get('category'):
+            category_hits = self._categories.get(filters['category'].lower(), ())
+        if filters.get('material'):
+            material_hits = self._material_matches(filters['material'].lower())
+        category_hits = set(category_hits)
+        max_price = filters.get('max_price')
+
+        scored: List[Tuple[float, int]] = []
+        candidates = text_hits | category_hits | material_hits
+        for pos in candidates:
+            score = 0.0
+            if pos in text_hits:
+                score += 0.5
+            if pos in category_hits:
+                score += 0.3
+            if pos in material_hits:
+                score += 0.2
+            if max_price:
+                price = self._prices[pos]
+                if price is None:
+                    score *= 0.8
+                elif price <= max_price:
+                    score += 0.1
+                else:
+                    score *= 0.5
+            if score > 0:
+                scored.append((score, pos))
+
+        # Items matching nothing but the budget all score exactly 0.1
+        if max_price:
+            scored.extend((0.1, pos) for pos in self._within_price(max_price, candidates, limit))
+
+        return heapq.nsmallest(limit, scored, key=lambda entry: (-entry[0], entry[1]))
+
+    def search(self, query: str, filters: Dict, limit: int = 10) -> List[Dict]:
+        results = []
+        for score, pos in self.ranked_positions(query, filters, limit):
+            item_copy = dict(self.items[pos])
+            item_copy['score'] = score
+            results.append(item_copy)
+        return results
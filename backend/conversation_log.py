@@ -0,0 +1,356 @@
+import os
+import glob
+import json
+import fcntl
+import tempfile
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime
+from itertools import islice
+from typing import Any, Deque, Dict, List, Optional
+
+from .data_access import ConversationRow, Database, DataAccessError
+from .resilience import RETRYABLE_STATUS, backoff_delay
+
+logger = logging.getLogger("ConversationLog")
+
+SPOOL_DIR = os.getenv("CONVERSATION_SPOOL_DIR",
+                      os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "spool"))
+BATCH_SIZE = int(os.getenv("CONVERSATION_LOG_BATCH_SIZE", "200"))
+FLUSH_INTERVAL = float(os.getenv("CONVERSATION_LOG_FLUSH_INTERVAL", "1"))
+# put() waits for the writer once this many rows are pending; beyond MAX_PENDING rows are dropped
+BACKPRESSURE_AT = int(os.getenv("CONVERSATION_LOG_BACKPRESSURE_AT", "10000"))
+MAX_PENDING = int(os.getenv("CONVERSATION_LOG_MAX_PENDING", "50000"))
+BACKPRESSURE_TIMEOUT = float(os.getenv("CONVERSATION_LOG_BACKPRESSURE_TIMEOUT", "2"))
+STOP_TIMEOUT = float(os.getenv("CONVERSATION_LOG_STOP_TIMEOUT", "5"))
+# Bytes of committed rows allowed to linger at the head of the spool file before it is compacted;
+# after a crash at most this much is inserted a second time
+COMPACT_AFTER_BYTES = int(os.getenv("CONVERSATION_LOG_COMPACT_AFTER_BYTES", str(4 * 1024 * 1024)))
+
+
+def conversation_row(entity_type: str, customer_id: Optional[str], channel: str, content: str) -> ConversationRow:
+    return {
+        "entity_type": entity_type,
+        "customer_id": customer_id,
+        "channel": channel,
+        "content": content,
+        "created_at": datetime.utcnow().isoformat(),
+    }
+
+
+def _fsync_dir(path: str) -> None:
+    """Make a rename inside path durable"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _row_line(row: ConversationRow) -> str:
+    # ASCII-only JSON, so len() is also the size in bytes
+    return json.dumps(row) + "\n"
+
+
+def _is_retryable(error: DataAccessError) -> bool:
+    return error.status_code is None or error.status_code in RETRYABLE_STATUS
+
+
+class ConversationLog:
+    """Write-behind queue for conversation rows
+
+    Rows are appended to a per-worker JSONL spool file and an in-memory queue
+    and the caller carries on; a background writer sends them to the
+    database as multi-row inserts whenever batch_size rows are waiting or
+    flush_interval has passed. Rows leave the spool only after their insert
+    succeeds, so rows from a crash or a database outage are picked up again
+    at the next start, including spools left behind by dead workers
+    (delivery is at-least-once). Rows the database rejects outright go to a
+    dead-letter file instead of blocking the queue. Committed rows are cut
+    from the spool in a worker thread once COMPACT_AFTER_BYTES of them have
+    built up. Errors in the writer (a full disk, say) are logged and retried
+    with backoff; the writer never stops until stop() is called.
+    """
+
+    def __init__(self, db: Database, spool_dir: str = SPOOL_DIR, batch_size: int = BATCH_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL, backpressure_at: int = BACKPRESSURE_AT,
+                 max_pending: int = MAX_PENDING):
+        self.db = db
+        self.spool_dir = spool_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.backpressure_at = backpressure_at
+        self.max_pending = max_pending
+        self._pending: Deque[ConversationRow] = deque()
+        self._spool = None
+        self._spool_path = ""
+        self._spool_committed_bytes = 0
+        # The replacement spool while a compaction is renaming it into place; append() writes to both
+        self._compacting = None
+        self._dirty = False
+        self._wake = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._closing = False
+        self._task: Optional[asyncio.Task] = None
+        self.stats_counters = {"enqueued": 0, "flushed": 0, "batches": 0, "failed_flushes": 0, "dropped": 0,
+                               "dead_lettered": 0, "recovered": 0, "backpressure_waits": 0,
+                               "writer_errors": 0, "compactions": 0}
+
+    # ==== Spool ====
+    @staticmethod
+    def _read_rows(handle) -> List[ConversationRow]:
+        rows = []
+        handle.seek(0)
+        for line in handle:
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                # A line cut short by a crash
+                continue
+        return rows
+
+    def _open_spool(self) -> None:
+        os.makedirs(self.spool_dir, exist_ok=True)
+        path = self._spool_path = os.path.join(self.spool_dir, f"conversations-{os.getpid()}.jsonl")
+        while True:
+            # Read-write without O_APPEND, like the compacted replacement; append() seeks to the end
+            self._spool = open(os.open(path, os.O_RDWR | os.O_CREAT, 0o600), "r+", encoding="utf-8")
+            fcntl.flock(self._spool, fcntl.LOCK_EX)
+            # Another worker may have adopted and removed the file before the lock was taken
+            if os.fstat(self._spool.fileno()).st_nlink:
+                break
+            self._spool.close()
+        # The pid may be reused after a restart, so the file can hold rows from a previous run
+        recovered = self._read_rows(self._spool)
+
+        # Spools whose lock can be taken belong to workers that are gone
+        for other in glob.glob(os.path.join(self.spool_dir, "conversations-*.jsonl")):
+            if os.path.abspath(other) == os.path.abspath(path):
+                continue
+            try:
+                with open(other, "r+", encoding="utf-8") as handle:
+                    fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    if not os.fstat(handle.fileno()).st_nlink:
+                        continue
+                    rows = self._read_rows(handle)
+                    self._spool.seek(0, os.SEEK_END)
+                    self._spool.writelines(_row_line(row) for row in rows)
+                    self._spool.flush()
+                    os.fsync(self._spool.fileno())
+                    os.unlink(other)
+                    recovered.extend(rows)
+            except BlockingIOError:
+                continue
+            except OSError as e:
+                logger.warning(f"Could not recover conversation spool {other}: {e}")
+
+        self._pending.extend(recovered)
+        self.stats_counters["recovered"] += len(recovered)
+        if recovered:
+            logger.info(f"Recovered {len(recovered)} unsaved conversation rows from spool")
+
+    def _write_compacted(self, rows: List[ConversationRow]):
+        fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(self._spool_path) + ".", suffix=".tmp",
+                                        dir=self.spool_dir)
+        compacted = open(fd, "r+", encoding="utf-8")
+        try:
+            fcntl.flock(compacted, fcntl.LOCK_EX)
+            compacted.writelines(_row_line(row) for row in rows)
+            compacted.flush()
+        except BaseException:
+            compacted.close()
+            os.unlink(tmp_path)
+            raise
+        return compacted, tmp_path
+
+    def _replace_spool(self, compacted, tmp_path: str) -> None:
+        os.fsync(compacted.fileno())
+        os.replace(tmp_path, self._spool_path)
+
+    async def _compact_spool(self) -> None:
+        """Replace the spool with a file holding only the pending rows
+
+        The new file is written, fsynced and locked under a temporary name
+        before it is renamed over the spool, so a crash leaves either the old
+        or the new file complete and other workers never find it unlocked.
+        The file work runs in worker threads; rows appended meanwhile are
+        copied over before the rename and written to both files until the swap.
+        """
+        snapshot = len(self._pending)
+        compacted, tmp_path = await asyncio.to_thread(self._write_compacted, list(self._pending))
+        replaced = False
+        try:
+            compacted.writelines(_row_line(row) for row in islice(self._pending, snapshot, None))
+            compacted.flush()
+            self._compacting = compacted
+            await asyncio.to_thread(self._replace_spool, compacted, tmp_path)
+            replaced = True
+        finally:
+            self._compacting = None
+            if not replaced:
+                compacted.close()
+                os.unlink(tmp_path)
+        # The old file is unlinked now; closing it releases a lock nobody else can take
+        self._spool.close()
+        self._spool = compacted
+        self._spool_committed_bytes = 0
+        self._dirty = True
+        self.stats_counters["compactions"] += 1
+        await asyncio.to_thread(_fsync_dir, self.spool_dir)
+
+    async def _compact(self) -> None:
+        compaction = asyncio.ensure_future(self._compact_spool())
+        try:
+            await asyncio.shield(compaction)
+        except asyncio.CancelledError:
+            # A compaction that has started finishes, so the open handle and the file on disk stay in step
+            await asyncio.wait([compaction])
+            if not compaction.cancelled():
+                compaction.exception()
+            raise
+
+    def _dead_letter(self, row: ConversationRow, error: Exception) -> None:
+        self.stats_counters["dead_lettered"] += 1
+        logger.error(f"Conversation row rejected by the database, moved to dead letter: {error}")
+        with open(os.path.join(self.spool_dir, "dead-letter.jsonl"), "a", encoding="utf-8") as handle:
+            handle.write(json.dumps({"row": row, "error": str(error)}) + "\n")
+
+    # ==== Producers ====
+    def append(self, row: ConversationRow) -> bool:
+        """Queue row without waiting; False if it was dropped because the queue is full"""
+        if len(self._pending) >= self.max_pending or self._spool is None:
+            self.stats_counters["dropped"] += 1
+            logger.warning("Conversation log full or not started, dropping row")
+            return False
+        line = _row_line(row)
+        self._spool.seek(0, os.SEEK_END)
+        self._spool.write(line)
+        self._spool.flush()
+        if self._compacting is not None:
+            self._compacting.write(line)
+            self._compacting.flush()
+        self._dirty = True
+        self._pending.append(row)
+        if len(self._pending) >= self.backpressure_at:
+            self._drained.clear()
+        self.stats_counters["enqueued"] += 1
+        if len(self._pending) >= self.batch_size:
+            self._wake.set()
+        return True
+
+    async def put(self, row: ConversationRow) -> bool:
+        """Queue row, first waiting up to BACKPRESSURE_TIMEOUT while the backlog is over backpressure_at"""
+        if len(self._pending) >= self.backpressure_at:
+            self.stats_counters["backpressure_waits"] += 1
+            self._wake.set()
+            try:
+                await asyncio.wait_for(self._drained.wait(), BACKPRESSURE_TIMEOUT)
+            except asyncio.TimeoutError:
+                pass
+        return self.append(row)
+
+    # ==== Writer ====
+    def _commit(self, count: int, rejected: int = 0) -> None:
+        for _ in range(count):
+            self._spool_committed_bytes += len(_row_line(self._pending.popleft()))
+        self.stats_counters["flushed"] += count - rejected
+        self.stats_counters["batches"] += 1
+        if len(self._pending) < self.backpressure_at:
+            self._drained.set()
+
+    async def _insert_one_by_one(self, batch: List[ConversationRow]) -> int:
+        """Find the rows that made a batch fail; transient errors propagate so the batch is retried"""
+        rejected = 0
+        for row in batch:
+            try:
+                await self.db.insert_conversations([row])
+            except DataAccessError as e:
+                if _is_retryable(e):
+                    raise
+                self._dead_letter(row, e)
+                rejected += 1
+        return rejected
+
+    async def _run(self) -> None:
+        attempt = 0
+        while True:
+            if len(self._pending) < self.batch_size and not self._closing:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            try:
+                if self._dirty:
+                    self._dirty = False
+                    try:
+                        await asyncio.to_thread(os.fsync, self._spool.fileno())
+                    except OSError:
+                        self._dirty = True
+                        raise
+                if not self._pending:
+                    if self._closing:
+                        return
+                    continue
+
+                batch = list(islice(self._pending, self.batch_size))
+                rejected = 0
+                try:
+                    await self.db.insert_conversations(batch)
+                except DataAccessError as e:
+                    if _is_retryable(e):
+                        raise
+                    rejected = await self._insert_one_by_one(batch)
+                attempt = 0
+                self._commit(len(batch), rejected)
+                if self._spool_committed_bytes >= COMPACT_AFTER_BYTES:
+                    await self._compact()
+            except Exception as e:
+                # A database outage, or an OSError from the spool or the dead-letter file (e.g. a full disk)
+                if isinstance(e, DataAccessError):
+                    self.stats_counters["failed_flushes"] += 1
+                else:
+                    self.stats_counters["writer_errors"] += 1
+                if self._closing:
+                    logger.warning(f"Conversation log flush failed while stopping, rows kept in spool: {e!r}")
+                    return
+                delay = backoff_delay(attempt, 0.5, 30.0)
+                attempt += 1
+                logger.warning(f"Conversation log flush failed, retrying in {delay:.1f}s: {e!r}")
+                await asyncio.sleep(delay)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._open_spool()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Flush what can be flushed within STOP_TIMEOUT; the rest stays in the spool for the next start"""
+        if self._task is None:
+            return
+        self._closing = True
+        self._wake.set()
+        try:
+            await asyncio.wait_for(self._task, STOP_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"Conversation log stopped with {len(self._pending)} rows left in the spool")
+        self._task = None
+        if self._spool_committed_bytes:
+            try:
+                await self._compact_spool()
+            except OSError as e:
+                logger.warning(f"Could not compact the conversation spool on stop: {e}")
+        self._spool.flush()
+        os.fsync(self._spool.fileno())
+        self._spool.close()
+        self._spool = None
+
+    def stats(self) -> Dict[str, Any]:
+        counters = self.stats_counters
+        return {
+            **counters,
+            "pending": len(self._pending),
+            "avg_batch_size": round(counters["flushed"] / counters["batches"], 2) if counters["batches"] else 0.0,
+            "db_writes_per_row": round(counters["batches"] / counters["flushed"], 4) if counters["flushed"] else 0.0,
+        }
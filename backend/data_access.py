@@ -0,0 +1,190 @@
+import os
+import json
+import time
+from typing import Any, Dict, List, Optional, TypedDict
+
+import httpx
+
+# PostgREST connection pool; requests are awaited on the event loop instead of blocking it
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+SUPABASE_MAX_CONNECTIONS = int(os.getenv("SUPABASE_MAX_CONNECTIONS", "20"))
+SUPABASE_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("SUPABASE_MAX_KEEPALIVE_CONNECTIONS", "10"))
+
+
+PRODUCT_COLUMNS = "id, name, category, price, stock, created_at"
+
+
+def normalize_email(email: str) -> str:
+    """Emails are stored this way (lowercased, no surrounding spaces), so lookups can use eq on the index"""
+    return email.strip().lower()
+
+
+class DataAccessError(RuntimeError):
+    """A PostgREST request failed or returned an error status (status_code is None for transport errors)"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class UserRow(TypedDict):
+    id: Optional[str]
+    name: str
+    phone_number: Optional[str]
+    preferences: Dict[str, Any]
+
+
+class ProductRow(TypedDict, total=False):
+    id: int
+    name: str
+    category: str
+    price: float
+    stock: int
+    created_at: str
+
+
+class ConversationRow(TypedDict):
+    entity_type: str
+    customer_id: Optional[str]
+    channel: str
+    content: str
+    created_at: str
+
+
+class RecommendationRow(TypedDict):
+    recommended_products: List[Any]
+    keywords_extracted: List[Any]
+
+
+def _json_field(value: Any, default: Any) -> Any:
+    """JSON columns arrive either decoded or as JSON text"""
+    if not value:
+        return default
+    if isinstance(value, str):
+        return json.loads(value)
+    return value
+
+
+class Database:
+    """Typed async queries against Supabase's PostgREST API over one pooled HTTP client
+
+    Replaces the synchronous supabase-py calls the handlers used to make
+    inside async endpoints, where every round-trip blocked the event loop.
+    """
+
+    def __init__(self, url: str, key: str, http_client: Optional[httpx.AsyncClient] = None):
+        self.base_url = url.rstrip("/") + "/rest/v1"
+        self.headers = {"apikey": key, "Authorization": f"Bearer {key}", "Accept": "application/json"}
+        self._client = http_client
+        self._ops: Dict[str, Dict[str, float]] = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self.headers,
+                limits=httpx.Limits(max_connections=SUPABASE_MAX_CONNECTIONS,
+                                    max_keepalive_connections=SUPABASE_MAX_KEEPALIVE_CONNECTIONS),
+                timeout=SUPABASE_TIMEOUT,
+            )
+        return self._client
+
+    async def _request(self, op: str, method: str, table: str, **kwargs: Any) -> httpx.Response:
+        stats = self._ops.setdefault(op, {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+        start = time.perf_counter()
+        stats["calls"] += 1
+        try:
+            response = await self.client.request(method, f"/{table}", **kwargs)
+            response.raise_for_status()
+            return response
+        except httpx.HTTPError as e:
+            stats["errors"] += 1
+            status = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else None
+            raise DataAccessError(f"{op} failed: {e}", status) from e
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            stats["total_ms"] += elapsed
+            stats["max_ms"] = max(stats["max_ms"], elapsed)
+
+    async def select(self, op: str, table: str, columns: str, filters: Optional[Dict[str, str]] = None,
+                     limit: Optional[int] = None, order: Optional[str] = None,
+                     offset: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Rows of table; filters map column -> PostgREST operator expression such as "eq.value" """
+        params: Dict[str, Any] = {"select": columns, **(filters or {})}
+        if limit is not None:
+            params["limit"] = limit
+        if offset:
+            params["offset"] = offset
+        if order:
+            params["order"] = order
+        response = await self._request(op, "GET", table, params=params)
+        return response.json() or []
+
+    async def insert(self, op: str, table: str, rows: Any) -> None:
+        await self._request(op, "POST", table, json=rows, headers={"Prefer": "return=minimal"})
+
+    # ==== Typed Queries ====
+    async def fetch_user_by_email(self, email: str) -> Optional[UserRow]:
+        """The user whose email equals email, ignoring case (stored emails are normalized)"""
+        rows = await self.select("fetch_user", "users", "id, name, phone_number, preferences",
+                                 {"email": f"eq.{normalize_email(email)}"}, limit=1)
+        if not rows:
+            return None
+        user = rows[0]
+        return {
+            "id": user["id"],
+            "name": user["name"],
+            "phone_number": user.get("phone_number"),
+            "preferences": _json_field(user.get("preferences"), {}),
+        }
+
+    async def fetch_product_page(self, offset: int, limit: int) -> List[ProductRow]:
+        return await self.select("fetch_product_page", "products", PRODUCT_COLUMNS,
+                                 limit=limit, offset=offset, order="id.asc")
+
+    async def fetch_products_since(self, created_at: str, offset: int, limit: int) -> List[ProductRow]:
+        """Products created at or after created_at, oldest first"""
+        return await self.select("fetch_products_since", "products", PRODUCT_COLUMNS,
+                                 {"created_at": f"gte.{created_at}"}, limit=limit, offset=offset,
+                                 order="created_at.asc,id.asc")
+
+    async def fetch_last_recommendation(self, customer_id: Optional[str]) -> RecommendationRow:
+        rows = []
+        if customer_id is not None:
+            rows = await self.select("fetch_recommendation", "conversations_recommendations",
+                                     "recommended_products, keywords_extracted",
+                                     {"customer_id": f"eq.{customer_id}"}, limit=1)
+        row = rows[0] if rows else {}
+        return {
+            "recommended_products": _json_field(row.get("recommended_products"), []),
+            "keywords_extracted": _json_field(row.get("keywords_extracted"), []),
+        }
+
+    async def insert_conversations(self, rows: List[ConversationRow]) -> None:
+        """One multi-row insert for a batch of conversation rows"""
+        await self.insert("insert_conversations", "conversations_recommendations", rows)
+
+    async def ping(self) -> None:
+        """Raises DataAccessError unless the users table answers"""
+        await self.select("ping", "users", "id", limit=1)
+
+    async def list_migrations(self) -> List[str]:
+        rows = await self.select("list_migrations", "_supabase_migrations", "name")
+        return [row["name"] for row in rows]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            op: {
+                "calls": int(stats["calls"]),
+                "errors": int(stats["errors"]),
+                "avg_ms": round(stats["total_ms"] / stats["calls"], 2) if stats["calls"] else 0.0,
+                "max_ms": round(stats["max_ms"], 2),
+            }
+            for op, stats in self._ops.items()
+        }
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+        self._client = None
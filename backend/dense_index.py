@@ -0,0 +1,252 @@
+import os
+import json
+import time
+import fcntl
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .reranker import product_text
+
+logger = logging.getLogger("SemanticRAG")
+
+# Above this many rows searches go through the IVF coarse quantizer instead of a full matmul
+IVF_MIN_ROWS = int(os.getenv("DENSE_IVF_MIN_ROWS", "50000"))
+IVF_NPROBE = int(os.getenv("DENSE_IVF_NPROBE", "8"))
+
+
+def item_hash(item: Dict) -> str:
+    return hashlib.sha1(product_text(item).encode("utf-8")).hexdigest()
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class IVFIndex:
+    """Inverted-file index: k-means centroids plus one posting list per centroid."""
+
+    def __init__(self, matrix: np.ndarray, nlist: Optional[int] = None, iterations: int = 10, seed: int = 0):
+        rows = matrix.shape[0]
+        nlist = nlist or max(1, int(np.sqrt(rows)))
+        rng = np.random.default_rng(seed)
+        sample = np.asarray(matrix[rng.choice(rows, size=min(rows, nlist * 64), replace=False)], dtype=np.float32)
+        centroids = sample[rng.choice(sample.shape[0], size=nlist, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[assignment == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = _normalize(centroids)
+        self.centroids = centroids.astype(np.float32)
+
+        assignment = np.empty(rows, dtype=np.int32)
+        for start in range(0, rows, 65536):
+            chunk = np.asarray(matrix[start:start + 65536], dtype=np.float32)
+            assignment[start:start + len(chunk)] = np.argmax(chunk @ self.centroids.T, axis=1)
+        order = np.argsort(assignment, kind="stable")
+        bounds = np.searchsorted(assignment[order], np.arange(nlist + 1))
+        self.lists = [order[bounds[c]:bounds[c + 1]] for c in range(nlist)]
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        nprobe = min(nprobe, len(self.lists))
+        probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        return np.concatenate([self.lists[c] for c in probe])
+
+
+class DenseCatalogIndex:
+    """Cosine top-k over catalog embeddings stored as a memory-mapped matrix.
+
+    Vectors live in `<store_path>.npy` (L2-normalized, float16 by default) with a
+    JSON manifest of per-item content hashes beside it. Rebuilding against a
+    changed catalog reuses the stored row of every item whose hash is
+    unchanged, so only new or edited SKUs are sent to the encoder.
+    """
+
+    def __init__(self, items: Sequence[Dict], encode: Callable[[List[str]], np.ndarray], model_name: str,
+                 store_path: Optional[str] = None, dtype: str = "float16"):
+        self.items = items
+        self.model_name = model_name
+        self.store_path = store_path
+        self.dtype = np.dtype(dtype)
+        self.reused = 0
+        self.embedded = 0
+
+        start = time.perf_counter()
+        if store_path:
+            # Workers sharing the catalog take turns, so the later one reuses the rows the first wrote
+            with open(store_path + ".lock", "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                self.matrix = self._build(encode)
+        else:
+            self.matrix = self._build(encode)
+        self.ivf = IVFIndex(self.matrix) if len(items) >= IVF_MIN_ROWS else None
+        self.build_seconds = time.perf_counter() - start
+        logger.info(f"Dense index ready: {len(items)} rows ({self.reused} reused, {self.embedded} embedded) "
+                    f"in {self.build_seconds:.2f}s{' with IVF' if self.ivf is not None else ''}")
+
+    def _load_previous(self) -> Tuple[Dict[str, int], Optional[np.ndarray]]:
+        if not self.store_path or not os.path.exists(self.store_path + ".json"):
+            return {}, None
+        try:
+            with open(self.store_path + ".json", "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("model") != self.model_name:
+                return {}, None
+            matrix = np.load(self.store_path + ".npy", mmap_mode="r")
+            return {h: row for row, h in enumerate(manifest["hashes"])}, matrix
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable dense index at {self.store_path}: {e}")
+            return {}, None
+
+    def _build(self, encode: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        hashes = [item_hash(item) for item in self.items]
+        if not hashes:
+            return np.empty((0, 0), dtype=self.dtype)
+        previous_rows, previous = self._load_previous()
+
+        missing = [pos for pos, h in enumerate(hashes) if h not in previous_rows]
+        if previous is not None and not missing and len(previous_rows) == len(hashes) \
+                and all(previous_rows[h] == pos for pos, h in enumerate(hashes)):
+            self.reused = len(hashes)
+            return previous
+
+        vectors = _normalize(np.asarray(encode([product_text(self.items[pos]) for pos in missing]), dtype=np.float32)) \
+            if missing else None
+        dim = vectors.shape[1] if vectors is not None else previous.shape[1]
+        matrix = np.empty((len(hashes), dim), dtype=self.dtype)
+        if vectors is not None:
+            matrix[missing] = vectors
+        reused = [pos for pos, h in enumerate(hashes) if h in previous_rows]
+        if reused:
+            matrix[reused] = previous[[previous_rows[hashes[pos]] for pos in reused]]
+        self.reused, self.embedded = len(reused), len(missing)
+
+        if not self.store_path:
+            return matrix
+        # Write beside the old files under unique names and rename so readers never see a partial matrix
+        npy_path = self._write_temp(".npy", lambda f: np.save(f, matrix))
+        json_path = self._write_temp(".json", lambda f: f.write(json.dumps(
+            {"model": self.model_name, "dtype": self.dtype.name, "hashes": hashes}).encode("utf-8")))
+        os.replace(npy_path, self.store_path + ".npy")
+        os.replace(json_path, self.store_path + ".json")
+        return np.load(self.store_path + ".npy", mmap_mode="r")
+
+    def _write_temp(self, suffix: str, write: Callable) -> str:
+        directory, name = os.path.split(self.store_path)
+        fd, path = tempfile.mkstemp(prefix=name + ".", suffix=".tmp" + suffix, dir=directory or None)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+        except BaseException:
+            os.unlink(path)
+            raise
+        return path
+
+    def search(self, query_vector: np.ndarray, k: int = 20) -> List[Tuple[int, float]]:
+        query = _normalize(np.asarray(query_vector, dtype=np.float32).reshape(1, -1))[0]
+        if self.ivf is not None:
+            positions = np.sort(self.ivf.candidates(query, IVF_NPROBE))
+            scores = np.asarray(self.matrix[positions], dtype=np.float32) @ query
+        else:
+            # Upcast in chunks so a float16 memmap never needs a full float32 copy
+            positions = None
+            scores = np.concatenate([np.asarray(self.matrix[start:start + 16384], dtype=np.float32) @ query
+                                     for start in range(0, self.matrix.shape[0], 16384)] or [np.empty(0)])
+        if scores.size == 0:
+            return []
+        k = min(k, scores.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        if positions is not None:
+            return [(int(positions[i]), float(scores[i])) for i in top]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def stats(self) -> Dict:
+        return {"rows": len(self.items), "reused": self.reused, "embedded": self.embedded,
+                "build_seconds": round(self.build_seconds, 3), "ivf_lists": len(self.ivf.lists) if self.ivf else 0}
+
+
+class DenseIndexManager:
+    """Builds one dense index per catalog snapshot in the background.
+
+    get() never blocks a query on embedding: until the index for the current
+    snapshot is ready it returns None and retrieval stays lexical.
+    """
+
+    def __init__(self, encoder_factory: Callable[[], object], model_name: str, dtype: str = "float16"):
+        self._encoder_factory = encoder_factory
+        self._encoder = None
+        self.model_name = model_name
+        self.dtype = dtype
+        self._indexes: Dict[str, Tuple[object, DenseCatalogIndex]] = {}
+        self._building: Dict[str, object] = {}
+        self._failed: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        self._encoder_lock = threading.Lock()
+        # One build at a time per source; a build superseded while waiting is skipped
+        self._build_locks: Dict[str, threading.Lock] = {}
+
+    @property
+    def encoder(self):
+        if self._encoder is None:
+            with self._encoder_lock:
+                if self._encoder is None:
+                    self._encoder = self._encoder_factory()
+        return self._encoder
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return self.encoder.encode(texts, batch_size=64, convert_to_numpy=True, normalize_embeddings=True,
+                                   show_progress_bar=False)
+
+    def get(self, snapshot) -> Optional[DenseCatalogIndex]:
+        with self._lock:
+            current = self._indexes.get(snapshot.source)
+            if current is not None and current[0] is snapshot:
+                return current[1]
+            if self._failed.get(snapshot.source) is snapshot:
+                return None
+            if self._building.get(snapshot.source) is not snapshot:
+                self._building[snapshot.source] = snapshot
+                threading.Thread(target=self._build, args=(snapshot,), daemon=True).start()
+        return None
+
+    def _build(self, snapshot) -> None:
+        store_path = None if snapshot.source.startswith("<") else snapshot.source + ".emb"
+        with self._lock:
+            build_lock = self._build_locks.setdefault(snapshot.source, threading.Lock())
+        try:
+            with build_lock:
+                with self._lock:
+                    if self._building.get(snapshot.source) is not snapshot:
+                        return
+                index = DenseCatalogIndex(snapshot.items, self.encode, self.model_name, store_path, self.dtype)
+                with self._lock:
+                    self._indexes[snapshot.source] = (snapshot, index)
+        except Exception as e:
+            logger.error(f"Dense index build failed for {snapshot.source}: {e}")
+            with self._lock:
+                self._failed[snapshot.source] = snapshot
+        finally:
+            with self._lock:
+                if self._building.get(snapshot.source) is snapshot:
+                    del self._building[snapshot.source]
+
+    def stats(self) -> List[Dict]:
+        return [{"source": source, **index.stats()} for source, (_, index) in list(self._indexes.items())]
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = 60) -> List[int]:
+    """Fuse ranked position lists; an item's score is the sum of 1 / (k + rank)."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, pos in enumerate(ranking):
+            scores[pos] = scores.get(pos, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=lambda pos: scores[pos], reverse=True)
@@ -0,0 +1,165 @@
+import os
+import re
+import json
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .fuzzy_matcher import BatchFuzzyMatcher
+
+PRICE_PATTERNS = [
+    r'budget\s*(?:is|:)?\s*₹?(\d+)', r'price\s*(?:is|:)?\s*₹?(\d+)',
+    r'under\s*₹?(\d+)', r'below\s*₹?(\d+)', r'less than\s*₹?(\d+)',
+    r'max(?:imum)?\s*₹?(\d+)', r'₹(\d+)', r'rs\.?\s*(\d+)'
+]
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden", "filter_extraction.json")
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton: finds every occurrence of every keyword in one pass."""
+
+    def __init__(self, keywords: List[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[str]] = [[]]
+        for keyword in keywords:
+            state = 0
+            for char in keyword:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            if keyword not in self._output[state]:
+                self._output[state].append(keyword)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def find_all(self, text: str) -> Iterator[Tuple[int, str]]:
+        """Yield (start, keyword) for every occurrence, overlapping ones included."""
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for keyword in self._output[state]:
+                yield i - len(keyword) + 1, keyword
+
+
+class FilterExtractor:
+    """Compiled replacement for the loop-based extract_filters.
+
+    Built once from the category mapping, material list and price patterns:
+    - the price patterns become one regex of zero-width lookaheads, so a single
+      finditer reports every position where any pattern matches, and the
+      original "first pattern in list order, leftmost match" rule is applied
+      to those hits
+    - category keys and the substrings the contextual rules test ("jeans",
+      "denim", "jacket", "coat") go into one keyword automaton, so the query is
+      scanned once for all exact hits
+    - the fuzzy fallbacks use the shared BatchFuzzyMatcher and its "category"
+      and "material" vocabularies
+
+    Results are memoized per lowercased query in an LRU.
+    """
+
+    def __init__(self, category_mapping: Dict[str, str], matcher: BatchFuzzyMatcher,
+                 price_patterns: Optional[List[str]] = None, cache_size: int = 4096):
+        self.category_mapping = category_mapping
+        self.matcher = matcher
+        patterns = price_patterns or PRICE_PATTERNS
+        self._price_re = re.compile("|".join(f"(?=(?P<p{i}>{p}))" for i, p in enumerate(patterns)))
+        self._automaton = KeywordAutomaton(list(category_mapping) + ["jeans", "denim", "jacket", "coat"])
+        self._memo: "OrderedDict[str, Dict]" = OrderedDict()
+        self._memo_size = cache_size
+        self._lock = threading.Lock()
+
+    def _max_price(self, query_lower: str) -> Optional[float]:
+        best: Optional[Tuple[int, int, str]] = None
+        for match in self._price_re.finditer(query_lower):
+            index = int(match.lastgroup[1:])
+            if best is None or index < best[0]:
+                # The pattern's own (\d+) group immediately follows its named wrapper group
+                best = (index, match.start(), match.group(match.re.groupindex[match.lastgroup] + 1))
+        return float(best[2]) if best else None
+
+    def _scan(self, query_lower: str) -> Tuple[set, set]:
+        """Exact whole-word category hits (by word start) and every keyword substring present."""
+        word_hits, substrings = set(), set()
+        for start, keyword in self._automaton.find_all(query_lower):
+            substrings.add(keyword)
+            end = start + len(keyword)
+            if keyword in self.category_mapping \
+                    and (start == 0 or query_lower[start - 1].isspace()) \
+                    and (end == len(query_lower) or query_lower[end].isspace()):
+                word_hits.add(start)
+        return word_hits, substrings
+
+    def _compute(self, query_lower: str) -> Dict:
+        filters = {}
+
+        max_price = self._max_price(query_lower)
+        if max_price is not None:
+            filters['max_price'] = max_price
+
+        word_hits, substrings = self._scan(query_lower)
+        words = [(m.start(), m.group()) for m in re.finditer(r"\S+", query_lower)]
+        self.matcher.prime([w for _, w in words] + [w.strip('s') for _, w in words])
+
+        for start, word in words:
+            if start in word_hits:
+                filters['category'] = self.category_mapping[word]
+                break
+            if match := self.matcher.match(word.strip('s'), "category", threshold=80):
+                filters['category'] = self.category_mapping[match]
+                break
+
+        if "jeans" in substrings or "denim" in substrings:
+            filters['material'] = "denim"
+        else:
+            for _, word in words:
+                if match := self.matcher.match(word, "material", threshold=80):
+                    filters['material'] = match
+                    break
+
+        material = filters.get('material', '')
+        if ('denim' in material or 'leather' in material) and ("jacket" in substrings or "coat" in substrings) \
+                and not filters.get('category'):
+            filters['category'] = 'Jacket'
+        return filters
+
+    def extract(self, query: str) -> Dict:
+        key = query.lower()
+        with self._lock:
+            cached = self._memo.get(key)
+            if cached is not None:
+                self._memo.move_to_end(key)
+                return dict(cached)
+        filters = self._compute(key)
+        with self._lock:
+            self._memo[key] = filters
+            while len(self._memo) > self._memo_size:
+                self._memo.popitem(last=False)
+        return dict(filters)
+
+    def verify_golden(self, path: str = GOLDEN_PATH) -> List[Dict]:
+        """Mismatches between extract() and the recorded outputs of the original extractor."""
+        with open(path, "r", encoding="utf-8") as f:
+            cases = json.load(f)
+        mismatches = []
+        for case in cases:
+            got = self._compute(case["query"].lower())
+            if list(got.items()) != list(case["filters"].items()):
+                mismatches.append({"query": case["query"], "expected": case["filters"], "got": got})
+        return mismatches
@@ -0,0 +1,114 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+from fuzzywuzzy import process, fuzz, utils
+
+try:
+    import numpy as np
+    from rapidfuzz import process as rf_process
+    from rapidfuzz.distance import Indel
+except ImportError:  # fall back to per-pair fuzzywuzzy scoring
+    np = None
+    rf_process = None
+
+# ==== Fuzzy Matcher ====
+def fuzzy_match(term: str, choices: List[str], threshold: int = 80) -> Optional[str]:
+    if not choices:
+        return None
+    result, score = process.extractOne(term, choices, scorer=fuzz.token_sort_ratio)
+    return result if score >= threshold else None
+
+# ==== Batched Matcher ====
+def _sort_tokens(text: str) -> str:
+    """The string fuzz.token_sort_ratio compares after process.extractOne's preprocessing."""
+    processed = utils.full_process(utils.full_process(text), force_ascii=True)
+    return " ".join(sorted(processed.split()))
+
+
+class BatchFuzzyMatcher:
+    """Scores query tokens against fixed vocabularies in one batched pass.
+
+    Every vocabulary is concatenated into a single choice list, so the tokens of
+    a query are scored against all of them with one rapidfuzz cdist call (C,
+    multi-threaded). Scores are computed from integer InDel distances exactly
+    the way fuzzywuzzy's token_sort_ratio rounds them, and the best choice per
+    vocabulary is taken with the same first-maximum tie break as
+    process.extractOne, so match(token, vocab, threshold) agrees with
+    fuzzy_match(token, vocab_choices, threshold). The best (choice, score) per
+    vocabulary is memoized per token in an LRU.
+    """
+
+    def __init__(self, vocabularies: Dict[str, List[str]], cache_size: int = 8192):
+        self.vocabularies = {name: list(choices) for name, choices in vocabularies.items()}
+        self._choices: List[str] = []
+        self._slices: Dict[str, Tuple[int, int]] = {}
+        for name, choices in self.vocabularies.items():
+            start = len(self._choices)
+            self._choices.extend(choices)
+            self._slices[name] = (start, len(self._choices))
+        self._sorted_choices = [_sort_tokens(choice) for choice in self._choices]
+        self._choice_lengths = [len(choice) for choice in self._sorted_choices]
+
+        self._cache: "OrderedDict[str, Dict[str, Tuple[Optional[str], int]]]" = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _score_rows(self, tokens: List[str]) -> List[List[int]]:
+        sorted_tokens = [_sort_tokens(token) for token in tokens]
+        if rf_process is None:
+            return [[fuzz.token_sort_ratio(token, choice) if token else 0 for choice in self._sorted_choices]
+                    for token in sorted_tokens]
+
+        distances = rf_process.cdist(sorted_tokens, self._sorted_choices, scorer=Indel.distance,
+                                     dtype=np.int32, workers=-1)
+        token_lengths = np.array([len(token) for token in sorted_tokens], dtype=np.float64)[:, None]
+        lensum = token_lengths + np.array(self._choice_lengths, dtype=np.float64)[None, :]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scores = np.rint(100 * ((lensum - distances) / lensum))
+        scores[lensum == 0] = 100
+        scores[token_lengths[:, 0] == 0, :] = 0
+        return scores.astype(np.int32).tolist()
+
+    def prime(self, tokens: Iterable[str]) -> None:
+        """Score every uncached token against all vocabularies in one batch."""
+        with self._lock:
+            pending = [token for token in dict.fromkeys(tokens) if token not in self._cache]
+        if not pending or not self._choices:
+            return
+
+        rows = self._score_rows(pending)
+        with self._lock:
+            for token, row in zip(pending, rows):
+                best = {}
+                for name, (start, end) in self._slices.items():
+                    if start == end:
+                        best[name] = (None, 0)
+                        continue
+                    segment = row[start:end]
+                    score = max(segment)
+                    best[name] = (self._choices[start + segment.index(score)], score)
+                self._cache[token] = best
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+
+    def best(self, token: str, vocabulary: str) -> Tuple[Optional[str], int]:
+        with self._lock:
+            entry = self._cache.get(token)
+            if entry is not None:
+                self._cache.move_to_end(token)
+                self.hits += 1
+                return entry[vocabulary]
+            self.misses += 1
+        self.prime([token])
+        with self._lock:
+            return self._cache[token][vocabulary] if token in self._cache else (None, 0)
+
+    def match(self, token: str, vocabulary: str, threshold: int = 80) -> Optional[str]:
+        choice, score = self.best(token, vocabulary)
+        return choice if choice is not None and score >= threshold else None
+
+    def stats(self) -> Dict:
+        return {"cached_tokens": len(self._cache), "hits": self.hits, "misses": self.misses,
+                "backend": "rapidfuzz" if rf_process is not None else "fuzzywuzzy"}
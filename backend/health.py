@@ -0,0 +1,94 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger("Health")
+
+PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "10"))
+PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", "2"))
+# A result older than this many intervals means the prober itself is stuck
+STALE_AFTER_INTERVALS = 3
+
+# A check returns optional detail for the report and raises when the dependency is not usable
+Check = Callable[[], Awaitable[Optional[Dict[str, Any]]]]
+
+
+class DependencyProber:
+    """Checks dependencies in the background and caches the results
+
+    Readiness requests read the cache, so probe traffic from the
+    orchestrator never reaches the dependencies themselves; each dependency
+    is checked once per interval per process, whatever the probe rate.
+    """
+
+    def __init__(self, interval: float = PROBE_INTERVAL, timeout: float = PROBE_TIMEOUT):
+        self.interval = interval
+        self.timeout = timeout
+        self._checks: Dict[str, Tuple[Check, bool]] = {}
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, name: str, check: Check, required: bool = True) -> None:
+        """required=False checks are reported but do not affect readiness"""
+        self._checks[name] = (check, required)
+
+    async def _run_check(self, name: str, check: Check, required: bool) -> None:
+        start = time.perf_counter()
+        result: Dict[str, Any] = {"required": required}
+        try:
+            detail = await asyncio.wait_for(check(), self.timeout)
+            result["ok"] = True
+            if detail:
+                result["detail"] = detail
+        except asyncio.TimeoutError:
+            result.update(ok=False, error=f"timed out after {self.timeout}s")
+        except Exception as e:
+            result.update(ok=False, error=str(e))
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        result["checked_at"] = time.time()
+        previous = self.results.get(name)
+        if previous is not None and previous["ok"] != result["ok"]:
+            logger.warning(f"Dependency '{name}' is now {'up' if result['ok'] else 'down'}: {result.get('error', '')}")
+        self.results[name] = result
+
+    async def probe_once(self) -> None:
+        await asyncio.gather(*(self._run_check(name, check, required)
+                               for name, (check, required) in self._checks.items()))
+
+    async def _run(self) -> None:
+        while True:
+            await self.probe_once()
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def report(self) -> Tuple[bool, Dict[str, Dict[str, Any]]]:
+        """(ready, per-dependency results) from the cache; never does I/O"""
+        now = time.time()
+        max_age = self.interval * STALE_AFTER_INTERVALS + self.timeout
+        checks: Dict[str, Dict[str, Any]] = {}
+        ready = True
+        for name, (_, required) in self._checks.items():
+            result = self.results.get(name)
+            if result is None:
+                result = {"required": required, "ok": False, "error": "not checked yet"}
+            else:
+                result = {**result, "age_seconds": round(now - result["checked_at"], 1)}
+                if result["age_seconds"] > max_age:
+                    result.update(ok=False, error="result is stale")
+            checks[name] = result
+            ready = ready and (result["ok"] or not required)
+        return ready, checks
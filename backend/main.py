@@ -1,12 +1,19 @@
 # main.py
 import os
-import json
+import asyncio
 from dotenv import load_dotenv
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from supabase import create_client, Client
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from datetime import datetime
+from typing import Optional
+from . import semantic_rag, resilience
+from .data_access import Database
+from .profile_cache import ProfileCache
+from .conversation_log import ConversationLog, conversation_row
+from .product_snapshot import ProductSnapshotService
+from .loop_lag import loop_lag
+from .health import DependencyProber
 
 load_dotenv()
 
@@ -27,22 +34,58 @@ supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 if not supabase_url or not supabase_key:
     raise ValueError("SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY not found in environment variables")
 
-supabase: Client = create_client(supabase_url, supabase_key)
+database = Database(supabase_url, supabase_key)
+profile_cache = ProfileCache(
+    max_entries=int(os.getenv("PROFILE_CACHE_SIZE", "10000")),
+    ttl_seconds=float(os.getenv("PROFILE_CACHE_TTL", "300")),
+    negative_ttl_seconds=float(os.getenv("PROFILE_CACHE_NEGATIVE_TTL", "60")),
+)
+# Conversation rows are written behind the response in batched inserts
+conversation_log = ConversationLog(database)
+# Recommendation candidates are served from memory
+product_snapshot = ProductSnapshotService(database)
 
 @app.on_event("startup")
 async def startup_event():
     print("Starting up application...")
+    loop_lag.start()
+    conversation_log.start()
+    product_snapshot.start()
+    # Load the catalog and models in the background so the first /search doesn't pay for it
+    semantic_rag.start_warmup(os.getenv("CATALOG_CSV"))
+    prober.start()
     print("Application startup complete!")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await prober.stop()
+    await loop_lag.stop()
+    await conversation_log.stop()
+    await product_snapshot.stop()
+    await database.aclose()
+    if openai_key:
+        from .agents import llm_client
+        await llm_client.aclose()
+
 # Database dependency
 async def get_db():
-    yield supabase  # Supabase client is stateless
+    yield database  # Shared async PostgREST client
 
 # Pydantic model
 class MessageRequest(BaseModel):
     message: str
     context: dict = {}
 
+class SearchRequest(BaseModel):
+    query: str
+    category: Optional[str] = None
+
+# A profile update: {"email": ...}, or a Supabase database webhook payload for the users table
+class ProfileChange(BaseModel):
+    email: Optional[str] = None
+    record: Optional[dict] = None
+    old_record: Optional[dict] = None
+
 # OpenAI agents
 openai_key = os.getenv("OPENAI_API_KEY")
 if openai_key:
@@ -52,6 +95,7 @@ if openai_key:
     from .agents.whatsapp_agent import WhatsAppAgent
     from .agents.sms_agent import SMSAgent
     from .agents.recommendation_agent import RecommendationAgent
+    from .agents.streaming import sse_event
 
     email_agent = EmailAgent(openai_key)
     web_chat_agent = WebChatAgent(openai_key)
@@ -61,35 +105,127 @@ if openai_key:
 else:
     email_agent = web_chat_agent = whatsapp_agent = sms_agent = recommendation_agent = None
 
+# Dependencies are probed in the background; /readyz and /health only read the cached results
+prober = DependencyProber()
+
+async def check_database():
+    await database.ping()
+
+async def check_models():
+    if semantic_rag.startup_stats["warmup_seconds"] is None:
+        raise RuntimeError("warm-up in progress")
+    # Failed warm-up steps degrade search but do not block it
+    return dict(semantic_rag.readiness)
+
+async def check_llm():
+    from .agents import llm_client
+    breakers = llm_client.caller.breakers
+    # would_allow(), not state: a breaker only leaves "open" when the next call asks allow(), which
+    # no call does while readiness keeps traffic away; a half-open breaker with its probe out rejects calls
+    if not llm_client.caller.available():
+        raise RuntimeError("circuit open for every model")
+    return {"provider": llm_client.PROVIDER,
+            "breakers": {model: breaker.state for model, breaker in breakers.items()}}
+
+async def check_product_snapshot():
+    if product_snapshot.snapshot is None:
+        raise RuntimeError("not loaded yet")
+    return {"products": len(product_snapshot.snapshot.products)}
+
+prober.register("database", check_database)
+prober.register("models", check_models)
+if openai_key:
+    # Reported only: an open breaker recovers through live calls, so it must not pull the pod from rotation
+    prober.register("llm", check_llm, required=False)
+prober.register("product_snapshot", check_product_snapshot, required=False)
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to the D2C Backend API"}
 
+# Liveness: the process is serving requests; no I/O
+@app.get("/livez")
+async def livez():
+    return {"status": "alive"}
+
+# Readiness: cached dependency checks, 503 until every required dependency is up
+@app.get("/readyz")
+async def readyz():
+    ready, checks = prober.report()
+    return JSONResponse({"status": "ready" if ready else "not_ready", "checks": checks},
+                        status_code=200 if ready else 503)
+
 @app.get("/health")
-async def health_check(db: Client = Depends(get_db)):
+async def health_check():
+    ready, checks = prober.report()
+    if ready:
+        return {"status": "healthy", "database": "connected", "checks": checks}
+    return {"status": "unhealthy", "checks": checks}
+
+# Diagnostics: on demand only, not for probes
+@app.get("/diagnostics/migrations")
+async def diagnostics_migrations(db: Database = Depends(get_db)):
     try:
-        response = db.from_("users").select("id").limit(1).execute()
-        if response.data is not None:
-            tables_resp = db.from_("_supabase_migrations").select("name").execute()
-            tables = [table["name"] for table in tables_resp.data] if tables_resp.data else []
-            return {"status": "healthy", "database": "connected", "tables": tables}
-        return {"status": "unhealthy", "error": "No data retrieved"}
+        return {"migrations": await db.list_migrations()}
     except Exception as e:
-        return {"status": "unhealthy", "error": str(e)}
+        return {"error": "Failed to list migrations", "details": str(e)}
+
+@app.get("/metrics")
+async def metrics():
+    agent_metrics = {}
+    if openai_key:
+        from .agents.response_cache import response_cache
+        from .agents.streaming import stream_metrics
+        from .agents import llm_client
+        agent_metrics["llm_pool"] = llm_client.pool_stats()
+        agent_metrics["response_cache"] = response_cache.stats()
+        agent_metrics["streaming"] = stream_metrics.stats()
+    return {
+        "agents": agent_metrics,
+        "llm_providers": resilience.stats(),
+        "database": database.stats(),
+        "profile_cache": profile_cache.stats(),
+        "conversation_log": conversation_log.stats(),
+        "product_snapshot": product_snapshot.stats(),
+        "event_loop": loop_lag.stats(),
+        "semantic_rag": {
+            "catalog": semantic_rag.catalog_cache.stats(),
+            "dense": semantic_rag.dense_indexes.stats(),
+            "reranker": semantic_rag.reranker.stats(),
+            "rewrite_cache": semantic_rag.rewrite_cache.stats(),
+            "filter_matcher": semantic_rag.filter_matcher.stats(),
+            "startup": semantic_rag.startup_stats,
+            "readiness": semantic_rag.readiness,
+        }
+    }
+
+# Profile cache invalidation, called on user profile changes
+# Clears the profile cache of the worker that receives the call only; other workers
+# pick up the change when their entry expires (PROFILE_CACHE_TTL)
+@app.post("/profiles/invalidate")
+async def invalidate_profile(change: ProfileChange):
+    emails = {change.email} | {row.get("email") for row in (change.record, change.old_record) if row}
+    emails.discard(None)
+    for email in emails:
+        profile_cache.invalidate(email)
+    return {"invalidated": sorted(emails)}
+
+# Product search
+@app.post("/search")
+async def search(request: SearchRequest):
+    # The catalog comes from server config only, never from the request
+    try:
+        return await semantic_rag.run_search(request.query, request.category, os.getenv("CATALOG_CSV"))
+    except Exception as e:
+        print(f"Error in search: {e}")
+        return {"error": "Failed to run search", "details": str(e)}
 
 # Helper function
-async def get_user_data(db: Client, email: str):
+async def get_user_data(db: Database, email: str):
     try:
-        response = db.from_("users").select("id, name, phone_number, preferences").eq("email", email).execute()
-        if response.data:
-            user = response.data[0]
-            preferences = json.loads(user.get("preferences")) if user.get("preferences") else {}
-            return {
-                "id": user["id"],
-                "name": user["name"],
-                "phone_number": user.get("phone_number"),
-                "preferences": preferences
-            }
+        user = await profile_cache.get(email, db.fetch_user_by_email)
+        if user:
+            return user
         return {"id": None, "name": "Customer", "phone_number": None, "preferences": {}}
     except Exception as e:
         print(f"Error fetching user data: {e}")
@@ -97,7 +233,7 @@ async def get_user_data(db: Client, email: str):
 
 # Process email
 @app.post("/process-email/")
-async def process_email(request: MessageRequest, db: Client = Depends(get_db)):
+async def process_email(request: MessageRequest, db: Database = Depends(get_db)):
     if not email_agent:
         return {"error": "Email agent not initialized"}
     
@@ -107,7 +243,7 @@ async def process_email(request: MessageRequest, db: Client = Depends(get_db)):
 
 # Process web chat
 @app.post("/process-web-chat/")
-async def process_web_chat(request: MessageRequest, db: Client = Depends(get_db)):
+async def process_web_chat(request: MessageRequest, db: Database = Depends(get_db)):
     if not web_chat_agent:
         return {"error": "Web chat agent not initialized"}
     
@@ -116,35 +252,51 @@ async def process_web_chat(request: MessageRequest, db: Client = Depends(get_db)
     customer_id = user_data["id"]
 
     try:
-        # Save user message
-        db.from_("conversations_recommendations").insert({
-            "entity_type": "MESSAGE",
-            "customer_id": customer_id,
-            "channel": "web_chat",
-            "content": request.message,
-            "created_at": datetime.utcnow().isoformat()
-        }).execute()
-        
-        # Process message
+        # Logged write-behind; a logging failure never fails the reply
+        await conversation_log.put(conversation_row("MESSAGE", customer_id, "web_chat", request.message))
         result = await web_chat_agent.process_message(request.message, {**user_data, **request.context})
-        
-        # Save AI response
-        db.from_("conversations_recommendations").insert({
-            "entity_type": "RESPONSE",
-            "customer_id": customer_id,
-            "channel": "web_chat",
-            "content": str(result),
-            "created_at": datetime.utcnow().isoformat()
-        }).execute()
-        
+        await conversation_log.put(conversation_row("RESPONSE", customer_id, "web_chat", str(result)))
         return result
     except Exception as e:
-        print(f"Error saving conversation: {e}")
-        return {"error": "Failed to save conversation", "details": str(e)}
+        print(f"Error processing web chat message: {e}")
+        return {"error": "Failed to process message", "details": str(e)}
+
+# Streamed replies as Server-Sent Events; the conversation is logged once the stream ends
+async def stream_conversation(agent, channel: str, request: MessageRequest, db: Database):
+    user_data = await get_user_data(db, request.context.get("email", "default@example.com"))
+    customer_id = user_data["id"]
+
+    await conversation_log.put(conversation_row("MESSAGE", customer_id, channel, request.message))
+
+    async def events():
+        result = None
+        streamed = []
+        try:
+            async for event, data in agent.stream_message(request.message, {**user_data, **request.context}):
+                if event == "token":
+                    streamed.append(data["text"])
+                elif event == "done":
+                    result = data
+                yield sse_event(event, data)
+        finally:
+            # Runs even if the client disconnects mid-stream; append() never waits
+            if result is None:
+                # Cut off before the end: log what the customer was shown so far
+                result = {"status": "partial", "response": "".join(streamed), "channel": channel}
+            conversation_log.append(conversation_row("RESPONSE", customer_id, channel, str(result)))
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/process-web-chat/stream")
+async def process_web_chat_stream(request: MessageRequest, db: Database = Depends(get_db)):
+    if not web_chat_agent:
+        return {"error": "Web chat agent not initialized"}
+    return await stream_conversation(web_chat_agent, "web_chat", request, db)
 
 # Process WhatsApp
 @app.post("/process-whatsapp/")
-async def process_whatsapp(request: MessageRequest, db: Client = Depends(get_db)):
+async def process_whatsapp(request: MessageRequest, db: Database = Depends(get_db)):
     if not whatsapp_agent:
         return {"error": "WhatsApp agent not initialized"}
     
@@ -152,9 +304,15 @@ async def process_whatsapp(request: MessageRequest, db: Client = Depends(get_db)
     result = await whatsapp_agent.process_message(request.message, {**user_data, **request.context})
     return result
 
+@app.post("/process-whatsapp/stream")
+async def process_whatsapp_stream(request: MessageRequest, db: Database = Depends(get_db)):
+    if not whatsapp_agent:
+        return {"error": "WhatsApp agent not initialized"}
+    return await stream_conversation(whatsapp_agent, "whatsapp", request, db)
+
 # Process SMS
 @app.post("/process-sms/")
-async def process_sms(request: MessageRequest, db: Client = Depends(get_db)):
+async def process_sms(request: MessageRequest, db: Database = Depends(get_db)):
     if not sms_agent:
         return {"error": "SMS agent not initialized"}
     
@@ -164,7 +322,7 @@ async def process_sms(request: MessageRequest, db: Client = Depends(get_db)):
 
 # Process recommendations
 @app.post("/process-recommendation/")
-async def process_recommendation(request: MessageRequest, db: Client = Depends(get_db)):
+async def process_recommendation(request: MessageRequest, db: Database = Depends(get_db)):
     if not recommendation_agent:
         return {"error": "Recommendation agent not initialized"}
     
@@ -173,27 +331,19 @@ async def process_recommendation(request: MessageRequest, db: Client = Depends(g
     customer_id = user_data["id"]
 
     try:
-        # Fetch products
-        product_response = db.from_("products").select("name, category, price").limit(3).execute()
-        products = product_response.data if product_response.data else []
-
-        # Fetch last recommendations
-        rec_response = db.from_("conversations_recommendations") \
-                         .select("recommended_products, keywords_extracted") \
-                         .eq("customer_id", customer_id) \
-                         .limit(1).execute()
-        rec_data = rec_response.data[0] if rec_response.data else {}
-        
-        recommended_products = json.loads(rec_data.get("recommended_products", "[]")) if rec_data.get("recommended_products") else []
-        keywords_extracted = json.loads(rec_data.get("keywords_extracted", "[]")) if rec_data.get("keywords_extracted") else []
+        # In-stock candidates come from the in-memory snapshot; only the last recommendation needs the DB
+        products, last_recommendation = await asyncio.gather(
+            product_snapshot.candidates(request.message, request.context.get("category")),
+            db.fetch_last_recommendation(customer_id)
+        )
 
         result = await recommendation_agent.process_message(request.message, {
             "user_name": user_data["name"],
             "phone_number": user_data["phone_number"],
             "preferences": user_data["preferences"],
             "products": products,
-            "recommended_products": recommended_products,
-            "keywords_extracted": keywords_extracted,
+            "recommended_products": last_recommendation["recommended_products"],
+            "keywords_extracted": last_recommendation["keywords_extracted"],
             **request.context
         })
         return result
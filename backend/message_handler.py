@@ -1,16 +1,17 @@
 from typing import Dict, Any, Optional
-from openai import OpenAI
 from datetime import datetime
+from .agents.llm_client import get_async_client, chat_completion
 
 class MessageHandler:
     def __init__(self, api_key: str):
         """Initialize the message handler with OpenAI API key"""
-        self.client = OpenAI(api_key=api_key)
+        self.client = get_async_client(api_key)
 
     async def analyze_intent(self, message: str) -> Dict[str, Any]:
         """Analyze the intent of a message"""
         try:
-            response = self.client.chat.completions.create(
+            response = await chat_completion(
+                self.client,
                 model="gpt-3.5-turbo",
                 messages=[
                     {"role": "system", "content": "Analyze the customer message intent and sentiment."},
@@ -38,7 +39,8 @@ class MessageHandler:
             # Construct prompt with context
             prompt = self._construct_prompt(message, context, channel)
             
-            response = self.client.chat.completions.create(
+            response = await chat_completion(
+                self.client,
                 model="gpt-3.5-turbo",
                 messages=[
                     {"role": "system", "content": prompt},
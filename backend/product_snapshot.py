@@ -0,0 +1,193 @@
+import os
+import re
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from .data_access import Database, ProductRow
+
+logger = logging.getLogger("ProductSnapshot")
+
+# New products are picked up every REFRESH_INTERVAL via the created_at watermark; a full
+# reload every FULL_RELOAD_INTERVAL also picks up stock and price changes and deletions
+REFRESH_INTERVAL = float(os.getenv("PRODUCT_SNAPSHOT_REFRESH_INTERVAL", "60"))
+FULL_RELOAD_INTERVAL = float(os.getenv("PRODUCT_SNAPSHOT_FULL_RELOAD_INTERVAL", "900"))
+PAGE_SIZE = int(os.getenv("PRODUCT_SNAPSHOT_PAGE_SIZE", "1000"))
+# How long a request waits for the first load before going on without products
+READY_TIMEOUT = float(os.getenv("PRODUCT_SNAPSHOT_READY_TIMEOUT", "2"))
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _category_forms(category: str) -> Set[str]:
+    """Singular and plural spellings of a category; for phrases only the last word varies"""
+    words = _WORD_RE.findall(category)
+    if not words:
+        return set()
+    *head, last = words
+    lasts = {last, last + "s", last + "es", last.removesuffix("es"), last.removesuffix("s")}
+    return {" ".join(head + [form]) for form in lasts if len(form) > 1}
+
+
+def _category_matcher(categories) -> Tuple[Optional[re.Pattern], Dict[str, str]]:
+    """One whole-word regex over every form of every category, and the category of each form"""
+    forms: Dict[str, str] = {}
+    for category in categories:
+        for form in _category_forms(category):
+            # A category's own name wins over another category's plural or singular form
+            if forms.get(form) != form:
+                forms[form] = category if form not in categories else form
+    if not forms:
+        return None, forms
+    # Longest first, so "t shirts" is preferred over "t shirt" and "shirts"
+    alternatives = "|".join(re.escape(form) for form in sorted(forms, key=len, reverse=True))
+    return re.compile(rf"\b({alternatives})\b"), forms
+
+
+class ProductSnapshot:
+    """Immutable in-memory copy of the products table
+
+    In-stock products are indexed by lowercased category, newest first. A
+    refresh builds a new snapshot and swaps it in, so readers never see a
+    half-updated table.
+    """
+
+    def __init__(self, products: Dict[int, ProductRow], watermark: Optional[str], loaded_at: float):
+        self.products = products
+        self.watermark = watermark
+        self.loaded_at = loaded_at
+        in_stock = sorted((p for p in products.values() if (p.get("stock") or 0) > 0),
+                          key=lambda p: (p.get("created_at") or "", p.get("id") or 0), reverse=True)
+        self.in_stock: Tuple[ProductRow, ...] = tuple(in_stock)
+        by_category: Dict[str, List[ProductRow]] = {}
+        for product in in_stock:
+            by_category.setdefault(str(product.get("category", "")).lower(), []).append(product)
+        self.by_category = {category: tuple(items) for category, items in by_category.items()}
+        self._category_re, self._category_forms = _category_matcher(self.by_category)
+
+    def with_rows(self, rows: List[ProductRow], loaded_at: float) -> "ProductSnapshot":
+        products = dict(self.products)
+        watermark = self.watermark
+        for row in rows:
+            products[row["id"]] = row
+            if row.get("created_at") and (watermark is None or row["created_at"] > watermark):
+                watermark = row["created_at"]
+        return ProductSnapshot(products, watermark, loaded_at)
+
+    def match_category(self, text: str) -> Optional[str]:
+        """The known category named earliest in text, as a whole word or phrase, singular or plural"""
+        if self._category_re is None:
+            return None
+        match = self._category_re.search(" ".join(_WORD_RE.findall(text.lower())))
+        return self._category_forms[match.group(1)] if match else None
+
+    def candidates(self, category: Optional[str] = None, limit: int = 5) -> List[ProductRow]:
+        if category:
+            return list(self.by_category.get(category.lower(), ())[:limit])
+        return list(self.in_stock[:limit])
+
+
+class ProductSnapshotService:
+    """Keeps a ProductSnapshot of the products table current in the background
+
+    The table is loaded in pages at startup. After that, every
+    refresh_interval only products at or after the created_at watermark are
+    fetched and merged, and every full_reload_interval the whole table is
+    reloaded. A failed refresh keeps serving the previous snapshot.
+    """
+
+    def __init__(self, db: Database, refresh_interval: float = REFRESH_INTERVAL,
+                 full_reload_interval: float = FULL_RELOAD_INTERVAL, page_size: int = PAGE_SIZE):
+        self.db = db
+        self.refresh_interval = refresh_interval
+        self.full_reload_interval = full_reload_interval
+        self.page_size = page_size
+        self.snapshot: Optional[ProductSnapshot] = None
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._last_full_load = 0.0
+        self.stats_counters = {"full_loads": 0, "incremental_refreshes": 0, "rows_merged": 0,
+                               "failed_refreshes": 0, "served": 0, "served_before_ready": 0}
+
+    async def _fetch_all(self, fetch_page: Callable[[int, int], Awaitable[List[ProductRow]]]) -> List[ProductRow]:
+        rows: List[ProductRow] = []
+        while True:
+            page = await fetch_page(len(rows), self.page_size)
+            rows.extend(page)
+            if len(page) < self.page_size:
+                return rows
+
+    async def load(self) -> None:
+        """Full load of the products table"""
+        start = time.perf_counter()
+        rows = await self._fetch_all(self.db.fetch_product_page)
+        self.snapshot = ProductSnapshot({}, None, time.time()).with_rows(rows, time.time())
+        self._last_full_load = time.monotonic()
+        self.stats_counters["full_loads"] += 1
+        self._ready.set()
+        logger.info(f"Loaded {len(rows)} products in {time.perf_counter() - start:.2f}s")
+
+    async def refresh(self) -> None:
+        """Merge products created since the watermark; falls back to a full load without one"""
+        snapshot = self.snapshot
+        if snapshot is None or snapshot.watermark is None \
+                or time.monotonic() - self._last_full_load >= self.full_reload_interval:
+            await self.load()
+            return
+        # gte, not gt: rows sharing the watermark timestamp may have arrived since; merging by id dedupes them
+        rows = await self._fetch_all(lambda offset, limit: self.db.fetch_products_since(snapshot.watermark, offset, limit))
+        self.snapshot = snapshot.with_rows(rows, time.time())
+        self.stats_counters["incremental_refreshes"] += 1
+        self.stats_counters["rows_merged"] += len(rows)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                self.stats_counters["failed_refreshes"] += 1
+                logger.warning(f"Product snapshot refresh failed, serving the previous snapshot: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def candidates(self, message: str = "", category: Optional[str] = None, limit: int = 5) -> List[ProductRow]:
+        """In-stock products for the recommendation prompt, from memory
+
+        category, or else a category named in message, narrows the list; with
+        no matching category the newest in-stock products are returned.
+        """
+        if self.snapshot is None:
+            self.stats_counters["served_before_ready"] += 1
+            try:
+                await asyncio.wait_for(self._ready.wait(), READY_TIMEOUT)
+            except asyncio.TimeoutError:
+                return []
+        snapshot = self.snapshot
+        self.stats_counters["served"] += 1
+        category = category or snapshot.match_category(message)
+        return snapshot.candidates(category, limit) or snapshot.candidates(None, limit)
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self.snapshot
+        return {
+            **self.stats_counters,
+            "ready": snapshot is not None,
+            "products": len(snapshot.products) if snapshot else 0,
+            "in_stock": len(snapshot.in_stock) if snapshot else 0,
+            "categories": len(snapshot.by_category) if snapshot else 0,
+            "watermark": snapshot.watermark if snapshot else None,
+            "age_seconds": round(time.time() - snapshot.loaded_at, 1) if snapshot else None,
+        }
@@ -0,0 +1,105 @@
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from .data_access import UserRow, normalize_email
+from .single_flight import SingleFlight
+
+_MISSING = object()
+
+
+class ProfileCache:
+    """In-process TTL + LRU cache of user profiles keyed by email
+
+    Emails with no user row are cached too (negative entries, with their own
+    shorter TTL), so fallback addresses such as default@example.com stop
+    reaching the database. Concurrent misses for one email share a single
+    load. Failed loads are not cached. Profiles are shared between requests
+    and must be treated as read-only.
+
+    load is called with the normalized email, the same string the entry is
+    keyed on and the form emails are stored in. The cache lives in
+    one process: under several workers, invalidate() only clears the worker
+    that receives it and the others serve the old profile until the TTL runs
+    out, so keep ttl_seconds as long as a stale profile may be served.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 300.0, negative_ttl_seconds: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.negative_ttl = negative_ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[Optional[UserRow], float]]" = OrderedDict()
+        self._flight = SingleFlight()
+        # Keys invalidated while loading; the value read before the update is not cached
+        self._stale: Set[str] = set()
+        self.stats_counters = {"hits": 0, "negative_hits": 0, "misses": 0, "coalesced": 0,
+                               "errors": 0, "evictions": 0, "invalidations": 0}
+
+    def _get(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        value, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def _put(self, key: str, value: Optional[UserRow]) -> None:
+        ttl = self.ttl if value is not None else self.negative_ttl
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats_counters["evictions"] += 1
+
+    async def get(self, email: str, load: Callable[[str], Awaitable[Optional[UserRow]]]) -> Optional[UserRow]:
+        """The profile for email, or None when no user has it; load(normalized email) runs on a miss"""
+        key = normalize_email(email)
+        value = self._get(key)
+        if value is not _MISSING:
+            self.stats_counters["hits" if value is not None else "negative_hits"] += 1
+            return value
+
+        value, shared = await self._flight.do(key, lambda: self._load(key, load))
+        if shared:
+            self.stats_counters["coalesced"] += 1
+        return value
+
+    async def _load(self, key: str, load: Callable[[str], Awaitable[Optional[UserRow]]]) -> Optional[UserRow]:
+        self.stats_counters["misses"] += 1
+        try:
+            value = await load(key)
+            if key not in self._stale:
+                self._put(key, value)
+            return value
+        except Exception:
+            self.stats_counters["errors"] += 1
+            raise
+        finally:
+            self._stale.discard(key)
+
+    def invalidate(self, email: str) -> None:
+        """Drop the cached profile after the user row for email is created, updated or deleted"""
+        key = normalize_email(email)
+        self._entries.pop(key, None)
+        if key in self._flight:
+            self._stale.add(key)
+        self.stats_counters["invalidations"] += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._stale.update(self._flight.keys())
+
+    def stats(self) -> Dict[str, Any]:
+        counters = self.stats_counters
+        served = counters["hits"] + counters["negative_hits"] + counters["coalesced"]
+        lookups = served + counters["misses"]
+        return {
+            **counters,
+            "entries": len(self._entries),
+            "hit_ratio": round(served / lookups, 4) if lookups else 0.0,
+            "db_calls": counters["misses"],
+            "db_calls_saved": served,
+        }
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("SemanticRAG")
+
+
+def product_text(item: Dict) -> str:
+    """Passage the cross-encoder scores a catalog item by."""
+    parts = [item.get("name", ""), item.get("category", ""), item.get("fabric", ""), item.get("description", "")]
+    return ". ".join(part for part in parts if part)
+
+
+def product_key(item: Dict) -> str:
+    return item.get("link") or item.get("name", "")
+
+
+class MicroBatchReranker:
+    """Cross-encoder reranking with request coalescing.
+
+    Pairs from every concurrent caller go through one queue. A collector task
+    takes the first waiting pair, keeps gathering until the batch is full or
+    max_wait_ms has passed, and scores the batch with a single predict() call
+    off the event loop. While a batch is being scored, new pairs keep queueing,
+    so batches grow with load. Scores are cached per (query, product).
+
+    model_loader is called from the worker thread, so the model is only loaded
+    (once, by the loader) when the first batch actually needs it.
+    """
+
+    def __init__(self, model_loader: Callable[[], object], max_batch_size: int = 32, max_wait_ms: float = 10.0, cache_size: int = 20000):
+        self._model_loader = model_loader
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._cache_size = cache_size
+        self._cache_lock = threading.Lock()
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._collector: Optional[asyncio.Task] = None
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self.batches = 0
+        self.pairs_scored = 0
+        self.cache_hits = 0
+
+    # ==== Cache ====
+    def _cached(self, key: Tuple[str, str]) -> Optional[float]:
+        with self._cache_lock:
+            score = self._cache.get(key)
+            if score is not None:
+                self._cache.move_to_end(key)
+            return score
+
+    def _store(self, key: Tuple[str, str], score: float) -> None:
+        with self._cache_lock:
+            self._cache[key] = score
+            self._cache.move_to_end(key)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+
+    # ==== Batching ====
+    def _ensure_collector(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._collector is None or self._collector.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._inflight = {}
+            self._collector = loop.create_task(self._collect())
+        return self._queue
+
+    def _predict(self, pairs: List[List[str]]):
+        return self._model_loader().predict(pairs, batch_size=self.max_batch_size, show_progress_bar=False)
+
+    async def _collect(self) -> None:
+        loop = asyncio.get_running_loop()
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            pairs = [pair for pair, _, _ in batch]
+            try:
+                scores = await asyncio.to_thread(self._predict, pairs)
+            except Exception as e:
+                logger.warning(f"Cross-encoder batch of {len(pairs)} failed: {e}")
+                for _, key, future in batch:
+                    self._inflight.pop(key, None)
+                    if not future.done():
+                        future.set_exception(e)
+                        # Mark retrieved: a caller stops at its first failed pair and never awaits the rest
+                        future.exception()
+                continue
+
+            self.batches += 1
+            self.pairs_scored += len(pairs)
+            for (_, key, future), score in zip(batch, scores):
+                score = float(score)
+                self._store(key, score)
+                self._inflight.pop(key, None)
+                if not future.done():
+                    future.set_result(score)
+
+    async def score(self, query: str, items: List[Dict]) -> List[float]:
+        """Cross-encoder score for each item against query, in item order."""
+        query_key = " ".join(query.lower().split())
+        loop = asyncio.get_running_loop()
+        queue = self._ensure_collector()
+        results: List = []
+        for item in items:
+            key = (query_key, product_key(item))
+            cached = self._cached(key)
+            if cached is not None:
+                self.cache_hits += 1
+                results.append(cached)
+                continue
+            # Identical pairs already queued by any caller share one scoring slot
+            future = self._inflight.get(key)
+            if future is None:
+                future = loop.create_future()
+                self._inflight[key] = future
+                queue.put_nowait(([query, product_text(item)], key, future))
+            results.append(future)
+
+        # Shielded: the future is shared, so a cancelled caller must not cancel it for the others
+        return [await asyncio.shield(entry) if isinstance(entry, asyncio.Future) else entry for entry in results]
+
+    async def rerank(self, query: str, items: List[Dict], top_k: int) -> List[Dict]:
+        """Items sorted by cross-encoder score, each annotated with cross_encoder_score."""
+        scores = await self.score(query, items)
+        ranked = []
+        for item, score in zip(items, scores):
+            item_copy = dict(item)
+            item_copy["cross_encoder_score"] = score
+            ranked.append(item_copy)
+        ranked.sort(key=lambda item: item["cross_encoder_score"], reverse=True)
+        return ranked[:top_k]
+
+    def stats(self) -> Dict:
+        return {
+            "batches": self.batches,
+            "pairs_scored": self.pairs_scored,
+            "avg_batch_size": round(self.pairs_scored / self.batches, 2) if self.batches else 0.0,
+            "cache_hits": self.cache_hits,
+            "cache_size": len(self._cache),
+        }
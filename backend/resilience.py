@@ -0,0 +1,364 @@
+import json
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, TypeVar
+
+logger = logging.getLogger("Resilience")
+
+T = TypeVar("T")
+
+# HTTP statuses worth retrying on the same model; other errors go straight to the fallback model
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+_RETRYABLE_NAMES = {"APIConnectionError", "APITimeoutError", "InternalServerError", "RateLimitError",
+                    "ServiceUnavailable", "DeadlineExceeded", "TooManyRequests", "ResourceExhausted"}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling the provider while its circuit breaker is open"""
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(exc, "code", None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS
+    return type(exc).__name__ in _RETRYABLE_NAMES
+
+
+def is_provider_failure(exc: BaseException) -> bool:
+    """Whether an error says the provider or the transport is unhealthy, and so counts against its breaker
+
+    Client errors (bad request, unknown model) and replies that fail to parse
+    mean the provider answered; they move the call on but never open a breaker.
+    """
+    if is_retryable(exc):
+        return True
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(exc, "code", None)
+    return isinstance(status, int) and status >= 500
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(max_delay, base_delay * 2^attempt)]"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """Closed -> open after failure_threshold consecutive failures -> half-open after recovery_timeout
+
+    While open, allow() is False and calls fail fast. In half-open state a
+    single probe call is let through; its success closes the breaker and its
+    failure opens it again. A probe that ends any other way (cancelled, out of
+    time, or a client error) hands its slot back with release_probe().
+    """
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.recovery_timeout:
+                return False
+            self.state = "half_open"
+            self._probe_in_flight = False
+        if self.state == "half_open":
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+        return True
+
+    def would_allow(self) -> bool:
+        """Whether allow() would let a call through now, without claiming the half-open probe"""
+        if self.state == "open":
+            return time.monotonic() - self.opened_at >= self.recovery_timeout
+        return not (self.state == "half_open" and self._probe_in_flight)
+
+    @property
+    def is_open(self) -> bool:
+        """Whether calls would fail fast right now, without moving to half-open like allow() does"""
+        return self.state == "open" and time.monotonic() - self.opened_at < self.recovery_timeout
+
+    def release_probe(self) -> None:
+        """Give back a claimed half-open probe slot without recording a result"""
+        if self.state == "half_open":
+            self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        self.state = "closed"
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "is_open": self.is_open, "consecutive_failures": self.failures, "times_opened": self.times_opened}
+
+
+class ResilientCaller:
+    """Deadlines, retries, hedging, circuit breaking and model fallback for one provider
+
+    call(fn, model, fallback_model) runs fn(model_name), which must return a
+    fresh awaitable each time. Retryable errors are retried on the same model
+    with jittered exponential backoff. When the model's breaker is open, or
+    its attempts are exhausted or fail with a non-retryable error, the call
+    moves to fallback_model. Everything stays within one overall deadline.
+    With hedging on, an attempt that has not finished by the observed latency
+    quantile gets a duplicate request, and whichever finishes first wins.
+    """
+
+    def __init__(self, name: str, max_attempts: int = 3, base_delay: float = 0.2, max_delay: float = 4.0,
+                 deadline: float = 30.0, attempt_timeout: Optional[float] = None, hedge: bool = False,
+                 hedge_quantile: float = 0.95, min_hedge_delay: float = 1.0, failure_threshold: int = 5,
+                 recovery_timeout: float = 30.0):
+        self.name = name
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.min_hedge_delay = min_hedge_delay
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._latencies: deque = deque(maxlen=200)
+        self.counters = {"calls": 0, "successes": 0, "failures": 0, "retries": 0, "timeouts": 0,
+                         "hedges": 0, "hedge_wins": 0, "fallbacks": 0, "short_circuited": 0}
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        breaker = self.breakers.get(model)
+        if breaker is None:
+            breaker = self.breakers[model] = CircuitBreaker(self.failure_threshold, self.recovery_timeout)
+        return breaker
+
+    def available(self) -> bool:
+        """False when every model's breaker would reject a call right now"""
+        return not self.breakers or any(breaker.would_allow() for breaker in self.breakers.values())
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging: the configured quantile of recent latencies"""
+        if len(self._latencies) < 20:
+            return None
+        ordered = sorted(self._latencies)
+        return max(self.min_hedge_delay, ordered[min(len(ordered) - 1, int(len(ordered) * self.hedge_quantile))])
+
+    async def _attempt(self, fn: Callable[[str], Awaitable[T]], model: str, timeout: float, hedge: bool) -> T:
+        started = time.monotonic()
+        hedge_after = self.hedge_delay() if hedge else None
+        if hedge_after is None or hedge_after >= timeout:
+            result = await asyncio.wait_for(fn(model), timeout)
+            self._latencies.append(time.monotonic() - started)
+            return result
+
+        primary = asyncio.ensure_future(fn(model))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            if not done:
+                self.counters["hedges"] += 1
+                tasks.add(asyncio.ensure_future(fn(model)))
+            error: Optional[BaseException] = None
+            while tasks:
+                remaining = timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                done, tasks = await asyncio.wait(tasks, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise asyncio.TimeoutError()
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.counters["hedge_wins"] += 1
+                        self._latencies.append(time.monotonic() - started)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def call(self, fn: Callable[[str], Awaitable[T]], model: str, fallback_model: Optional[str] = None,
+                   deadline: Optional[float] = None, hedge: Optional[bool] = None) -> T:
+        self.counters["calls"] += 1
+        hedge = self.hedge if hedge is None else hedge
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+        models = [model] + ([fallback_model] if fallback_model and fallback_model != model else [])
+        last_error: Optional[BaseException] = None
+
+        for position, current in enumerate(models):
+            breaker = self.breaker(current)
+            if not breaker.allow():
+                self.counters["short_circuited"] += 1
+                last_error = CircuitOpenError(f"{self.name} circuit open for {current}")
+                continue
+            if position:
+                self.counters["fallbacks"] += 1
+                logger.warning(f"{self.name}: routing to fallback model {current}")
+
+            probing = breaker.state == "half_open"
+            for attempt in range(self.max_attempts):
+                if attempt:
+                    # Our own failures may have opened the breaker; past the recovery window the retry is the probe
+                    if not breaker.allow():
+                        break
+                    probing = breaker.state == "half_open"
+                settled = False
+                try:
+                    remaining = deadline_at - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    timeout = min(remaining, self.attempt_timeout or remaining)
+                    result = await self._attempt(fn, current, timeout, hedge)
+                    breaker.record_success()
+                    settled = True
+                    self.counters["successes"] += 1
+                    return result
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    last_error = e
+                    if isinstance(e, asyncio.TimeoutError):
+                        self.counters["timeouts"] += 1
+                    if is_provider_failure(e):
+                        breaker.record_failure()
+                        settled = True
+                    logger.warning(f"{self.name} call to {current} failed on attempt {attempt + 1}: {e!r}")
+                    if not is_retryable(e) or attempt == self.max_attempts - 1:
+                        break
+                    delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+                    if time.monotonic() + delay >= deadline_at:
+                        break
+                    self.counters["retries"] += 1
+                finally:
+                    # Cancelled, out of time or a client error: the half-open probe slot must not stay claimed
+                    if probing and not settled:
+                        breaker.release_probe()
+                await asyncio.sleep(delay)
+
+            if time.monotonic() >= deadline_at:
+                break
+
+        self.counters["failures"] += 1
+        if last_error is None:
+            last_error = asyncio.TimeoutError(f"{self.name} call exceeded its deadline")
+        raise last_error
+
+    def stats(self) -> Dict[str, Any]:
+        hedge_after = self.hedge_delay()
+        return {**self.counters,
+                "hedge_after_ms": round(hedge_after * 1000, 1) if hedge_after else None,
+                "breakers": {model: breaker.stats() for model, breaker in self.breakers.items()}}
+
+
+# ==== Shared Callers ====
+_callers: Dict[str, ResilientCaller] = {}
+
+
+def get_caller(name: str, **options: Any) -> ResilientCaller:
+    """The process-wide caller for a provider; options apply on first use only"""
+    caller = _callers.get(name)
+    if caller is None:
+        caller = _callers[name] = ResilientCaller(name, **options)
+    return caller
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    return {name: caller.stats() for name, caller in _callers.items()}
+
+
+# ==== Fake Provider ====
+class FakeProviderError(Exception):
+    def __init__(self, status_code: int, message: str = ""):
+        super().__init__(message or f"fake provider error {status_code}")
+        self.status_code = status_code
+
+
+class _FakeStream:
+    def __init__(self, chunks: List[str], delay: float):
+        self._chunks = chunks
+        self._delay = delay
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self._chunks:
+            await asyncio.sleep(self._delay)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=chunk))])
+
+    async def close(self) -> None:
+        pass
+
+
+class FakeProvider:
+    """Local stand-in for an OpenAI-style chat client, for tests and offline runs
+
+    client.chat.completions.create(...) sleeps for a configurable latency and
+    then answers, fails with a status code, or stalls, at configurable rates.
+    Models listed in unknown_models fail with 404 like a mistyped model id,
+    and models in down_models fail with 503.
+    """
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.0, failure_rate: float = 0.0,
+                 failure_status: int = 503, slow_rate: float = 0.0, slow_latency: float = 5.0,
+                 unknown_models: Iterable[str] = (), down_models: Iterable[str] = (),
+                 reply: str = "Thanks for reaching out! How can I help you today?", seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.unknown_models = set(unknown_models)
+        self.down_models = set(down_models)
+        self.reply = reply
+        self.calls: Dict[str, int] = {}
+        self._random = random.Random(seed)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def _content(self, kwargs: Dict[str, Any]) -> str:
+        if (kwargs.get("response_format") or {}).get("type") == "json_object":
+            return json.dumps({"reply": self.reply, "intent": "general", "urgency": "medium", "confidence": 0.5})
+        return self.reply
+
+    async def create(self, model: str, messages: List[Dict[str, Any]], stream: bool = False, **kwargs: Any):
+        self.calls[model] = self.calls.get(model, 0) + 1
+        if model in self.unknown_models:
+            raise FakeProviderError(404, f"The model `{model}` does not exist")
+        delay = self.latency + self._random.uniform(0, self.jitter)
+        if self._random.random() < self.slow_rate:
+            delay = self.slow_latency
+        await asyncio.sleep(delay)
+        if model in self.down_models or self._random.random() < self.failure_rate:
+            raise FakeProviderError(self.failure_status)
+
+        content = self._content(kwargs)
+        if stream:
+            return _FakeStream([content[i:i + 8] for i in range(0, len(content), 8)], self.latency / 10)
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(index=0, finish_reason="stop", logprobs=None,
+                                     message=SimpleNamespace(role="assistant", content=content))],
+        )
@@ -0,0 +1,138 @@
+import re
+import time
+import asyncio
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+
+from .single_flight import SingleFlight
+
+logger = logging.getLogger("SemanticRAG")
+
+_PUNCT_RE = re.compile(r"[^\w\s₹.]")
+
+
+def normalize_query(query: str) -> str:
+    """Cache key for a query: lowercase, punctuation dropped, whitespace collapsed."""
+    return " ".join(_PUNCT_RE.sub(" ", query.lower()).split())
+
+
+class RewriteCache:
+    """Two-tier cache for LLM query rewrites.
+
+    Tier 1 is an in-process LRU with a TTL. Tier 2 is a SQLite table on local
+    disk that survives restarts and is shared by workers on the same host.
+    Concurrent misses for the same normalized query share a single in-flight
+    computation, so a burst of identical queries makes one LLM call.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, max_entries: int = 2048, ttl_seconds: float = 86400.0):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._flight = SingleFlight()
+        self._db_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.stats_counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0, "errors": 0}
+
+    # ==== Disk Tier ====
+    def _db(self) -> Optional[sqlite3.Connection]:
+        if not self.db_path:
+            return None
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS rewrites (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _disk_get(self, key: str) -> Optional[tuple]:
+        try:
+            with self._db_lock:
+                conn = self._db()
+                if conn is None:
+                    return None
+                row = conn.execute("SELECT value, created_at FROM rewrites WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Rewrite cache disk read failed: {e}")
+            return None
+        if row and time.time() - row[1] < self.ttl:
+            return row[0], row[1]
+        return None
+
+    def _disk_put(self, key: str, value: str, created_at: float) -> None:
+        with self._db_lock:
+            conn = self._db()
+            if conn is None:
+                return
+            conn.execute("INSERT OR REPLACE INTO rewrites (key, value, created_at) VALUES (?, ?, ?)",
+                         (key, value, created_at))
+            conn.commit()
+
+    # ==== Memory Tier ====
+    def _memory_get(self, key: str) -> Optional[str]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        value, created_at = entry
+        if time.time() - created_at >= self.ttl:
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return value
+
+    def _memory_put(self, key: str, value: str, created_at: float) -> None:
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    # ==== Lookup ====
+    async def get_or_compute(self, query: str, compute: Callable[[str], Awaitable[Optional[str]]]) -> str:
+        """Cached rewrite for query; compute(query) runs once per key on a miss.
+
+        compute may return None to signal a failed rewrite, which is returned to
+        the caller as the original query but not cached.
+        """
+        key = normalize_query(query)
+        value = self._memory_get(key)
+        if value is not None:
+            self.stats_counters["memory_hits"] += 1
+            return value
+
+        value, shared = await self._flight.do(key, lambda: self._load(key, query, compute))
+        if shared:
+            self.stats_counters["coalesced"] += 1
+        return value
+
+    async def _load(self, key: str, query: str, compute: Callable[[str], Awaitable[Optional[str]]]) -> str:
+        disk_entry = await asyncio.to_thread(self._disk_get, key)
+        if disk_entry is not None:
+            self.stats_counters["disk_hits"] += 1
+            self._memory_put(key, *disk_entry)
+            return disk_entry[0]
+
+        self.stats_counters["misses"] += 1
+        value = await compute(query)
+        if value is None:
+            self.stats_counters["errors"] += 1
+            return query
+
+        created_at = time.time()
+        self._memory_put(key, value, created_at)
+        try:
+            await asyncio.to_thread(self._disk_put, key, value, created_at)
+        except sqlite3.Error as e:
+            logger.warning(f"Rewrite cache disk write failed: {e}")
+        return value
+
+    def stats(self) -> Dict:
+        lookups = sum(self.stats_counters[k] for k in ("memory_hits", "disk_hits", "misses", "coalesced"))
+        hits = lookups - self.stats_counters["misses"]
+        return {**self.stats_counters, "memory_entries": len(self._memory),
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0}
@@ -1,14 +1,22 @@
+import time
+_IMPORT_STARTED = time.perf_counter()
+
 import os
 import logging
 import asyncio
 import json
-import re
-import csv
-from typing import List, Dict, Optional
+import threading
+from typing import List, Dict, Mapping, Optional, Sequence
 from dotenv import load_dotenv
-from sentence_transformers import CrossEncoder
-from fuzzywuzzy import process, fuzz
-import google.generativeai as genai
+from .catalog_cache import CatalogCache
+from .catalog_columns import load_catalog_columns, compare_loaders
+from .catalog_index import CatalogIndex
+from .fuzzy_matcher import BatchFuzzyMatcher
+from .filter_extractor import FilterExtractor
+from .reranker import MicroBatchReranker
+from .dense_index import DenseIndexManager, reciprocal_rank_fusion
+from .rewrite_cache import RewriteCache
+from .resilience import get_caller
 
 # ==== Logging Setup ====
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -16,33 +24,115 @@ logger = logging.getLogger("SemanticRAG")
 
 # ==== Environment Variables ====
 load_dotenv()
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-if not GOOGLE_API_KEY:
-    raise ValueError("GOOGLE_API_KEY not set")
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "BAAI/bge-reranker-base")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+DENSE_RETRIEVAL = os.getenv("DENSE_RETRIEVAL", "1") == "1"
+GEMINI_FALLBACK_MODEL = os.getenv("GEMINI_FALLBACK_MODEL", "gemini-1.5-flash")
+GEMINI_ATTEMPT_TIMEOUT = float(os.getenv("GEMINI_ATTEMPT_TIMEOUT", "10"))
+
+# ==== Lazy Clients ====
+# Gemini and the sentence-transformers models are created on first use (or by
+# start_warmup()), so importing this module stays cheap.
+_model_lock = threading.RLock()
+_genai = None
+_generative_models: Dict[str, object] = {}
+_cross_encoder = None
+
+readiness = {"catalog": False, "cross_encoder": False, "embedder": not DENSE_RETRIEVAL, "generative_model": False}
+startup_stats = {"import_seconds": None, "warmup_seconds": None, "first_query_seconds": None}
+
+def get_genai():
+    global _genai
+    if _genai is None:
+        with _model_lock:
+            if _genai is None:
+                api_key = os.getenv("GOOGLE_API_KEY")
+                if not api_key:
+                    raise ValueError("GOOGLE_API_KEY not set")
+                import google.generativeai as genai
+                genai.configure(api_key=api_key)
+                _genai = genai
+    return _genai
+
+def get_generative_model(model_name: Optional[str] = None):
+    model_name = model_name or os.getenv("MODEL", "gemini-1.5-pro")
+    model = _generative_models.get(model_name)
+    if model is None:
+        with _model_lock:
+            model = _generative_models.get(model_name)
+            if model is None:
+                model = _generative_models[model_name] = get_genai().GenerativeModel(model_name)
+                readiness["generative_model"] = True
+    return model
+
+def get_cross_encoder():
+    global _cross_encoder
+    if _cross_encoder is None:
+        with _model_lock:
+            if _cross_encoder is None:
+                from sentence_transformers import CrossEncoder
+                start = time.perf_counter()
+                _cross_encoder = CrossEncoder(RERANKER_MODEL, device="cpu")
+                readiness["cross_encoder"] = True
+                logger.info(f"Loaded reranker {RERANKER_MODEL} in {time.perf_counter() - start:.2f}s")
+    return _cross_encoder
+
+# ==== Resilient Gemini Calls ====
+# Backoff, circuit breaking and fallback to a lighter model; each attempt is
+# bounded by a request timeout so worker threads are not held by hung calls.
+gemini_caller = get_caller(
+    "gemini",
+    max_attempts=int(os.getenv("GEMINI_MAX_ATTEMPTS", "3")),
+    base_delay=float(os.getenv("GEMINI_BACKOFF_BASE", "0.25")),
+    max_delay=float(os.getenv("GEMINI_BACKOFF_MAX", "4")),
+    deadline=float(os.getenv("GEMINI_CALL_DEADLINE", "20")),
+    attempt_timeout=GEMINI_ATTEMPT_TIMEOUT,
+    failure_threshold=int(os.getenv("GEMINI_BREAKER_THRESHOLD", "5")),
+    recovery_timeout=float(os.getenv("GEMINI_BREAKER_RECOVERY", "30")),
+)
+
+async def generate_text(prompt: str, parse=None):
+    """Gemini completion text, optionally parsed; a parse error moves the call on to the fallback model"""
+    def generate(model_name: str) -> str:
+        # The first call imports and configures the SDK, so the model is resolved in the worker thread too
+        response = get_generative_model(model_name).generate_content(
+            prompt, request_options={"timeout": GEMINI_ATTEMPT_TIMEOUT})
+        return response.text.strip()
+
+    async def attempt(model_name: str):
+        text = await asyncio.to_thread(generate, model_name)
+        return parse(text) if parse else text
+    return await gemini_caller.call(attempt, os.getenv("MODEL", "gemini-1.5-pro"), GEMINI_FALLBACK_MODEL)
+
+def _load_embedder():
+    from sentence_transformers import SentenceTransformer
+    start = time.perf_counter()
+    embedder = SentenceTransformer(EMBEDDING_MODEL, device="cpu")
+    readiness["embedder"] = True
+    logger.info(f"Loaded embedder {EMBEDDING_MODEL} in {time.perf_counter() - start:.2f}s")
+    return embedder
 
-genai.configure(api_key=GOOGLE_API_KEY)
+reranker = MicroBatchReranker(
+    get_cross_encoder,
+    max_batch_size=int(os.getenv("RERANK_BATCH_SIZE", "32")),
+    max_wait_ms=float(os.getenv("RERANK_MAX_WAIT_MS", "10"))
+)
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "20"))
 
-# ==== Clients ====
-cross_encoder = CrossEncoder(os.getenv("RERANKER_MODEL", "BAAI/bge-reranker-base"))
+# Dense retrieval: vectors are stored beside the catalog CSV and built in the background
+dense_indexes = DenseIndexManager(
+    _load_embedder,
+    EMBEDDING_MODEL,
+    dtype=os.getenv("DENSE_DTYPE", "float16")
+)
 
 # ==== Load Catalog from CSV or Default ====
-def load_catalog(csv_path: Optional[str] = None) -> List[Dict]:
+def load_catalog(csv_path: Optional[str] = None) -> Sequence[Mapping]:
     if csv_path and os.path.exists(csv_path):
         try:
-            with open(csv_path, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                catalog = [
-                    {
-                        "name": row.get("name", "").strip(),
-                        "category": row.get("category", "").strip(),
-                        "price": float(row.get("price", 0.0)),
-                        "fabric": row.get("fabric", "").strip(),
-                        "description": row.get("description", "").strip(),
-                        "link": row.get("link", "").strip()
-                    } for row in reader if row.get("name")
-                ]
-                logger.info(f"Loaded {len(catalog)} items from CSV: {csv_path}")
-                return catalog
+            catalog = load_catalog_columns(csv_path)
+            logger.info(f"Loaded {len(catalog)} items from CSV: {csv_path} {catalog.load_stats}")
+            return catalog
         except Exception as e:
             logger.error(f"Failed to load CSV: {e}")
             return []
@@ -55,6 +145,9 @@ def load_catalog(csv_path: Optional[str] = None) -> List[Dict]:
         {"name": "COZY HOODIE", "category": "Hoodie", "price": 3499, "fabric": "fleece", "description": "Comfortable oversized hoodie.", "link": "https://example.com/products/cozy-hoodie"}
     ]"""))
 
+# Snapshots are shared by every query in the process and reloaded only when the source changes
+catalog_cache = CatalogCache(load_catalog)
+
 # ==== Category and Material Configuration ====
 CATEGORY_MAPPING = json.loads(os.getenv("CATEGORY_MAPPING", """{
     "tshirt": "T-Shirt", "t-shirt": "T-Shirt", "tee": "T-Shirt", "tees": "T-Shirt",
@@ -74,58 +167,30 @@ KNOWN_MATERIALS = json.loads(os.getenv("KNOWN_MATERIALS", """[
 
 CLOTHING_KEYWORDS = list(CATEGORY_MAPPING.keys()) + KNOWN_MATERIALS + ['clothing', 'wear', 'outfit', 'style', 'fashion', 'garment', 'apparel']
 
-# ==== Fuzzy Matcher ====
-def fuzzy_match(term: str, choices: List[str], threshold: int = 80) -> Optional[str]:
-    if not choices:
-        return None
-    result, score = process.extractOne(term, choices, scorer=fuzz.token_sort_ratio)
-    return result if score >= threshold else None
+# Query tokens are scored against all three vocabularies at once and memoized per token
+filter_matcher = BatchFuzzyMatcher({
+    "category": list(CATEGORY_MAPPING.keys()),
+    "material": KNOWN_MATERIALS,
+    "clothing": CLOTHING_KEYWORDS
+})
 
 # ==== Extract Filters ====
-async def extract_filters(query: str) -> Dict:
-    query_lower = query.lower()
-    filters = {}
-
-    # Price extraction
-    price_patterns = [
-        r'budget\s*(?:is|:)?\s*₹?(\d+)', r'price\s*(?:is|:)?\s*₹?(\d+)', 
-        r'under\s*₹?(\d+)', r'below\s*₹?(\d+)', r'less than\s*₹?(\d+)', 
-        r'max(?:imum)?\s*₹?(\d+)', r'₹(\d+)', r'rs\.?\s*(\d+)'
-    ]
-    for pattern in price_patterns:
-        if match := re.search(pattern, query_lower):
-            filters['max_price'] = float(match.group(1))
-            break
-
-    # Category extraction
-    for word in query_lower.split():
-        if word in CATEGORY_MAPPING:
-            filters['category'] = CATEGORY_MAPPING[word]
-            break
-        if match := fuzzy_match(word.strip('s'), list(CATEGORY_MAPPING.keys()), threshold=80):
-            filters['category'] = CATEGORY_MAPPING[match]
-            break
-
-    # Material extraction
-    if "jeans" in query_lower or "denim" in query_lower:
-        filters['material'] = "denim"
-    else:
-        for word in query_lower.split():
-            if match := fuzzy_match(word, KNOWN_MATERIALS, threshold=80):
-                filters['material'] = match
-                break
-
-    # Contextual fixes
-    if 'denim' in filters.get('material', '') and ('jacket' in query_lower or 'coat' in query_lower) and not filters.get('category'):
-        filters['category'] = 'Jacket'
-    if 'leather' in filters.get('material', '') and ('jacket' in query_lower or 'coat' in query_lower) and not filters.get('category'):
-        filters['category'] = 'Jacket'
+filter_extractor = FilterExtractor(CATEGORY_MAPPING, filter_matcher)
 
+async def extract_filters(query: str) -> Dict:
+    # Fuzzy scoring is CPU work; off the event loop the "filters" stage deadline can fire
+    filters = await asyncio.to_thread(filter_extractor.extract, query)
     logger.info(f"Extracted filters: {filters}")
     return filters
 
 # ==== Rewrite Query ====
-async def rewrite_query(query: str) -> str:
+rewrite_cache = RewriteCache(
+    db_path=os.getenv("REWRITE_CACHE_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "rewrite_cache.db")),
+    max_entries=int(os.getenv("REWRITE_CACHE_SIZE", "2048")),
+    ttl_seconds=float(os.getenv("REWRITE_CACHE_TTL", "86400"))
+)
+
+async def _rewrite_query_uncached(query: str) -> Optional[str]:
     prompt = f"""
     Rewrite the fashion query to be short and semantically rich, including category, material, and price if mentioned.
     Emphasize 'denim' for 'jeans'. For general queries (e.g., 'clothes'), use 'clothing, new arrivals, fashion items'.
@@ -135,120 +200,257 @@ async def rewrite_query(query: str) -> str:
     - 'clothes' -> 'clothing, new arrivals, fashion items'
     Query: "{query}"
     """
-    for attempt in range(3):
+    try:
+        return await generate_text(prompt)
+    except Exception as e:
+        logger.warning(f"Query rewrite failed: {e!r}")
+        return None
+
+async def rewrite_query(query: str) -> str:
+    # Failed rewrites fall back to the original query and are not cached
+    return await rewrite_cache.get_or_compute(query, _rewrite_query_uncached)
+
+# ==== Catalog Search ====
+def search_catalog(query: str, catalog: List[Dict], filters: Dict, index: Optional[CatalogIndex] = None,
+                   limit: int = 10) -> List[Dict]:
+    # Callers holding a snapshot pass its prebuilt index; otherwise index this catalog on the fly
+    if index is None:
+        index = CatalogIndex(catalog)
+    return index.search(query, filters, limit=limit)
+
+# ==== Hybrid Retrieval ====
+async def retrieve_candidates(query: str, snapshot, filters: Dict, limit: int = RERANK_TOP_N,
+                              dense_query: Optional[str] = None) -> List[Dict]:
+    # Building the index on first use and fuzzy ranking are CPU work; keep them off the event loop
+    index = await asyncio.to_thread(lambda: snapshot.index)
+    lexical = await asyncio.to_thread(index.ranked_positions, query, filters, limit)
+    lexical_scores = {pos: score for score, pos in lexical}
+    ranking = [pos for _, pos in lexical]
+
+    dense = dense_indexes.get(snapshot) if DENSE_RETRIEVAL else None
+    if dense is not None:
         try:
-            model = genai.GenerativeModel(os.getenv("MODEL", "gemini-1.5-pro"))
-            response = await asyncio.to_thread(model.generate_content, prompt)
-            return response.text.strip()
+            query_vector = (await asyncio.to_thread(dense_indexes.encode, [dense_query or query]))[0]
+            dense_hits = await asyncio.to_thread(dense.search, query_vector, limit)
+            dense_ranking = [pos for pos, _ in dense_hits if index.satisfies(pos, filters)]
+            ranking = reciprocal_rank_fusion([ranking, dense_ranking])[:limit]
         except Exception as e:
-            logger.warning(f"Query rewrite failed on attempt {attempt + 1}: {e}")
-            if attempt == 2:
-                return query
+            logger.warning(f"Dense retrieval failed, using lexical results: {e}")
 
-# ==== Catalog Search ====
-def search_catalog(query: str, catalog: List[Dict], filters: Dict) -> List[Dict]:
-    results = []
-    query_lower = query.lower()
-    
-    for item in catalog:
-        score = 0.0
-        if fuzzy_match(query_lower, [item['name'].lower(), item['category'].lower(), item['description'].lower()], threshold=85):
-            score += 0.5
-        if filters.get('category') and item['category'].lower() == filters['category'].lower():
-            score += 0.3
-        if filters.get('material') and fuzzy_match(filters['material'].lower(), [item['fabric'].lower()], threshold=80):
-            score += 0.2
-        if filters.get('max_price'):
-            try:
-                if float(item['price']) <= filters['max_price']:
-                    score += 0.1
-                else:
-                    score *= 0.5
-            except ValueError:
-                score *= 0.8
-        
-        if score > 0:
-            item_copy = item.copy()
-            item_copy['score'] = score
-            results.append(item_copy)
-    
-    return sorted(results, key=lambda x: x['score'], reverse=True)[:10]
+    return [{**snapshot.items[pos], "score": lexical_scores.get(pos, 0.0)} for pos in ranking]
+
+# ==== Cross-Encoder Rerank ====
+async def rerank_results(query: str, candidates: List[Dict], top_k: int = 10) -> List[Dict]:
+    try:
+        return await reranker.rerank(query, candidates, top_k)
+    except Exception as e:
+        # Keep the lexical order rather than failing the query
+        logger.warning(f"Rerank failed, using catalog scores: {e}")
+        return [{**item, "cross_encoder_score": item["score"]} for item in candidates[:top_k]]
 
 # ==== Fallback LLM Recommendations ====
 async def generate_fallback_recommendations(query: str, catalog: List[Dict]) -> List[Dict]:
     prompt = f"""
     Fashion expert with trendy tone. For query "{query}", suggest 3 clothing items for a cohesive outfit.
-    Catalog: {json.dumps(catalog, indent=2)}
+    Catalog: {json.dumps([dict(item) for item in catalog], indent=2)}
     Return JSON: [{{"name": str, "category": str, "description": str, "price": float, "fabric": str, "link": str}}]
     """
-    for attempt in range(3):
+    try:
+        return await generate_text(prompt, lambda text: json.loads(text.replace("```json", "").replace("```", "")))
+    except Exception as e:
+        logger.warning(f"Fallback recommendation failed: {e!r}")
+        return catalog[:3] if catalog else []
+
+# ==== Main Semantic RAG ====
+# Per-stage deadlines in seconds; a stage that misses its deadline degrades instead of failing the query
+STAGE_DEADLINES = {
+    "catalog": float(os.getenv("SEARCH_CATALOG_TIMEOUT", "10")),
+    "filters": float(os.getenv("SEARCH_FILTERS_TIMEOUT", "0.5")),
+    "rewrite": float(os.getenv("SEARCH_REWRITE_TIMEOUT", "1.5")),
+    "retrieve": float(os.getenv("SEARCH_RETRIEVE_TIMEOUT", "2")),
+    "fallback_warmup": float(os.getenv("SEARCH_FALLBACK_WARMUP_TIMEOUT", "2")),
+    "rerank": float(os.getenv("SEARCH_RERANK_TIMEOUT", "1.5")),
+    "fallback": float(os.getenv("SEARCH_FALLBACK_TIMEOUT", "8")),
+}
+
+class _StageRunner:
+    """Runs pipeline stages under deadlines and records timings and degradations."""
+
+    def __init__(self, deadlines: Dict[str, float]):
+        self.deadlines = deadlines
+        self.timings: Dict[str, float] = {}
+        self.degraded: List[str] = []
+
+    async def run(self, name: str, awaitable, fallback=None, shield: bool = False):
+        started = time.perf_counter()
+        task = asyncio.ensure_future(awaitable)
         try:
-            model = genai.GenerativeModel(os.getenv("MODEL", "gemini-1.5-pro"))
-            response = await asyncio.to_thread(model.generate_content, prompt)
-            return json.loads(response.text.strip().replace("```json", "").replace("```", ""))
+            # Shielded stages keep running after the deadline so their result still lands in caches
+            return await asyncio.wait_for(asyncio.shield(task) if shield else task, self.deadlines.get(name))
+        except asyncio.TimeoutError:
+            logger.warning(f"Stage '{name}' missed its {self.deadlines.get(name)}s deadline, degrading")
+            self.degraded.append(name)
+            return fallback
         except Exception as e:
-            logger.warning(f"Fallback recommendation failed on attempt {attempt + 1}: {e}")
-            if attempt == 2:
-                return catalog[:3] if catalog else []
+            logger.warning(f"Stage '{name}' failed, degrading: {e}")
+            self.degraded.append(name)
+            return fallback
+        finally:
+            self.timings[name] = round((time.perf_counter() - started) * 1000, 2)
 
-# ==== Main Semantic RAG ====
-async def semantic_rag(query: str, category: Optional[str] = None, csv_path: Optional[str] = None) -> List[Dict]:
+def _format_result(item: Dict, cross_encoder_score: Optional[float] = None) -> Dict:
+    result = {
+        "style_name": item["name"],
+        "category": item["category"],
+        "price": item["price"],
+        "fabric": item["fabric"],
+        "description": item["description"],
+        "product_link": item["link"],
+    }
+    if "score" in item:
+        result["catalog_score"] = item["score"]
+    result["cross_encoder_score"] = item.get("cross_encoder_score", cross_encoder_score)
+    return result
+
+async def run_search(query: str, category: Optional[str] = None, csv_path: Optional[str] = None,
+                     deadlines: Optional[Dict[str, float]] = None) -> Dict:
+    """Full retrieval pipeline with independent stages run concurrently.
+
+    Filter extraction, query rewrite and the catalog snapshot load run
+    together; catalog retrieval runs alongside warming the Gemini model used by
+    the LLM fallback. Each stage has a deadline, and a slow rewrite or rerank
+    degrades to the lexical path rather than holding the response.
+    """
+    started = time.perf_counter()
+    stages = _StageRunner({**STAGE_DEADLINES, **(deadlines or {})})
     logger.info(f"Starting RAG for query: '{query}', Category: {category}, CSV: {csv_path}")
-    catalog = load_catalog(csv_path)
-    filters = await extract_filters(query)
+
+    snapshot, filters, rewritten = await asyncio.gather(
+        stages.run("catalog", asyncio.to_thread(catalog_cache.get, csv_path)),
+        stages.run("filters", extract_filters(query), fallback={}),
+        stages.run("rewrite", rewrite_query(query), fallback=query, shield=True),
+    )
+    filters = dict(filters)
     if category:
         filters['category'] = category
+    catalog = snapshot.items if snapshot is not None else []
+    if snapshot is not None:
+        readiness["catalog"] = True
+
+    response = {"query": query, "rewritten_query": rewritten, "filters": filters}
 
     # Check if fashion query
     is_fashion_query = bool(filters.get('category') or filters.get('material') or filters.get('max_price')) or \
-                       any(fuzzy_match(word, CLOTHING_KEYWORDS, 75) for word in query.lower().split())
-    
+                       any(filter_matcher.match(word, "clothing", 75) for word in query.lower().split())
+
     if not is_fashion_query:
         logger.info("Non-fashion query detected, using LLM fallback.")
-        return [{"response": "This query doesn't seem fashion-related. Try asking about clothing, like 'denim jeans' or 'casual shirts'.", "intent": "general"}]
-
-    if catalog:
-        # Use catalog search if available
-        results = search_catalog(query, catalog, filters)
-        if results:
-            logger.info(f"Found {len(results)} catalog matches")
-            return [{
-                "style_name": item["name"],
-                "category": item["category"],
-                "price": item["price"],
-                "fabric": item["fabric"],
-                "description": item["description"],
-                "product_link": item["link"],
-                "cross_encoder_score": item["score"]
-            } for item in results]
-    
-    # Fallback to LLM if no catalog or no matches
-    logger.info("No catalog or matches, using LLM fallback")
-    results = await generate_fallback_recommendations(query, catalog)
-    return [{
-        "style_name": item["name"],
-        "category": item["category"],
-        "price": item["price"],
-        "fabric": item["fabric"],
-        "description": item["description"],
-        "product_link": item["link"],
-        "cross_encoder_score": 1.0
-    } for item in results]
+        results = [{"response": "This query doesn't seem fashion-related. Try asking about clothing, like 'denim jeans' or 'casual shirts'.", "intent": "general"}]
+    else:
+        candidates = []
+        if catalog:
+            candidates, _ = await asyncio.gather(
+                stages.run("retrieve", retrieve_candidates(query, snapshot, filters, dense_query=rewritten), fallback=[]),
+                stages.run("fallback_warmup", asyncio.to_thread(get_generative_model), shield=True),
+            )
+
+        if candidates:
+            logger.info(f"Found {len(candidates)} catalog matches, reranking")
+            lexical = [{**item, "cross_encoder_score": item["score"]} for item in candidates[:10]]
+            ranked = await stages.run("rerank", rerank_results(rewritten, candidates), fallback=lexical, shield=True)
+            results = [_format_result(item) for item in ranked]
+        else:
+            # Fallback to LLM if no catalog or no matches
+            logger.info("No catalog or matches, using LLM fallback")
+            fallback_items = await stages.run("fallback", generate_fallback_recommendations(query, catalog),
+                                              fallback=catalog[:3] if catalog else [])
+            results = [_format_result(item, 1.0) for item in fallback_items]
+
+    total = time.perf_counter() - started
+    if startup_stats["first_query_seconds"] is None:
+        startup_stats["first_query_seconds"] = round(total, 4)
+        logger.info(f"First query served in {startup_stats['first_query_seconds']}s")
+    response.update({
+        "results": results,
+        "timings_ms": {**stages.timings, "total": round(total * 1000, 2)},
+        "degraded": stages.degraded,
+    })
+    return response
+
+async def semantic_rag(query: str, category: Optional[str] = None, csv_path: Optional[str] = None) -> List[Dict]:
+    return (await run_search(query, category, csv_path))["results"]
+
+# ==== Warm-up ====
+def _warm_up(csv_path: Optional[str]) -> None:
+    started = time.perf_counter()
+
+    def warm_catalog():
+        catalog_cache.get(csv_path).index
+        readiness["catalog"] = True
+
+    def warm_embedder():
+        if DENSE_RETRIEVAL:
+            dense_indexes.encoder
+            # Kicks off the background dense index build for this snapshot
+            dense_indexes.get(catalog_cache.get(csv_path))
+
+    steps = [
+        ("catalog", warm_catalog),
+        ("cross_encoder", lambda: get_cross_encoder().predict([["warm up", "warm up"]], show_progress_bar=False)),
+        ("embedder", warm_embedder),
+        ("generative_model", get_generative_model),
+    ]
+    for name, step in steps:
+        try:
+            step()
+        except Exception as e:
+            logger.warning(f"Warm-up step '{name}' failed: {e}")
+    startup_stats["warmup_seconds"] = round(time.perf_counter() - started, 4)
+    logger.info(f"Warm-up finished in {startup_stats['warmup_seconds']}s, readiness: {readiness}")
+
+def start_warmup(csv_path: Optional[str] = None) -> threading.Thread:
+    """Load models, catalog and indexes in a background thread; see readiness / is_ready()."""
+    thread = threading.Thread(target=_warm_up, args=(csv_path,), name="semantic-rag-warmup", daemon=True)
+    thread.start()
+    return thread
+
+def is_ready() -> bool:
+    return all(readiness.values())
 
 # ==== CLI Test ====
 async def main():
     import argparse
     parser = argparse.ArgumentParser(description="Run Semantic RAG")
-    parser.add_argument("query", type=str, nargs='+', help="Fashion query")
+    parser.add_argument("query", type=str, nargs='*', help="Fashion query")
     parser.add_argument("--csv", type=str, help="Path to CSV catalog")
+    parser.add_argument("--compare-loaders", action="store_true", help="Report load time and peak memory of the dict vs columnar CSV loaders")
+    parser.add_argument("--verify-filters", action="store_true", help="Check extract_filters against the golden query set")
     args = parser.parse_args()
     query = " ".join(args.query)
+
+    if args.verify_filters:
+        mismatches = filter_extractor.verify_golden()
+        print(json.dumps(mismatches, indent=2) if mismatches else "Filter extraction matches the golden set")
+        if not query:
+            return
+    if not query:
+        parser.error("a query is required")
+
+    if args.compare_loaders and args.csv:
+        print(json.dumps(compare_loaders(args.csv), indent=2))
     
     print(f"\n--- RAG Query: '{query}' ---\n")
     results = await semantic_rag(query, csv_path=args.csv)
     print("\n--- Results ---")
     print(json.dumps(results, indent=2))
+    print("\n--- Catalog Snapshots ---")
+    print(json.dumps(catalog_cache.stats(), indent=2))
+    print(json.dumps(dense_indexes.stats(), indent=2))
+    print(json.dumps({"rewrite_cache": rewrite_cache.stats()}, indent=2))
+    print(json.dumps({"startup": startup_stats, "readiness": readiness}, indent=2))
     print("\n--------------------------\n")
 
+startup_stats["import_seconds"] = round(time.perf_counter() - _IMPORT_STARTED, 4)
+
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,58 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, KeysView, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Handed to waiters when the caller running a load is cancelled
+_RETRY = object()
+
+
+class SingleFlight:
+    """Concurrent calls for one key share a single in-flight load
+
+    do(key, load) runs load() unless a load for key is already running, in
+    which case it waits for that load's result or exception instead. Waiters
+    await through asyncio.shield, so a cancelled waiter leaves the load and
+    the other waiters alone; if the caller running the load is cancelled,
+    the first waiter to wake up runs load itself.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    def keys(self) -> KeysView:
+        return self._inflight.keys()
+
+    async def do(self, key: Hashable, load: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """load()'s result for key, and whether it came from another caller's load"""
+        while True:
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            value: Any = await asyncio.shield(inflight)
+            if value is not _RETRY:
+                return value, True
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await load()
+            future.set_result(value)
+            return value, False
+        except asyncio.CancelledError:
+            # Not future.cancel(): that would cancel every waiter along with this caller
+            future.set_result(_RETRY)
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so a failure nobody else waited on isn't logged as unhandled
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
@@ -0,0 +1,6 @@
+-- Store user emails lowercased and trimmed, so profile lookups filter with
+-- email=eq.<normalized address> and use the ordinary users.email index
+update users set email = lower(trim(email)) where email <> lower(trim(email));
+
+alter table users
+    add constraint users_email_normalized check (email = lower(trim(email)));
@@ -0,0 +1,81 @@
+import random
+
+from backend.catalog_index import CatalogIndex
+from backend.fuzzy_matcher import fuzzy_match
+
+CATALOG = [
+    {"name": "Hoodie", "category": "Tops", "description": "Warm fleece hoodie", "fabric": "Cotton", "price": "45"},
+    {"name": "Slim Jeans", "category": "Bottoms", "description": "Dark wash denim", "fabric": "Denim", "price": "60"},
+    {"name": "Linen Shirt", "category": "Tops", "description": "Breathable summer shirt", "fabric": "Linen",
+     "price": "35"},
+    {"name": "Rain Jacket", "category": "Outerwear", "description": "Waterproof shell", "fabric": "Nylon",
+     "price": "n/a"},
+    {"name": "Wool Scarf", "category": "Accessories", "description": "Soft merino scarf", "fabric": "Wool",
+     "price": "20"},
+]
+
+
+def _linear_search(query, catalog, filters, limit=10):
+    """The scan search_catalog ran before the index existed"""
+    results = []
+    query_lower = query.lower()
+    for pos, item in enumerate(catalog):
+        score = 0.0
+        if fuzzy_match(query_lower, [item["name"].lower(), item["category"].lower(), item["description"].lower()],
+                       threshold=85):
+            score += 0.5
+        if filters.get("category") and item["category"].lower() == filters["category"].lower():
+            score += 0.3
+        if filters.get("material") and fuzzy_match(filters["material"].lower(), [item["fabric"].lower()],
+                                                   threshold=80):
+            score += 0.2
+        if filters.get("max_price"):
+            try:
+                if float(item["price"]) <= filters["max_price"]:
+                    score += 0.1
+                else:
+                    score *= 0.5
+            except ValueError:
+                score *= 0.8
+        if score > 0:
+            results.append((score, pos))
+    return sorted(results, key=lambda entry: (-entry[0], entry[1]))[:limit]
+
+
+def test_typo_still_matches_text():
+    index = CatalogIndex(CATALOG)
+    assert [item["name"] for item in index.search("hodie", {})] == ["Hoodie"]
+    assert [item["name"] for item in index.search("lnen shirt", {})] == ["Linen Shirt"]
+
+
+def test_filters_score_and_order():
+    index = CatalogIndex(CATALOG)
+    results = index.search("linen shirt", {"category": "tops", "max_price": 40})
+    assert [(item["name"], item["score"]) for item in results] == [
+        ("Linen Shirt", 0.9), ("Hoodie", 0.15), ("Wool Scarf", 0.1)
+    ]
+    assert index.satisfies(0, {"category": "Tops", "max_price": 50})
+    assert not index.satisfies(3, {"max_price": 100})
+
+
+def test_matches_the_linear_scan():
+    rng = random.Random(7)
+    words = ["hoodie", "jeans", "linen", "shirt", "jacket", "rain", "scarf", "wool", "denim", "warm",
+             "soft", "summer", "slim", "dark", "shell", "fleece", "tee", "cap"]
+    catalog = []
+    for i in range(300):
+        name = " ".join(rng.choice(words) for _ in range(rng.randint(1, 3)))
+        catalog.append({"name": name.title(), "category": rng.choice(["Tops", "Bottoms", "Outerwear"]),
+                        "description": " ".join(rng.choice(words) for _ in range(rng.randint(1, 6))),
+                        "fabric": rng.choice(["Cotton", "Wool", "Denim"]), "price": str(rng.randint(5, 120))})
+    index = CatalogIndex(catalog)
+
+    def typo(word):
+        i = rng.randrange(len(word))
+        return word[:i] + word[i + 1:]
+
+    queries = words + [typo(word) for word in words] + [f"{rng.choice(words)} {typo(rng.choice(words))}"
+                                                          for _ in range(30)]
+    for query in queries:
+        for filters in ({}, {"category": "tops"}, {"material": "woll", "max_price": 50}):
+            assert index.ranked_positions(query, filters) == _linear_search(query, catalog, filters), (query, filters)
@@ -0,0 +1,220 @@
+import asyncio
+import errno
+import fcntl
+import json
+import os
+import time
+
+import pytest
+
+from backend import conversation_log as conversation_log_module
+from backend.conversation_log import ConversationLog, conversation_row
+from backend.data_access import DataAccessError
+
+
+class _Database:
+    """Records insert batches; can fail transiently, or reject rows whose content starts with "bad" """
+
+    def __init__(self, down=False):
+        self.down = down
+        self.batches = []
+
+    async def insert_conversations(self, rows):
+        if self.down:
+            raise DataAccessError("insert failed: connection refused")
+        if any(row["content"].startswith("bad") for row in rows):
+            raise DataAccessError("insert failed: 400", 400)
+        self.batches.append([row["content"] for row in rows])
+
+
+def _rows(log, contents):
+    for content in contents:
+        assert log.append(conversation_row("MESSAGE", "c1", "web_chat", content))
+
+
+def _spooled(spool_dir):
+    rows = []
+    for name in sorted(os.listdir(spool_dir)):
+        if name.startswith("conversations-"):
+            with open(os.path.join(spool_dir, name), encoding="utf-8") as f:
+                rows += [json.loads(line)["content"] for line in f]
+    return rows
+
+
+def test_rows_are_written_in_batches(tmp_path):
+    db = _Database()
+
+    async def scenario():
+        log = ConversationLog(db, str(tmp_path), batch_size=10, flush_interval=0.01)
+        log.start()
+        _rows(log, [f"m{i}" for i in range(25)])
+        await asyncio.sleep(0.1)
+        await log.stop()
+        return log.stats()
+
+    stats = asyncio.run(scenario())
+    assert [content for batch in db.batches for content in batch] == [f"m{i}" for i in range(25)]
+    assert len(db.batches) <= 3
+    assert stats["flushed"] == 25 and stats["pending"] == 0
+    assert _spooled(tmp_path) == []
+
+
+def test_compaction_replaces_the_spool_and_keeps_it_locked(tmp_path, monkeypatch):
+    monkeypatch.setattr(conversation_log_module, "COMPACT_AFTER_BYTES", 1)
+    db = _Database()
+
+    async def scenario():
+        log = ConversationLog(db, str(tmp_path), batch_size=5, flush_interval=0.01)
+        log.start()
+        path = log._spool_path
+        inode = os.stat(path).st_ino
+        _rows(log, [f"m{i}" for i in range(5)])
+        await asyncio.sleep(0.1)
+        db.down = True
+        _rows(log, ["kept"])
+        await asyncio.sleep(0.05)
+
+        assert os.stat(path).st_ino != inode
+        assert _spooled(tmp_path) == ["kept"]
+        assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+        # Another worker cannot adopt the live spool
+        with open(path, "r+") as other:
+            with pytest.raises(BlockingIOError):
+                fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        await log.stop()
+
+    asyncio.run(scenario())
+
+
+def test_spool_is_not_rewritten_below_the_compaction_threshold(tmp_path):
+    db = _Database()
+
+    async def scenario():
+        log = ConversationLog(db, str(tmp_path), batch_size=5, flush_interval=0.01)
+        log.start()
+        inode = os.stat(log._spool_path).st_ino
+        for i in range(3):
+            _rows(log, [f"m{i}"])
+            await asyncio.sleep(0.05)
+        # The queue emptied three times without a compaction
+        assert os.stat(log._spool_path).st_ino == inode
+        assert log.stats()["compactions"] == 0
+        await log.stop()
+
+    asyncio.run(scenario())
+    # A clean stop cuts the committed rows
+    assert _spooled(tmp_path) == []
+
+
+def test_rows_appended_during_compaction_are_kept(tmp_path, monkeypatch):
+    monkeypatch.setattr(conversation_log_module, "COMPACT_AFTER_BYTES", 1)
+    db = _Database()
+    replace_spool = ConversationLog._replace_spool
+
+    def slow_replace(self, compacted, tmp_path):
+        time.sleep(0.1)
+        replace_spool(self, compacted, tmp_path)
+
+    monkeypatch.setattr(ConversationLog, "_replace_spool", slow_replace)
+
+    async def scenario():
+        log = ConversationLog(db, str(tmp_path), batch_size=1, flush_interval=0.01)
+        log.start()
+        _rows(log, ["first"])
+        await asyncio.sleep(0.05)
+        # The writer is inside the slow rename; the event loop still takes new rows
+        db.down = True
+        _rows(log, ["during"])
+        await asyncio.sleep(0.15)
+        assert log.stats()["compactions"] == 1
+        assert _spooled(tmp_path) == ["during"]
+        await log.stop()
+
+    asyncio.run(scenario())
+    assert _spooled(tmp_path) == ["during"]
+
+
+def test_writer_survives_os_errors(tmp_path, monkeypatch):
+    db = _Database()
+    dead_letter = ConversationLog._dead_letter
+    failures = []
+
+    def full_disk(self, row, error):
+        if not failures:
+            failures.append(row)
+            raise OSError(errno.ENOSPC, "No space left on device")
+        dead_letter(self, row, error)
+
+    monkeypatch.setattr(ConversationLog, "_dead_letter", full_disk)
+
+    async def scenario():
+        log = ConversationLog(db, str(tmp_path), batch_size=2, flush_interval=0.01)
+        log.start()
+        _rows(log, ["bad row", "a"])
+        await asyncio.sleep(1.0)
+        assert not log._task.done()
+        _rows(log, ["b"])
+        await asyncio.sleep(0.1)
+        await log.stop()
+        return log.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["writer_errors"] == 1
+    assert stats["dead_lettered"] == 1
+    assert [content for batch in db.batches for content in batch][-2:] == ["a", "b"]
+
+
+def test_unflushed_rows_survive_a_restart(tmp_path):
+    db = _Database(down=True)
+
+    async def scenario():
+        log = ConversationLog(db, str(tmp_path), batch_size=10, flush_interval=0.01)
+        log.start()
+        _rows(log, ["a", "b", "c"])
+        await asyncio.sleep(0.05)
+        await log.stop()
+        assert _spooled(tmp_path) == ["a", "b", "c"]
+
+        db.down = False
+        restarted = ConversationLog(db, str(tmp_path), batch_size=10, flush_interval=0.01)
+        restarted.start()
+        await asyncio.sleep(0.1)
+        await restarted.stop()
+        return restarted.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["recovered"] == 3
+    assert db.batches == [["a", "b", "c"]]
+    assert _spooled(tmp_path) == []
+
+
+def test_rejected_rows_go_to_the_dead_letter_file(tmp_path):
+    db = _Database()
+
+    async def scenario():
+        log = ConversationLog(db, str(tmp_path), batch_size=3, flush_interval=0.01)
+        log.start()
+        _rows(log, ["a", "bad row", "c"])
+        await asyncio.sleep(0.1)
+        await log.stop()
+        return log.stats()
+
+    stats = asyncio.run(scenario())
+    assert db.batches == [["a"], ["c"]]
+    assert stats["dead_lettered"] == 1
+    with open(tmp_path / "dead-letter.jsonl", encoding="utf-8") as f:
+        assert json.loads(f.readline())["row"]["content"] == "bad row"
+
+
+def test_rows_are_dropped_beyond_max_pending(tmp_path):
+    async def scenario():
+        log = ConversationLog(_Database(down=True), str(tmp_path), max_pending=2, backpressure_at=1)
+        assert not log.append(conversation_row("MESSAGE", None, "web_chat", "not started"))
+        log.start()
+        results = [log.append(conversation_row("MESSAGE", None, "web_chat", str(i))) for i in range(3)]
+        await log.stop()
+        return results, log.stats()
+
+    results, stats = asyncio.run(scenario())
+    assert results == [True, True, False]
+    assert stats["dropped"] == 2
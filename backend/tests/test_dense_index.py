@@ -0,0 +1,73 @@
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from backend.dense_index import DenseCatalogIndex, DenseIndexManager
+from backend.reranker import product_text
+
+
+def _items(names):
+    return [{"name": name, "category": "Tops", "description": f"{name} description", "fabric": "Cotton"}
+            for name in names]
+
+
+class _Encoder:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.texts = []
+
+    def encode(self, texts, **kwargs):
+        time.sleep(self.delay)
+        self.texts.extend(texts)
+        vectors = np.zeros((len(texts), 64), dtype=np.float32)
+        for row, text in enumerate(texts):
+            vectors[row, sum(map(ord, text)) % 64] = 1.0
+        return vectors
+
+
+def _wait_for(manager, snapshot, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        index = manager.get(snapshot)
+        if index is not None:
+            return index
+        time.sleep(0.01)
+    raise AssertionError("dense index was not built")
+
+
+def test_rebuild_reuses_unchanged_rows(tmp_path):
+    store = str(tmp_path / "catalog.csv.emb")
+    encoder = _Encoder()
+    first = DenseCatalogIndex(_items(["a", "b"]), encoder.encode, "model", store)
+    second = DenseCatalogIndex(_items(["a", "b", "c"]), encoder.encode, "model", store)
+    assert (first.embedded, second.reused, second.embedded) == (2, 2, 1)
+    items = _items(["a", "b", "c"])
+    assert second.search(encoder.encode([product_text(items[2])])[0], 1)[0][0] == 2
+    assert sorted(os.listdir(tmp_path)) == ["catalog.csv.emb.json", "catalog.csv.emb.lock", "catalog.csv.emb.npy"]
+
+
+def test_builds_for_one_source_are_serialized_and_superseded_builds_skipped(tmp_path):
+    encoder = _Encoder(delay=0.05)
+    factory_calls = []
+
+    def factory():
+        factory_calls.append(threading.get_ident())
+        time.sleep(0.02)
+        return encoder
+
+    manager = DenseIndexManager(factory, "model")
+    source = str(tmp_path / "catalog.csv")
+    snapshots = [SimpleNamespace(source=source, items=_items([f"item {i}", "shared"])) for i in range(3)]
+    for snapshot in snapshots:
+        assert manager.get(snapshot) is None
+    index = _wait_for(manager, snapshots[-1])
+
+    assert len(factory_calls) == 1
+    assert index.items is snapshots[-1].items
+    assert not [name for name in os.listdir(tmp_path) if ".tmp" in name]
+    # The stored matrix and manifest belong to the same build
+    reloaded = DenseCatalogIndex(snapshots[-1].items, encoder.encode, "model", source + ".emb")
+    assert reloaded.embedded == 0
@@ -0,0 +1,19 @@
+from backend.filter_extractor import KeywordAutomaton
+from backend.semantic_rag import filter_extractor
+
+
+def test_matches_the_recorded_outputs_of_the_original_extractor():
+    assert filter_extractor.verify_golden() == []
+
+
+def test_extract_returns_copies_of_memoized_filters():
+    first = filter_extractor.extract("Denim Jacket under 3000")
+    first["category"] = "changed"
+    assert filter_extractor.extract("denim jacket under 3000") == {
+        "max_price": 3000.0, "material": "denim", "category": "Jacket"
+    }
+
+
+def test_keyword_automaton_finds_overlapping_keywords():
+    automaton = KeywordAutomaton(["he", "she", "hers", "his"])
+    assert sorted(automaton.find_all("ushers")) == [(1, "she"), (2, "he"), (2, "hers")]
@@ -0,0 +1,36 @@
+from backend import fuzzy_matcher
+from backend.fuzzy_matcher import BatchFuzzyMatcher, fuzzy_match
+
+CATEGORIES = ["shirt", "t-shirt", "jeans", "jacket", "hoodie", "dress", "kurta"]
+MATERIALS = ["cotton", "denim", "linen", "wool", "silk", "leather"]
+TOKENS = ["shirts", "jens", "jaket", "hodie", "cottn", "dnim", "silky", "tshirt", "T-Shirt", "xyz", "", "kurtas"]
+
+
+def test_batched_scores_agree_with_fuzzy_match():
+    matcher = BatchFuzzyMatcher({"category": CATEGORIES, "material": MATERIALS})
+    matcher.prime(TOKENS)
+    for token in TOKENS:
+        for vocabulary, choices in (("category", CATEGORIES), ("material", MATERIALS)):
+            for threshold in (60, 80, 90):
+                expected = fuzzy_match(token, choices, threshold) if token else None
+                assert matcher.match(token, vocabulary, threshold) == expected, (token, vocabulary, threshold)
+
+
+def test_fuzzywuzzy_fallback_agrees(monkeypatch):
+    monkeypatch.setattr(fuzzy_matcher, "rf_process", None)
+    matcher = BatchFuzzyMatcher({"category": CATEGORIES})
+    for token in TOKENS:
+        if token:
+            assert matcher.match(token, "category", 80) == fuzzy_match(token, CATEGORIES, 80)
+    assert matcher.stats()["backend"] == "fuzzywuzzy"
+
+
+def test_results_are_memoized_per_token_with_lru_eviction():
+    matcher = BatchFuzzyMatcher({"category": CATEGORIES}, cache_size=2)
+    matcher.best("jens", "category")
+    matcher.best("jens", "category")
+    assert (matcher.hits, matcher.misses) == (1, 1)
+    matcher.prime(["jaket", "hodie"])
+    assert matcher.stats()["cached_tokens"] == 2
+    matcher.best("jens", "category")
+    assert matcher.misses == 2
@@ -0,0 +1,72 @@
+import asyncio
+
+from backend.health import DependencyProber
+
+
+async def _ok():
+    return {"rows": 1}
+
+
+async def _down():
+    raise RuntimeError("connection refused")
+
+
+async def _hangs():
+    await asyncio.sleep(10)
+
+
+def test_not_ready_until_checked():
+    prober = DependencyProber()
+    prober.register("database", _ok)
+    ready, checks = prober.report()
+    assert not ready
+    assert checks["database"]["error"] == "not checked yet"
+
+
+def test_required_failures_block_readiness_optional_ones_do_not():
+    prober = DependencyProber(timeout=0.05)
+    prober.register("database", _ok)
+    prober.register("snapshot", _down, required=False)
+    asyncio.run(prober.probe_once())
+    ready, checks = prober.report()
+    assert ready
+    assert checks["database"]["detail"] == {"rows": 1}
+    assert checks["snapshot"] == {**checks["snapshot"], "ok": False, "error": "connection refused"}
+
+    prober.register("llm", _hangs)
+    asyncio.run(prober.probe_once())
+    ready, checks = prober.report()
+    assert not ready
+    assert checks["llm"]["error"] == "timed out after 0.05s"
+
+
+def test_report_never_runs_checks_and_flags_stale_results():
+    calls = []
+
+    async def counted():
+        calls.append(1)
+
+    prober = DependencyProber(interval=0.01, timeout=0.01)
+    prober.register("database", counted)
+    asyncio.run(prober.probe_once())
+    for _ in range(100):
+        assert prober.report()[0]
+    assert len(calls) == 1
+
+    prober.results["database"]["checked_at"] -= 1
+    ready, checks = prober.report()
+    assert not ready
+    assert checks["database"]["error"] == "result is stale"
+
+
+def test_background_probing():
+    prober = DependencyProber(interval=0.01)
+    prober.register("database", _ok)
+
+    async def scenario():
+        prober.start()
+        await asyncio.sleep(0.05)
+        await prober.stop()
+
+    asyncio.run(scenario())
+    assert prober.report()[0]
@@ -0,0 +1,129 @@
+import json
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from backend.agents import intent_classifier
+from backend.agents.intent_classifier import INTENTS, IntentClassifier, redact
+from backend.agents.intent_model import LocalIntentModel
+
+
+def test_redact_replaces_emails_and_phone_numbers():
+    message = "I'm ann.lee+shop@example.co.uk, call +91 98765-43210 or (555) 123 4567 about 2 shirts"
+    assert redact(message) == "I'm <email>, call <phone> or <phone> about 2 shirts"
+
+
+def test_shipped_model_matches_the_intents():
+    model = LocalIntentModel.load(intent_classifier.INTENT_MODEL_PATH)
+    assert model.labels == list(INTENTS)
+    assert model.trained_on > 0
+
+
+def test_label_log_is_off_by_default_and_redacted_when_on(tmp_path, monkeypatch):
+    log = tmp_path / "labels.jsonl"
+    monkeypatch.setattr(intent_classifier, "INTENT_LABEL_LOG", str(log))
+    classifier = IntentClassifier("test-key")
+    classifier._log_label("where is order for ann@example.com", "order_tracking", 0.95)
+    assert not log.exists()
+
+    monkeypatch.setattr(intent_classifier, "LABEL_LOGGING", True)
+    classifier._log_label("where is order for ann@example.com", "order_tracking", 0.95)
+    assert json.loads(log.read_text()) == {"message": "where is order for <email>", "intent": "order_tracking",
+                                           "confidence": 0.95}
+
+
+class _ScriptedClient:
+    """OpenAI-shaped client answering from a list of canned replies (the last one repeats)"""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, model, messages, **kwargs):
+        self.requests.append(messages[-1]["content"])
+        content = self.replies.pop(0) if len(self.replies) > 1 else self.replies[0]
+        return SimpleNamespace(model=model, choices=[SimpleNamespace(
+            logprobs=None, message=SimpleNamespace(content=content))])
+
+
+def _classifier(replies):
+    classifier = IntentClassifier("test-key")
+    classifier.client = _ScriptedClient(replies)
+    return classifier
+
+
+# Long enough to skip the keyword rules, vague enough to stay under the local threshold
+VAGUE = "I had a question about something on your site yesterday evening"
+
+
+def test_unknown_label_falls_back_to_the_local_answer():
+    classifier = _classifier(["banana"])
+    result = asyncio.run(classifier.classify_intent(VAGUE))
+    assert result["tier"] in ("local", "rules")
+    assert "unknown intent" in result["error"]
+
+
+def test_unknown_label_is_retried_in_single_and_packed_requests():
+    async def collect(classifier, messages, pack_size):
+        return [item async for item in classifier.iter_classify(messages, pack_size=pack_size, max_retries=1)]
+
+    single = _classifier(["banana", "complaint"])
+    results = asyncio.run(collect(single, [VAGUE], pack_size=1))
+    assert [(r["intent"], r["tier"]) for r in results] == [("complaint", "llm")]
+    assert len(single.client.requests) == 2
+
+    packed = _classifier([
+        json.dumps({"results": [{"i": 0, "intent": "banana"}, {"i": 1, "intent": "complaint"}]}),
+        "product_inquiry",
+    ])
+    results = asyncio.run(collect(packed, [VAGUE, VAGUE + "!"], pack_size=2))
+    assert sorted((r["index"], r["intent"]) for r in results) == [(0, "product_inquiry"), (1, "complaint")]
+    assert packed.batch_counts["retried_items"] == 1
+
+
+def test_failing_input_propagates_and_cancels_groups():
+    classifier = _classifier(["complaint"])
+    started = []
+
+    async def slow_create(model, messages, **kwargs):
+        started.append(model)
+        await asyncio.sleep(10)
+
+    classifier.client.chat.completions.create = slow_create
+
+    async def messages():
+        yield VAGUE
+        await asyncio.sleep(0.01)
+        raise RuntimeError("cursor lost")
+
+    async def scenario():
+        with pytest.raises(RuntimeError, match="cursor lost"):
+            async for _ in classifier.iter_classify(messages(), pack_size=1):
+                pass
+        await asyncio.sleep(0.01)
+        return [task for task in asyncio.all_tasks() if task is not asyncio.current_task() and not task.done()]
+
+    assert asyncio.run(scenario()) == []
+    assert started
+
+
+def test_slow_consumer_holds_back_the_input():
+    classifier = _classifier(["complaint"])
+    read = []
+
+    def messages():
+        for i in range(1000):
+            read.append(i)
+            yield "hello"
+
+    async def scenario():
+        stream = classifier.iter_classify(messages(), concurrency=2, pack_size=4)
+        first = await stream.__anext__()
+        await asyncio.sleep(0.05)
+        await stream.aclose()
+        return first
+
+    assert asyncio.run(scenario())["intent"] == "greeting"
+    assert len(read) <= 2 * 4 + 2
@@ -0,0 +1,80 @@
+import asyncio
+
+from backend.product_snapshot import ProductSnapshot, ProductSnapshotService
+
+
+def _product(id, category, created_at, stock=1):
+    return {"id": id, "name": f"p{id}", "category": category, "price": 10.0, "stock": stock, "created_at": created_at}
+
+
+def _snapshot(categories):
+    rows = [_product(i, category, f"2024-01-{i + 1:02d}") for i, category in enumerate(categories)]
+    return ProductSnapshot({}, None, 0.0).with_rows(rows, 0.0)
+
+
+def test_match_category_singular_and_plural_forms():
+    snapshot = _snapshot(["Dress", "Shoes", "Glasses", "Jeans", "Watch", "Bus"])
+    assert snapshot.match_category("a red dress") == "dress"
+    assert snapshot.match_category("show me dresses") == "dress"
+    assert snapshot.match_category("running shoe") == "shoes"
+    assert snapshot.match_category("reading glass") == "glasses"
+    assert snapshot.match_category("blue jeans please") == "jeans"
+    assert snapshot.match_category("cheap watches") == "watch"
+    assert snapshot.match_category("a bus") == "bus"
+    # Whole words only
+    assert snapshot.match_category("address update") is None
+    assert snapshot.match_category("stopwatch") is None
+
+
+def test_match_category_multi_word_phrases():
+    snapshot = _snapshot(["T-Shirt", "Shirt", "Running Shoes", "Shoes"])
+    assert snapshot.match_category("two t-shirts") == "t-shirt"
+    assert snapshot.match_category("a linen shirt") == "shirt"
+    assert snapshot.match_category("new running shoe for trails") == "running shoes"
+    assert snapshot.match_category("formal shoes") == "shoes"
+    assert snapshot.match_category("nothing here") is None
+
+
+def test_candidates_are_in_stock_and_newest_first():
+    rows = [_product(1, "Tops", "2024-01-01"), _product(2, "Tops", "2024-01-03"),
+            _product(3, "Tops", "2024-01-02", stock=0), _product(4, "Bottoms", "2024-01-04")]
+    snapshot = ProductSnapshot({}, None, 0.0).with_rows(rows, 0.0)
+    assert [p["id"] for p in snapshot.candidates("tops")] == [2, 1]
+    assert [p["id"] for p in snapshot.candidates(None, limit=2)] == [4, 2]
+    assert snapshot.watermark == "2024-01-04"
+
+
+class _Database:
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    async def fetch_product_page(self, offset, limit):
+        self.calls.append(("page", offset))
+        return self.rows[offset:offset + limit]
+
+    async def fetch_products_since(self, created_at, offset, limit):
+        self.calls.append(("since", created_at, offset))
+        newer = [row for row in self.rows if row["created_at"] >= created_at]
+        return newer[offset:offset + limit]
+
+
+def test_service_pages_the_full_load_and_merges_new_rows():
+    db = _Database([_product(i, "Tops", f"2024-01-{i:02d}") for i in range(1, 6)])
+    service = ProductSnapshotService(db, page_size=2, full_reload_interval=3600)
+
+    async def scenario():
+        await service.refresh()
+        assert [call[1] for call in db.calls] == [0, 2, 4]
+        db.rows.append(_product(6, "Bottoms", "2024-01-06"))
+        db.rows[0] = {**db.rows[0], "stock": 0}
+        await service.refresh()
+        return await service.candidates("any bottoms?")
+
+    candidates = asyncio.run(scenario())
+    assert [p["id"] for p in candidates] == [6]
+    assert db.calls[3:] == [("since", "2024-01-05", 0), ("since", "2024-01-05", 2)]
+    stats = service.stats()
+    assert stats["products"] == 6 and stats["full_loads"] == 1 and stats["incremental_refreshes"] == 1
+    # Only the full reload picks up stock changes to existing rows
+    assert service.snapshot.products[1]["stock"] == 1
@@ -0,0 +1,150 @@
+import asyncio
+
+import httpx
+import pytest
+
+from backend.data_access import Database
+from backend.profile_cache import ProfileCache
+
+
+class _Users:
+    """Counts loads and returns a profile for known emails"""
+
+    def __init__(self, known=("ann@example.com",), delay=0.0):
+        self.known = set(known)
+        self.delay = delay
+        self.loads = []
+
+    async def __call__(self, email):
+        self.loads.append(email)
+        await asyncio.sleep(self.delay)
+        if email in self.known:
+            return {"id": email, "name": "Ann", "phone_number": None, "preferences": {}}
+        return None
+
+
+def test_hits_are_keyed_on_the_normalized_email():
+    cache, users = ProfileCache(), _Users()
+
+    async def scenario():
+        first = await cache.get("Ann@Example.com ", users)
+        second = await cache.get("ann@example.com", users)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first is second
+    assert users.loads == ["ann@example.com"]
+    assert cache.stats()["hits"] == 1
+
+
+def test_entries_expire_after_ttl():
+    cache, users = ProfileCache(ttl_seconds=0.02), _Users()
+
+    async def scenario():
+        await cache.get("ann@example.com", users)
+        await cache.get("ann@example.com", users)
+        await asyncio.sleep(0.03)
+        await cache.get("ann@example.com", users)
+
+    asyncio.run(scenario())
+    assert len(users.loads) == 2
+
+
+def test_negative_entries_use_their_own_ttl():
+    cache, users = ProfileCache(ttl_seconds=10, negative_ttl_seconds=0.02), _Users()
+
+    async def scenario():
+        assert await cache.get("default@example.com", users) is None
+        assert await cache.get("default@example.com", users) is None
+        assert cache.stats()["negative_hits"] == 1
+        await asyncio.sleep(0.03)
+        await cache.get("default@example.com", users)
+
+    asyncio.run(scenario())
+    assert users.loads == ["default@example.com"] * 2
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache, users = ProfileCache(max_entries=2), _Users(known=("a@x.com", "b@x.com", "c@x.com"))
+
+    async def scenario():
+        await cache.get("a@x.com", users)
+        await cache.get("b@x.com", users)
+        await cache.get("a@x.com", users)
+        await cache.get("c@x.com", users)
+        users.loads.clear()
+        await cache.get("a@x.com", users)
+        await cache.get("b@x.com", users)
+
+    asyncio.run(scenario())
+    assert users.loads == ["b@x.com"]
+    assert cache.stats()["evictions"] >= 1
+
+
+def test_concurrent_misses_share_one_load():
+    cache, users = ProfileCache(), _Users(delay=0.02)
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get("ann@example.com", users) for _ in range(10)))
+
+    results = asyncio.run(scenario())
+    assert users.loads == ["ann@example.com"]
+    assert all(result is results[0] for result in results)
+    assert cache.stats()["coalesced"] == 9
+
+
+def test_invalidate_during_load_does_not_cache_the_old_value():
+    cache, users = ProfileCache(), _Users(delay=0.02)
+
+    async def scenario():
+        task = asyncio.ensure_future(cache.get("ann@example.com", users))
+        await asyncio.sleep(0.005)
+        cache.invalidate("ANN@example.com")
+        await task
+        await cache.get("ann@example.com", users)
+
+    asyncio.run(scenario())
+    assert len(users.loads) == 2
+
+
+def test_failed_loads_are_not_cached():
+    cache = ProfileCache()
+    calls = []
+
+    async def failing(email):
+        calls.append(email)
+        raise RuntimeError("database down")
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await cache.get("ann@example.com", failing)
+
+    asyncio.run(scenario())
+    assert len(calls) == 2
+    assert cache.stats()["errors"] == 2
+
+
+def test_fetch_user_by_email_queries_the_normalized_address():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json=[
+            {"id": "2", "name": "Ann", "preferences": '{"style": "casual"}'},
+        ])
+
+    async def scenario():
+        client = httpx.AsyncClient(base_url="http://db/rest/v1", transport=httpx.MockTransport(handler))
+        db = Database("http://db", "key", http_client=client)
+        try:
+            return await db.fetch_user_by_email(" Ann_Lee@Example.com ")
+        finally:
+            await db.aclose()
+
+    user = asyncio.run(scenario())
+    # An exact match on the stored form, so Postgres can use the users.email index
+    assert requests[0].url.params["email"] == "eq.ann_lee@example.com"
+    assert requests[0].url.params["limit"] == "1"
+    assert user == {"id": "2", "name": "Ann", "phone_number": None, "preferences": {"style": "casual"}}
+
@@ -0,0 +1,85 @@
+import pytest
+
+from backend.agents import prompt_builder
+from backend.agents.prompt_builder import PromptBuilder, count_tokens, serialize_value, truncate_tokens
+
+
+@pytest.fixture(autouse=True)
+def regex_estimate(monkeypatch):
+    # The same counts with or without tiktoken installed
+    monkeypatch.setattr(prompt_builder, "_encoding", None)
+
+
+def _history(turns, words=30):
+    history = []
+    for i in range(turns):
+        sender = "customer" if i % 2 == 0 else "assistant"
+        history.append({"sender_type": sender, "content": f"turn {i} " + " ".join(["word"] * words)})
+    return history
+
+
+def test_regex_token_estimate():
+    assert count_tokens("") == 0
+    # Words and punctuation are one token each, long words about one per 4 characters
+    assert count_tokens("Hi, you!") == 4
+    assert count_tokens("internationalization") == 5
+    assert count_tokens("₹3000") == 2
+    assert truncate_tokens("one two six ten red map", 3) == "one two six…"
+    # Cut inside a long word once the estimate runs out
+    assert truncate_tokens("one two three", 3) == "one two thre…"
+    assert truncate_tokens("short", 10) == "short"
+    assert truncate_tokens("anything", 0) == ""
+
+
+def test_sms_prompt_stays_within_its_budget_with_long_history():
+    builder = PromptBuilder.for_channel("sms")
+    assert builder.budget == 300
+    context = {"name": "Asha", "preferences": {"style": "casual", "sizes": ["M"] * 20},
+               "conversation_history": _history(40)}
+    measured = builder.measure("Where is my order? " * 40, context)
+    assert measured["tokens"] <= 300
+
+    # Bigger channels keep more of the same conversation
+    email = PromptBuilder.for_channel("email").build("Where is my order?", context)
+    assert count_tokens(email) <= 3000
+    assert len(email) > len(builder.build("Where is my order?", context))
+
+
+def test_whitelist_drops_contact_details_and_ids():
+    context = {"name": "Asha", "email": "asha@example.com", "phone_number": "+1 555 0100",
+               "customer_id": "c-42", "user_id": 7, "order_id": "A100",
+               "products": [{"id": 1, "name": "Linen Shirt", "price": 999, "category": "Tops", "sku": "X1"}]}
+    prompt = PromptBuilder(1500).build("Hello", context)
+    assert "name: Asha" in prompt and "order_id: A100" in prompt
+    for hidden in ("asha@example.com", "555", "c-42", "user_id", "sku", '"id"'):
+        assert hidden not in prompt
+    assert 'products: [{"name":"Linen Shirt","category":"Tops","price":999}]' in prompt
+
+
+def test_serialize_value_compacts_json_strings():
+    assert serialize_value('{"style": "casual", "colour": ""}') == '{"style":"casual"}'
+    assert serialize_value(list(range(10))) == "[0,1,2,3,4]"
+    assert serialize_value("  plain  ") == "plain"
+
+
+def test_history_keeps_newest_turns_and_summarizes_older_ones():
+    history = _history(20, words=20)
+    prompt = PromptBuilder(300).build("Any update?", {"conversation_history": history})
+    section = prompt.split("Conversation History:\n")[1].split("\n\nCurrent Message:")[0]
+    lines = section.split("\n")
+
+    summary, kept = lines[0], lines[1:]
+    assert kept and kept[-1].startswith("Assistant: turn 19 ")
+    turns = [int(line.split()[2]) for line in kept]
+    # The newest turns, contiguous and in order
+    assert turns == list(range(20 - len(kept), 20))
+    omitted = 20 - len(kept)
+    assert summary.startswith(f"[{omitted} earlier messages] Customer earlier said: turn 0 ")
+    assert prompt.endswith("Current Message: Any update?")
+
+
+def test_short_history_is_kept_whole():
+    history = _history(3, words=3)
+    prompt = PromptBuilder(1500).build("Thanks", {"conversation_history": history})
+    assert "earlier messages" not in prompt
+    assert "Customer: turn 0 word word word\nAssistant: turn 1 word word word\nCustomer: turn 2" in prompt
@@ -0,0 +1,86 @@
+import asyncio
+import threading
+
+import pytest
+
+from backend.reranker import MicroBatchReranker, product_text
+
+
+class _CrossEncoder:
+    """Scores a pair by how many query words appear in the passage"""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def predict(self, pairs, **kwargs):
+        with self.lock:
+            self.batches.append(len(pairs))
+        if self.fail:
+            raise RuntimeError("model crashed")
+        return [sum(word in passage.lower() for word in query.lower().split()) for query, passage in pairs]
+
+
+ITEMS = [
+    {"name": "Linen Shirt", "category": "Tops", "fabric": "Linen", "description": "Summer shirt", "link": "/1"},
+    {"name": "Denim Jacket", "category": "Outerwear", "fabric": "Denim", "description": "Light jacket", "link": "/2"},
+    {"name": "Blue Denim Jeans", "category": "Bottoms", "fabric": "Denim", "description": "Slim", "link": "/3"},
+]
+
+
+def test_product_text():
+    assert product_text({"name": "Tee", "category": "Tops", "description": "Soft"}) == "Tee. Tops. Soft"
+
+
+def test_concurrent_callers_share_batches_and_scores_are_cached():
+    model = _CrossEncoder()
+    reranker = MicroBatchReranker(lambda: model, max_batch_size=32, max_wait_ms=20)
+
+    async def scenario():
+        first, second = await asyncio.gather(reranker.rerank("blue denim", ITEMS, 2),
+                                             reranker.rerank("Blue  Denim", ITEMS, 3))
+        again = await reranker.rerank("blue denim", ITEMS, 1)
+        return first, second, again
+
+    first, second, again = asyncio.run(scenario())
+    assert [item["link"] for item in first] == ["/3", "/2"]
+    assert [item["cross_encoder_score"] for item in second] == [2.0, 1.0, 0.0]
+    assert again[0]["link"] == "/3"
+    # Identical (query, product) pairs from both callers were scored once, in one batch
+    assert model.batches == [3]
+    assert reranker.stats()["cache_hits"] == 3
+
+
+def test_batch_failure_reaches_every_caller_and_is_not_cached():
+    model = _CrossEncoder(fail=True)
+    reranker = MicroBatchReranker(lambda: model, max_wait_ms=5)
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await reranker.score("shirt", ITEMS)
+
+    asyncio.run(scenario())
+    assert len(model.batches) == 2
+    assert reranker.stats()["cache_size"] == 0
+
+
+def test_cancelled_caller_does_not_cancel_a_shared_pair():
+    model = _CrossEncoder()
+    reranker = MicroBatchReranker(lambda: model, max_wait_ms=20)
+
+    async def scenario():
+        cancelled = asyncio.ensure_future(reranker.score("blue denim", ITEMS))
+        await asyncio.sleep(0)
+        other = asyncio.ensure_future(reranker.score("blue denim", ITEMS))
+        await asyncio.sleep(0.005)
+        # Like a client disconnect, while both wait on the same queued pairs
+        cancelled.cancel()
+        scores = await other
+        assert cancelled.cancelled()
+        assert not reranker._inflight
+        return scores
+
+    assert asyncio.run(scenario()) == [0.0, 1.0, 2.0]
+    assert model.batches == [3]
@@ -0,0 +1,223 @@
+import asyncio
+import time
+
+import pytest
+
+from backend.resilience import CircuitBreaker, CircuitOpenError, FakeProvider, FakeProviderError, ResilientCaller
+
+
+def _create(provider):
+    return lambda model: provider.chat.completions.create(model=model, messages=[])
+
+
+def test_retries_503_then_succeeds():
+    provider = FakeProvider(latency=0.001, failure_rate=1.0, seed=1)
+    caller = ResilientCaller("test", base_delay=0.001, failure_threshold=10)
+
+    async def flaky(model):
+        # Fail twice with 503, then recover
+        if provider.calls.get(model, 0) >= 2:
+            provider.failure_rate = 0.0
+        return await provider.chat.completions.create(model=model, messages=[])
+
+    response = asyncio.run(caller.call(flaky, "primary"))
+    assert response.model == "primary"
+    assert provider.calls == {"primary": 3}
+    assert caller.counters["retries"] == 2
+
+
+def test_falls_back_on_404_without_retrying():
+    provider = FakeProvider(latency=0.001, unknown_models={"gpt-4.0-mini"})
+    caller = ResilientCaller("test", base_delay=0.001)
+
+    response = asyncio.run(caller.call(_create(provider), "gpt-4.0-mini", "gpt-4o-mini"))
+    assert response.model == "gpt-4o-mini"
+    assert provider.calls == {"gpt-4.0-mini": 1, "gpt-4o-mini": 1}
+    assert caller.counters["fallbacks"] == 1
+    assert caller.counters["retries"] == 0
+
+
+def test_breaker_opens_short_circuits_and_recovers_half_open():
+    provider = FakeProvider(latency=0.001, down_models={"primary"})
+    caller = ResilientCaller("test", max_attempts=1, failure_threshold=2, recovery_timeout=0.05)
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(FakeProviderError):
+                await caller.call(_create(provider), "primary")
+        assert caller.breakers["primary"].state == "open"
+
+        # Open: fails fast without reaching the provider
+        with pytest.raises(CircuitOpenError):
+            await caller.call(_create(provider), "primary")
+        assert provider.calls["primary"] == 2
+
+        # After the recovery window a single half-open probe goes through and closes the breaker
+        provider.down_models.clear()
+        await asyncio.sleep(0.06)
+        response = await caller.call(_create(provider), "primary")
+        assert response.model == "primary"
+        assert caller.breakers["primary"].state == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_half_open_failure_reopens():
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.01)
+    breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(0.02)
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    # Only one probe at a time
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.times_opened == 2
+
+
+def test_hedged_request_beats_slow_primary():
+    provider = FakeProvider(latency=0.005)
+    caller = ResilientCaller("test", hedge=True, min_hedge_delay=0.01, attempt_timeout=2)
+
+    async def scenario():
+        for _ in range(30):
+            await caller.call(_create(provider), "model")
+        # The next first attempt stalls; the hedge fired at the latency quantile answers instead
+        provider.slow_rate, provider.slow_latency = 1.0, 1.0
+        original = provider.create
+        calls = {"n": 0}
+
+        async def first_slow(model, messages, **kwargs):
+            calls["n"] += 1
+            if calls["n"] == 1:
+                return await original(model, messages, **kwargs)
+            provider.slow_rate = 0.0
+            return await original(model, messages, **kwargs)
+
+        started = time.monotonic()
+        response = await caller.call(lambda model: first_slow(model, []), "model")
+        return response, time.monotonic() - started
+
+    response, elapsed = asyncio.run(scenario())
+    assert response.model == "model"
+    assert elapsed < 0.5
+    assert caller.counters["hedges"] == 1
+    assert caller.counters["hedge_wins"] == 1
+
+
+def test_deadline_bounds_the_whole_call():
+    provider = FakeProvider(latency=5)
+    caller = ResilientCaller("test", base_delay=0.001)
+    started = time.monotonic()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(caller.call(_create(provider), "a", "b", deadline=0.2))
+    assert time.monotonic() - started < 1
+
+
+def test_is_open_expires_without_a_call():
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.01)
+    breaker.record_failure()
+    assert breaker.is_open
+    time.sleep(0.02)
+    # Still "open" until allow() runs, but no longer failing fast
+    assert breaker.state == "open"
+    assert not breaker.is_open
+
+
+def test_cancelled_half_open_probe_releases_its_slot():
+    provider = FakeProvider(latency=0.001, down_models={"primary"})
+    caller = ResilientCaller("test", max_attempts=1, failure_threshold=1, recovery_timeout=0.01)
+
+    async def scenario():
+        with pytest.raises(FakeProviderError):
+            await caller.call(_create(provider), "primary")
+        await asyncio.sleep(0.02)
+
+        # The half-open probe stalls and is cancelled, like a stage timeout would
+        provider.down_models.clear()
+        provider.slow_rate, provider.slow_latency = 1.0, 5.0
+        probe = asyncio.ensure_future(caller.call(_create(provider), "primary"))
+        await asyncio.sleep(0.01)
+        assert caller.breakers["primary"].state == "half_open"
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        provider.slow_rate = 0.0
+        for _ in range(3):
+            response = await caller.call(_create(provider), "primary")
+            assert response.model == "primary"
+        assert caller.breakers["primary"].state == "closed"
+        assert caller.counters["short_circuited"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_probe_out_of_deadline_releases_its_slot():
+    caller = ResilientCaller("test", failure_threshold=1, recovery_timeout=0.01)
+    breaker = caller.breaker("primary")
+    breaker.record_failure()
+    time.sleep(0.02)
+
+    async def never_called(model):
+        raise AssertionError("no time left for an attempt")
+
+    # A spent deadline breaks out before the first attempt runs
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(caller.call(never_called, "primary", deadline=-1))
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+
+
+def test_client_errors_do_not_open_the_breaker():
+    caller = ResilientCaller("test", max_attempts=1, failure_threshold=2)
+
+    async def bad_request(model):
+        raise FakeProviderError(400, "invalid request")
+
+    async def unparsable(model):
+        raise ValueError("Expecting value: line 1 column 1 (char 0)")
+
+    async def scenario():
+        for fn in (bad_request, unparsable, bad_request, unparsable):
+            with pytest.raises((FakeProviderError, ValueError)):
+                await caller.call(fn, "primary")
+
+    asyncio.run(scenario())
+    assert caller.breakers["primary"].state == "closed"
+    assert caller.breakers["primary"].failures == 0
+
+
+def test_client_error_on_half_open_probe_releases_its_slot():
+    caller = ResilientCaller("test", max_attempts=1, failure_threshold=1, recovery_timeout=0.01)
+    caller.breaker("primary").record_failure()
+    time.sleep(0.02)
+
+    async def bad_request(model):
+        raise FakeProviderError(400, "invalid request")
+
+    with pytest.raises(FakeProviderError):
+        asyncio.run(caller.call(bad_request, "primary"))
+    breaker = caller.breakers["primary"]
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+
+
+def test_would_allow_treats_a_claimed_probe_as_unavailable():
+    caller = ResilientCaller("test", failure_threshold=1, recovery_timeout=0.01)
+    assert caller.available()
+    breaker = caller.breaker("primary")
+    breaker.record_failure()
+    assert not breaker.would_allow() and not caller.available()
+
+    time.sleep(0.02)
+    assert breaker.would_allow() and caller.available()
+    assert breaker.allow()
+    # Half-open with the probe out: not "open", yet every other call is rejected
+    assert breaker.state == "half_open" and not breaker.is_open
+    assert not breaker.would_allow() and not caller.available()
+    assert not breaker.allow()
+
+    breaker.release_probe()
+    assert breaker.would_allow() and caller.available()
@@ -0,0 +1,76 @@
+import asyncio
+
+import numpy as np
+
+from backend.agents.response_cache import SemanticResponseCache, personalization_hash, template_reply, fill_reply
+
+
+class _BagOfWordsEncoder:
+    """Deterministic stand-in for the sentence-transformers model"""
+
+    def encode(self, texts, **kwargs):
+        vectors = np.zeros((len(texts), 64), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.split():
+                vectors[row, hash(word) % 64] += 1.0
+        return vectors
+
+
+def _cache():
+    return SemanticResponseCache(_BagOfWordsEncoder, threshold=0.9, enabled=True)
+
+
+def _result(reply):
+    return {"response": reply, "classification": {"intent": "general_inquiry"}}
+
+
+def test_template_reply_replaces_whole_words_only():
+    context = {"name": "Al"}
+    template = template_reply("Hi Al, we always ship Always-on items. Thanks, Al!", context)
+    assert template == "Hi {{name}}, we always ship Always-on items. Thanks, {{name}}!"
+    assert fill_reply(template, {"name": "Bea"}) == "Hi Bea, we always ship Always-on items. Thanks, Bea!"
+
+
+def test_template_reply_handles_emails_and_longest_first():
+    context = {"name": "Ann", "user_name": "Ann Lee", "email": "ann@example.com"}
+    template = template_reply("Ann Lee, we wrote to ann@example.com. Bye Ann, Annabel says hi", context)
+    assert template == "{{user_name}}, we wrote to {{email}}. Bye {{name}}, Annabel says hi"
+
+
+def test_personalization_hash_separates_customers():
+    assert personalization_hash({}) == personalization_hash({"preferences": {}, "name": "Ann"}) == ""
+    first = personalization_hash({"preferences": {"style": "casual"}})
+    second = personalization_hash({"preferences": {"style": "formal"}})
+    assert first and second and first != second
+    assert personalization_hash({"products": [1, 2], "preferences": {"a": 1}}) == \
+        personalization_hash({"preferences": {"a": 1}, "products": [1, 2]})
+
+
+def test_personalized_reply_is_not_served_to_another_customer():
+    cache = _cache()
+    alice = {"name": "Alice", "preferences": {"style": "casual"}}
+    bob = {"name": "Bob", "preferences": {"style": "formal"}}
+
+    async def scenario():
+        vector = await cache.embed("what should I wear")
+        cache.store(("web", personalization_hash(alice)), vector, alice, _result("Alice, try jeans"), 100.0)
+        assert cache.lookup(("web", personalization_hash(bob)), vector, bob) is None
+        hit = cache.lookup(("web", personalization_hash(alice)), vector, {**alice, "name": "Alice"})
+        assert hit["response"] == "Alice, try jeans"
+
+    asyncio.run(scenario())
+
+
+def test_generic_reply_is_shared_with_names_filled_in():
+    cache = _cache()
+
+    async def scenario():
+        vector = await cache.embed("what are your opening hours")
+        cache.store(("web", ""), vector, {"name": "Alice"}, _result("Hi Alice, we open at nine"), 50.0)
+        hit = cache.lookup(("web", ""), await cache.embed("What are your opening hours?"), {"name": "Bob"})
+        assert hit["response"] == "Hi Bob, we open at nine"
+        # A reply that needs a name cannot be filled for a customer without one
+        assert cache.lookup(("web", ""), vector, {}) is None
+
+    asyncio.run(scenario())
+    assert cache.stats()["hits"] == 1
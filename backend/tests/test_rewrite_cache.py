@@ -0,0 +1,82 @@
+import asyncio
+
+from backend.rewrite_cache import RewriteCache, normalize_query
+
+
+class _Rewriter:
+    def __init__(self, delay=0.0, result=None):
+        self.delay = delay
+        self.result = result
+        self.calls = []
+
+    async def __call__(self, query):
+        self.calls.append(query)
+        await asyncio.sleep(self.delay)
+        return self.result if self.result is not None else f"rewritten {query}"
+
+
+def test_normalize_query():
+    assert normalize_query("  Jeans,  under ₹3000.50!! ") == "jeans under ₹3000.50"
+
+
+def test_memory_and_disk_tiers(tmp_path):
+    db_path = str(tmp_path / "rewrites.db")
+    rewriter = _Rewriter()
+
+    async def scenario():
+        cache = RewriteCache(db_path)
+        first = await cache.get_or_compute("Blue Jeans", rewriter)
+        second = await cache.get_or_compute("blue jeans!", rewriter)
+        # A new process starts with an empty memory tier but finds the row on disk
+        restarted = RewriteCache(db_path)
+        third = await restarted.get_or_compute("blue jeans", rewriter)
+        return first, second, third, cache.stats(), restarted.stats()
+
+    first, second, third, stats, restarted_stats = asyncio.run(scenario())
+    assert first == second == third == "rewritten Blue Jeans"
+    assert rewriter.calls == ["Blue Jeans"]
+    assert stats["memory_hits"] == 1
+    assert restarted_stats["disk_hits"] == 1
+
+
+def test_entries_expire(tmp_path):
+    rewriter = _Rewriter()
+
+    async def scenario():
+        cache = RewriteCache(str(tmp_path / "rewrites.db"), ttl_seconds=0.02)
+        await cache.get_or_compute("jeans", rewriter)
+        await asyncio.sleep(0.03)
+        await cache.get_or_compute("jeans", rewriter)
+
+    asyncio.run(scenario())
+    assert len(rewriter.calls) == 2
+
+
+def test_failed_rewrite_returns_query_and_is_not_cached():
+    calls = []
+
+    async def failing(query):
+        calls.append(query)
+        return None
+
+    async def scenario():
+        cache = RewriteCache()
+        assert await cache.get_or_compute("jeans", failing) == "jeans"
+        assert await cache.get_or_compute("jeans", failing) == "jeans"
+        return cache.stats()
+
+    stats = asyncio.run(scenario())
+    assert len(calls) == 2
+    assert stats["errors"] == 2
+
+
+def test_concurrent_misses_share_one_call():
+    rewriter = _Rewriter(delay=0.02)
+
+    async def scenario():
+        cache = RewriteCache()
+        return await asyncio.gather(*(cache.get_or_compute("jeans", rewriter) for _ in range(5)))
+
+    assert asyncio.run(scenario()) == ["rewritten jeans"] * 5
+    assert rewriter.calls == ["jeans"]
+
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from backend.single_flight import SingleFlight
+
+
+class _Loader:
+    def __init__(self, delay=0.02, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return f"value {self.calls}"
+
+
+def test_concurrent_calls_share_one_load():
+    flight, load = SingleFlight(), _Loader()
+
+    async def scenario():
+        results = await asyncio.gather(*(flight.do("key", load) for _ in range(5)))
+        assert len(flight) == 0
+        return results
+
+    results = asyncio.run(scenario())
+    assert [value for value, _ in results] == ["value 1"] * 5
+    assert [shared for _, shared in results] == [False, True, True, True, True]
+    assert load.calls == 1
+
+
+def test_failure_reaches_every_waiter_and_is_not_kept():
+    flight, load = SingleFlight(), _Loader(error=RuntimeError("down"))
+
+    async def scenario():
+        results = await asyncio.gather(*(flight.do("key", load) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        load.error = None
+        return await flight.do("key", load)
+
+    assert asyncio.run(scenario()) == ("value 2", False)
+    assert load.calls == 2
+
+
+def test_cancelled_leader_does_not_cancel_waiters():
+    flight, load = SingleFlight(), _Loader()
+
+    async def scenario():
+        leader = asyncio.ensure_future(flight.do("key", load))
+        await asyncio.sleep(0)
+        waiters = [asyncio.ensure_future(flight.do("key", load)) for _ in range(3)]
+        await asyncio.sleep(0.005)
+        leader.cancel()
+        results = await asyncio.gather(*waiters)
+        assert leader.cancelled()
+        return results
+
+    results = asyncio.run(scenario())
+    # One waiter took over the load; the others shared it
+    assert [value for value, _ in results] == ["value 2"] * 3
+    assert sorted(shared for _, shared in results) == [False, True, True]
+    assert load.calls == 2
+
+
+def test_cancelled_waiter_leaves_the_load_running():
+    flight, load = SingleFlight(), _Loader()
+
+    async def scenario():
+        leader = asyncio.ensure_future(flight.do("key", load))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(flight.do("key", load))
+        await asyncio.sleep(0.005)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return await leader
+
+    assert asyncio.run(scenario()) == ("value 1", False)
+    assert load.calls == 1
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from backend.agents.stage_graph import Stage, critical_path, run_stage_graph
+
+
+def _after(delay, value):
+    async def run(inputs):
+        await asyncio.sleep(delay)
+        return value(inputs) if callable(value) else value
+    return run
+
+
+async def _fails(inputs):
+    raise RuntimeError("lookup failed")
+
+
+def test_duplicate_and_unknown_stages_are_rejected():
+    with pytest.raises(ValueError, match="Duplicate"):
+        asyncio.run(run_stage_graph([Stage("a", _after(0, 1)), Stage("a", _after(0, 2))]))
+    with pytest.raises(ValueError, match="unknown stage 'missing'"):
+        asyncio.run(run_stage_graph([Stage("a", _after(0, 1), depends_on=["missing"])]))
+
+
+def test_cycles_are_rejected():
+    stages = [Stage("a", _after(0, 1), depends_on=["c"]), Stage("b", _after(0, 2), depends_on=["a"]),
+              Stage("c", _after(0, 3), depends_on=["b"])]
+    with pytest.raises(ValueError, match="cycle"):
+        asyncio.run(run_stage_graph(stages))
+
+
+def test_independent_stages_run_concurrently():
+    stages = [Stage("profile", _after(0.1, "ann")), Stage("history", _after(0.1, [])),
+              Stage("reply", _after(0, lambda inputs: f"hi {inputs['profile']}"), depends_on=["profile", "history"])]
+    results, timings = asyncio.run(run_stage_graph(stages))
+    assert results == {"profile": "ann", "history": [], "reply": "hi ann"}
+    # Both lookups overlapped instead of taking 0.2s back to back
+    assert timings["total_ms"] < 180
+    assert timings["stages"]["reply"]["start_ms"] >= 100
+    assert all(stage["status"] == "ok" for stage in timings["stages"].values())
+
+
+def test_failed_and_timed_out_stages_resolve_to_fallback():
+    stages = [Stage("profile", _fails, fallback={}),
+              Stage("history", _after(1, ["late"]), timeout=0.05, fallback=[]),
+              Stage("reply", _after(0, lambda inputs: (inputs["profile"], inputs["history"])),
+                    depends_on=["profile", "history"])]
+    results, timings = asyncio.run(run_stage_graph(stages))
+    # Downstream stages still run, on the fallback values
+    assert results == {"profile": {}, "history": [], "reply": ({}, [])}
+    statuses = {name: stage["status"] for name, stage in timings["stages"].items()}
+    assert statuses == {"profile": "error", "history": "timeout", "reply": "ok"}
+    assert timings["stages"]["history"]["duration_ms"] < 500
+
+
+def test_critical_path_follows_the_slowest_dependencies():
+    stages = [Stage("profile", _after(0.01, 1)), Stage("products", _after(0.08, 2)),
+              Stage("rerank", _after(0.01, 3), depends_on=["products"]),
+              Stage("reply", _after(0.01, 4), depends_on=["profile", "rerank"])]
+    _, timings = asyncio.run(run_stage_graph(stages))
+    assert timings["critical_path"] == ["products", "rerank", "reply"]
+    assert critical_path(stages, {}) == []
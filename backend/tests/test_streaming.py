@@ -0,0 +1,30 @@
+import json
+
+from backend.agents.streaming import JsonFieldStreamer
+
+
+def _stream(payload, chunk_size):
+    streamer = JsonFieldStreamer()
+    out = "".join(streamer.feed(payload[i:i + chunk_size]) for i in range(0, len(payload), chunk_size))
+    return out, streamer.done
+
+
+def test_decodes_field_across_every_chunk_split():
+    reply = 'Line one\nQuote " and slash \\ and café'
+    payload = json.dumps({"intent": "x", "reply": reply, "confidence": 0.9})
+    for size in range(1, len(payload) + 1):
+        assert _stream(payload, size) == (reply, True)
+
+
+def test_combines_surrogate_pairs_split_across_chunks():
+    reply = "Thanks \U0001F600 see you \U0001F44B"
+    payload = json.dumps({"reply": reply})
+    assert "\\ud83d\\ude00" in payload
+    for size in range(1, len(payload) + 1):
+        assert _stream(payload, size) == (reply, True)
+
+
+def test_unpaired_surrogates_become_replacement_characters():
+    payload = '{"reply": "a\\ud83d b \\ude00 c\\ud83d\\u0041"}'
+    for size in range(1, len(payload) + 1):
+        assert _stream(payload, size) == ("a� b � c�A", True)